@@ -0,0 +1,28 @@
+"""Storage backends for versioned entities.
+
+A backend implements the persistence operations of VersionedEntity and
+VersionedEdgeSet. The backend used for an operation is taken from the
+`backend` attribute of the transaction it runs in. Transactions of the
+neo4j driver have no such attribute and use the cypher backend.
+"""
+from .base import Backend  # noqa F401
+from .cypher import CypherBackend
+from .memory import MemoryBackend  # noqa F401
+from .memory import MemoryDriver  # noqa F401
+from .memory import MemoryGraph  # noqa F401
+
+cypher_backend = CypherBackend()
+
+
+def get_backend(tx):
+    """Get the backend for a transaction.
+
+    :param tx: Transaction context
+    :type tx: object
+    :returns: Backend of the transaction, the cypher backend by default
+    :rtype: Backend
+    """
+    backend = getattr(tx, 'backend', None)
+    if backend is None:
+        return cypher_backend
+    return backend
@@ -0,0 +1,168 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Backend(object):
+    """Interface of a versioned graph backend.
+
+    Subclasses implement the primitive operations. Comparing states and
+    reconciling edge sets are built on top of the primitives and may be
+    overridden by backends that can do better.
+    """
+
+    def find(self, tx, model, identity):
+        """Find the identity node of an entity.
+
+        :param tx: Transaction context
+        :type tx: object
+        :param model: Entity class
+        :type model: type
+        :param identity: Identity to find
+        :type identity: str
+        :returns: Properties of the identity node or None
+        :rtype: dict|None
+        """
+        raise NotImplementedError('find not implemented.')
+
+    def merge_identity(self, tx, entity, time_in_ms):
+        """Create the identity node or update its static properties.
+
+        :param tx: Transaction context
+        :type tx: object
+        :param entity: Entity to merge
+        :type entity: cloud_snitch.models.base.VersionedEntity
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        raise NotImplementedError('merge_identity not implemented.')
+
+    def current_state(self, tx, entity):
+        """Get the properties of the current state of an entity.
+
+        :param tx: Transaction context
+        :type tx: object
+        :param entity: Entity to get the state of
+        :type entity: cloud_snitch.models.base.VersionedEntity
+        :returns: Properties of the current state or None
+        :rtype: dict|None
+        """
+        raise NotImplementedError('current_state not implemented.')
+
+    def roll_state(self, tx, entity, props, time_in_ms):
+        """End the current state and start a new one.
+
+        :param tx: Transaction context
+        :type tx: object
+        :param entity: Entity to roll the state of
+        :type entity: cloud_snitch.models.base.VersionedEntity
+        :param props: Properties of the new state
+        :type props: dict
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        raise NotImplementedError('roll_state not implemented.')
+
+    def current_edges(self, tx, edgeset):
+        """Get identities at the end of current edges of an edge set.
+
+        :param tx: Transaction context
+        :type tx: object
+        :param edgeset: Edge set to look up
+        :type edgeset: cloud_snitch.models.base.VersionedEdgeSet
+        :returns: Set of destination identities
+        :rtype: set
+        """
+        raise NotImplementedError('current_edges not implemented.')
+
+    def close_edge(self, tx, edgeset, identity, time_in_ms):
+        """End a current edge.
+
+        :param tx: Transaction context
+        :type tx: object
+        :param edgeset: Edge set the edge belongs to
+        :type edgeset: cloud_snitch.models.base.VersionedEdgeSet
+        :param identity: Identity of the destination
+        :type identity: str
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        raise NotImplementedError('close_edge not implemented.')
+
+    def create_edge(self, tx, edgeset, identity, time_in_ms):
+        """Start a current edge if one does not exist.
+
+        :param tx: Transaction context
+        :type tx: object
+        :param edgeset: Edge set the edge belongs to
+        :type edgeset: cloud_snitch.models.base.VersionedEdgeSet
+        :param identity: Identity of the destination
+        :type identity: str
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        raise NotImplementedError('create_edge not implemented.')
+
+    def times_updated(self, tx, entity, limit=None):
+        """Get distinct times of relationships reachable from an entity.
+
+        :param tx: Transaction context
+        :type tx: object
+        :param entity: Entity to start from
+        :type entity: cloud_snitch.models.base.VersionedEntity
+        :param limit: Optional maximum number of times
+        :type limit: int|None
+        :returns: Times in milliseconds, newest first
+        :rtype: list
+        """
+        raise NotImplementedError('times_updated not implemented.')
+
+    def update_state(self, tx, entity, time_in_ms):
+        """Roll the state of an entity if its state properties differ.
+
+        :param tx: Transaction context
+        :type tx: object
+        :param entity: Entity to update
+        :type entity: cloud_snitch.models.base.VersionedEntity
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        :returns: True if a new state was created, False otherwise
+        :rtype: bool
+        """
+        _, prop_map = entity._prop_clause(entity.state_properties)
+        current_properties = self.current_state(tx, entity) or {}
+
+        dirty = False
+        for prop in entity.state_properties:
+            if current_properties.get(prop) != prop_map.get(prop):
+                dirty = True
+                break
+
+        if dirty:
+            logger.debug("Data is dirty, making a new state.")
+            self.roll_state(tx, entity, prop_map, time_in_ms)
+        return dirty
+
+    def reconcile_edges(self, tx, edgeset, identities, time_in_ms):
+        """Make the current edges of an edge set match identities.
+
+        :param tx: Transaction context
+        :type tx: object
+        :param edgeset: Edge set to reconcile
+        :type edgeset: cloud_snitch.models.base.VersionedEdgeSet
+        :param identities: Identities that should be current
+        :type identities: set
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        current_edges = self.current_edges(tx, edgeset)
+        logger.debug("New edges: {}".format(identities))
+        logger.debug("Current edges: {}".format(current_edges))
+
+        old_edges = current_edges - identities
+        logger.debug("Old edges: {}".format(old_edges))
+        for old_identity in old_edges:
+            self.close_edge(tx, edgeset, old_identity, time_in_ms)
+
+        for add_identity in identities - current_edges:
+            self.create_edge(tx, edgeset, add_identity, time_in_ms)
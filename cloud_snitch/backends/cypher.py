@@ -0,0 +1,313 @@
+import logging
+import pprint
+
+from cloud_snitch import utils
+
+from .base import Backend
+
+logger = logging.getLogger(__name__)
+
+
+class CypherBackend(Backend):
+    """Backend that runs cypher through a neo4j transaction."""
+
+    def find(self, tx, model, identity):
+        """Find the identity node of an entity.
+
+        :param tx: neo4j transaction context.
+        :type tx: neo4j.v1.api.Transaction
+        :param model: Entity class
+        :type model: type
+        :param identity: Identity to find
+        :type identity: str
+        :returns: Properties of the identity node or None
+        :rtype: dict|None
+        """
+        find = 'MATCH (n:{} {{ {}:${} }}) RETURN (n)'.format(
+            model.label,
+            model.identity_property,
+            model.identity_property
+        )
+        find_map = {}
+        find_map[model.identity_property] = identity
+
+        record = tx.run(find, **find_map).single()
+
+        # Check for empty result
+        if record is None:
+            return record
+        return {k: v for k, v in record[0].items()}
+
+    def merge_identity(self, tx, entity, time_in_ms):
+        """Merge the identity node and set static properties.
+
+        :param tx: neo4j transaction context.
+        :type tx: neo4j.v1.api.Transaction
+        :param entity: Entity to merge
+        :type entity: cloud_snitch.models.base.VersionedEntity
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        parts, prop_map = entity._props_set_clause(
+            'n',
+            entity.static_properties
+        )
+
+        if prop_map:
+            create_clause = (
+                'ON CREATE SET  n.created_at = $completed, {}'.format(parts)
+            )
+            update_clause = '' if entity.immutable else \
+                'ON MATCH SET {}'.format(parts)
+        else:
+            create_clause = 'ON CREATE SET  n.created_at = $completed'
+            update_clause = ''
+
+        cypher = """
+            MERGE (n:{} {{ {}:$identity }})
+            {}
+            {}
+            RETURN n
+        """
+        cypher = cypher.format(
+            entity.label,
+            entity.identity_property,
+            create_clause,
+            update_clause
+        )
+        logger.debug("Updating identity:\n{}".format(cypher))
+        tx.run(
+            cypher,
+            completed=time_in_ms,
+            identity=entity.identity,
+            **prop_map
+        )
+
+    def current_state(self, tx, entity):
+        """Get the properties of the current state of an entity.
+
+        :param tx: neo4j transaction context.
+        :type tx: neo4j.v1.api.Transaction
+        :param entity: Entity to get the state of
+        :type entity: cloud_snitch.models.base.VersionedEntity
+        :returns: Properties of the current state or None
+        :rtype: dict|None
+        """
+        cypher = """\
+            MATCH (a:{} {{ {}: $identity}})
+                -[r:HAS_STATE {{to: $state_rel_to}}]
+                ->(currentState:{})
+            RETURN currentState
+        """
+        cypher = cypher.format(
+            entity.label,
+            entity.identity_property,
+            entity.state_label
+        )
+        resp = tx.run(
+            cypher,
+            state_rel_to=utils.EOT,
+            identity=entity.identity
+        )
+        record = resp.single()
+        if record is None:
+            return None
+        return {k: v for k, v in record[0].items()}
+
+    def roll_state(self, tx, entity, props, time_in_ms):
+        """Mark the current state as old and create a new state.
+
+        :param tx: neo4j transaction context.
+        :type tx: neo4j.v1.api.Transaction
+        :param entity: Entity to roll the state of
+        :type entity: cloud_snitch.models.base.VersionedEntity
+        :param props: Properties of the new state
+        :type props: dict
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        # Mark current state as old
+        cypher = """
+            MATCH (c:{} {{ {}:$identity }})
+               -[r1:HAS_STATE {{to: $EOT}}]
+               ->(currentState:{})
+            SET r1.to = $completed
+        """
+        cypher = cypher.format(
+            entity.label,
+            entity.identity_property,
+            entity.state_label
+        )
+        tx.run(
+            cypher,
+            identity=entity.identity,
+            completed=time_in_ms,
+            EOT=utils.EOT
+        )
+
+        # Create relationship
+        parts = ', '.join([
+            '{}: ${}'.format(k, k)
+            for k in entity.state_properties if k in props
+        ])
+        prop_map = dict(props)
+        prop_map.update({
+            'EOT': utils.EOT,
+            'completed': time_in_ms,
+            'identity': entity.identity
+        })
+        cypher = """
+            MATCH (s:{} {{ {}:$identity }})
+            CREATE (s)
+                -[r2:HAS_STATE {{to: $EOT, from: $completed }}]
+                ->(newState:{} {{ {} }})
+            RETURN newState
+        """
+        cypher = cypher.format(
+            entity.label,
+            entity.identity_property,
+            entity.state_label,
+            parts
+        )
+        logger.debug('Update state cypher:')
+        logger.debug(cypher)
+        logger.debug("With params:\n{}".format(pprint.pformat(prop_map)))
+        tx.run(cypher, **prop_map)
+
+    def current_edges(self, tx, edgeset):
+        """Get identities at the end of current edges of an edge set.
+
+        :param tx: neo4j transaction context.
+        :type tx: neo4j.v1.api.Transaction
+        :param edgeset: Edge set to look up
+        :type edgeset: cloud_snitch.models.base.VersionedEdgeSet
+        :returns: Set of destination identities
+        :rtype: set
+        """
+        cypher = """\
+            MATCH (s:{} {{ {}:$identity }})-[r:{} {{to:$time}}]->(d:{})
+            RETURN d.{}
+        """
+        cypher = cypher.format(
+            edgeset.source.label,
+            edgeset.source.identity_property,
+            edgeset.name,
+            edgeset.dest_type.label,
+            edgeset.dest_type.identity_property
+        )
+        logger.debug("Finding current edges:")
+        logger.debug(cypher)
+        resp = tx.run(
+            cypher,
+            identity=edgeset.source.identity,
+            time=utils.EOT
+        )
+
+        current_edges = set()
+        key = 'd.{}'.format(edgeset.dest_type.identity_property)
+        for record in resp:
+            current_edges.add(record[key])
+        return current_edges
+
+    def close_edge(self, tx, edgeset, identity, time_in_ms):
+        """Set `to` on an edge that is no longer current.
+
+        :param tx: neo4j transaction context.
+        :type tx: neo4j.v1.api.Transaction
+        :param edgeset: Edge set the edge belongs to
+        :type edgeset: cloud_snitch.models.base.VersionedEdgeSet
+        :param identity: Identity of the destination
+        :type identity: str
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        cypher = """
+            MATCH (s:{} {{ {}:$srcIdentity}})
+            MATCH (d:{} {{ {}:$destIdentity}})
+            MATCH (s)-[r:{} {{ to: $eot }}]->(d)
+            SET r.to = $to
+        """
+        cypher = cypher.format(
+            edgeset.source.label,
+            edgeset.source.identity_property,
+            edgeset.dest_type.label,
+            edgeset.dest_type.identity_property,
+            edgeset.name
+        )
+        logger.debug("Marking {} --> {} as old".format(
+            edgeset.source.identity,
+            identity)
+        )
+        logger.debug(cypher)
+        tx.run(
+            cypher,
+            srcIdentity=edgeset.source.identity,
+            destIdentity=identity,
+            eot=utils.EOT,
+            to=time_in_ms
+        )
+
+    def create_edge(self, tx, edgeset, identity, time_in_ms):
+        """Merge in a new current edge.
+
+        :param tx: neo4j transaction context.
+        :type tx: neo4j.v1.api.Transaction
+        :param edgeset: Edge set the edge belongs to
+        :type edgeset: cloud_snitch.models.base.VersionedEdgeSet
+        :param identity: Identity of the destination
+        :type identity: str
+        :param time_in_ms: Time in milliseconds
+        :type time_in_ms: int
+        """
+        cypher = """
+            MATCH (s:{} {{ {}:$srcIdentity }})
+            MATCH (d:{} {{ {}:$destIdentity }})
+            MERGE (s)-[r:{} {{ to: $to }}]->(d)
+            ON CREATE SET r.from = $frm
+        """
+        cypher = cypher.format(
+            edgeset.source.label,
+            edgeset.source.identity_property,
+            edgeset.dest_type.label,
+            edgeset.dest_type.identity_property,
+            edgeset.name
+        )
+        logger.debug("Creating edge {} --> {}:".format(
+            edgeset.source.identity,
+            identity)
+        )
+        logger.debug(cypher)
+        tx.run(
+            cypher,
+            srcIdentity=edgeset.source.identity,
+            destIdentity=identity,
+            frm=time_in_ms,
+            to=utils.EOT
+        )
+
+    def times_updated(self, tx, entity, limit=None):
+        """Query for times of relationships reachable from an entity.
+
+        :param tx: neo4j transaction context.
+        :type tx: neo4j.v1.api.Transaction
+        :param entity: Entity to start from
+        :type entity: cloud_snitch.models.base.VersionedEntity
+        :param limit: Optional maximum number of times
+        :type limit: int|None
+        :returns: Times in milliseconds, newest first
+        :rtype: list
+        """
+        cypher = """
+            MATCH p = (e:{} {{ {}:$identity }})-[*]->(n)
+            WITH relationships(p) AS rels
+            UNWIND rels AS r
+            RETURN DISTINCT r.from AS t
+            ORDER BY t DESC
+        """
+        cypher = cypher.format(entity.label, entity.identity_property)
+        if limit is not None:
+            cypher += ' LIMIT {}'.format(int(limit))
+        logger.debug("Running query to gather timestamps.")
+        logger.debug(cypher)
+        result = tx.run(cypher, identity=entity.identity)
+        return [r['t'] for r in result]
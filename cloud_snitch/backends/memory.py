@@ -0,0 +1,279 @@
+"""In memory versioned graph.
+
+Holds identity nodes in per label identity maps, states as interval lists
+and edges as interval lists with an index of current edges. Meant for
+testing and benchmarking snitchers without a database.
+"""
+import logging
+
+from cloud_snitch import utils
+
+from .base import Backend
+
+logger = logging.getLogger(__name__)
+
+
+class Interval(object):
+    """Span of time a state or an edge is valid."""
+
+    __slots__ = ('frm', 'to', 'props')
+
+    def __init__(self, frm, to=utils.EOT, props=None):
+        """Init the interval.
+
+        :param frm: Start time in milliseconds
+        :type frm: int
+        :param to: End time in milliseconds
+        :type to: int
+        :param props: Properties of a state
+        :type props: dict
+        """
+        self.frm = frm
+        self.to = to
+        self.props = props
+
+    @property
+    def current(self):
+        """Whether or not the interval is current.
+
+        :returns: True if current
+        :rtype: bool
+        """
+        return self.to == utils.EOT
+
+
+class MemoryGraph(object):
+    """Versioned graph held in python data structures."""
+
+    def __init__(self):
+        """Init an empty graph."""
+        # label -> entity class
+        self.models = {}
+
+        # label -> identity -> identity node properties
+        self.identities = {}
+
+        # (label, identity) -> list of state intervals, oldest first
+        self.states = {}
+
+        # (src label, src identity, rel, dest label) ->
+        #   dest identity -> list of edge intervals, oldest first
+        self.edges = {}
+
+        # (src label, src identity, rel, dest label) -> current identities
+        self.current = {}
+
+        # (label, identity) -> set of edge keys leaving the node
+        self.outgoing = {}
+
+    def identity_map(self, label):
+        """Get the identity map of a label.
+
+        :param label: Node label
+        :type label: str
+        :returns: identity -> properties
+        :rtype: dict
+        """
+        return self.identities.setdefault(label, {})
+
+    def node_count(self, label=None):
+        """Count identity nodes.
+
+        :param label: Optional label to count
+        :type label: str|None
+        :returns: Number of identity nodes
+        :rtype: int
+        """
+        if label is not None:
+            return len(self.identities.get(label, {}))
+        return sum(len(m) for m in self.identities.values())
+
+    def state_count(self):
+        """Count state nodes.
+
+        :returns: Number of state nodes
+        :rtype: int
+        """
+        return sum(len(s) for s in self.states.values())
+
+    def edge_count(self):
+        """Count versioned edges between identities.
+
+        :returns: Number of edges
+        :rtype: int
+        """
+        count = 0
+        for dests in self.edges.values():
+            count += sum(len(i) for i in dests.values())
+        return count
+
+
+class MemoryBackend(Backend):
+    """Backend for a MemoryGraph."""
+
+    def __init__(self, graph):
+        """Init the backend.
+
+        :param graph: Graph to operate on
+        :type graph: MemoryGraph
+        """
+        self.graph = graph
+
+    def _edge_key(self, edgeset):
+        """Build the key of an edge set.
+
+        :param edgeset: Edge set
+        :type edgeset: cloud_snitch.models.base.VersionedEdgeSet
+        :returns: Edge set key
+        :rtype: tuple
+        """
+        return (
+            edgeset.source.label,
+            edgeset.source.identity,
+            edgeset.name,
+            edgeset.dest_type.label
+        )
+
+    def find(self, tx, model, identity):
+        props = self.graph.identities.get(model.label, {}).get(identity)
+        if props is None:
+            return None
+        return dict(props)
+
+    def merge_identity(self, tx, entity, time_in_ms):
+        self.graph.models[entity.label] = entity.__class__
+        identity_map = self.graph.identity_map(entity.label)
+        props = identity_map.get(entity.identity)
+        if props is None:
+            props = {
+                entity.identity_property: entity.identity,
+                'created_at': time_in_ms
+            }
+            identity_map[entity.identity] = props
+        elif entity.immutable:
+            return
+        for prop in entity.static_properties:
+            val = getattr(entity, prop, None)
+            if val is not None:
+                props[prop] = val
+
+    def current_state(self, tx, entity):
+        intervals = self.graph.states.get((entity.label, entity.identity))
+        if intervals and intervals[-1].current:
+            return dict(intervals[-1].props)
+        return None
+
+    def roll_state(self, tx, entity, props, time_in_ms):
+        key = (entity.label, entity.identity)
+        if entity.identity not in self.graph.identities.get(entity.label, {}):
+            return
+        intervals = self.graph.states.setdefault(key, [])
+        if intervals and intervals[-1].current:
+            intervals[-1].to = time_in_ms
+        intervals.append(Interval(time_in_ms, props=dict(props)))
+
+    def current_edges(self, tx, edgeset):
+        return set(self.graph.current.get(self._edge_key(edgeset), set()))
+
+    def close_edge(self, tx, edgeset, identity, time_in_ms):
+        key = self._edge_key(edgeset)
+        current = self.graph.current.get(key)
+        if current is None or identity not in current:
+            return
+        current.discard(identity)
+        self.graph.edges[key][identity][-1].to = time_in_ms
+
+    def create_edge(self, tx, edgeset, identity, time_in_ms):
+        dest_map = self.graph.identities.get(edgeset.dest_type.label, {})
+        source_map = self.graph.identities.get(edgeset.source.label, {})
+        if identity not in dest_map or \
+                edgeset.source.identity not in source_map:
+            # Same as the cypher MATCH finding nothing.
+            return
+
+        key = self._edge_key(edgeset)
+        current = self.graph.current.setdefault(key, set())
+        if identity in current:
+            return
+        current.add(identity)
+        dests = self.graph.edges.setdefault(key, {})
+        dests.setdefault(identity, []).append(Interval(time_in_ms))
+        self.graph.outgoing.setdefault(
+            (edgeset.source.label, edgeset.source.identity),
+            set()
+        ).add(key)
+
+    def times_updated(self, tx, entity, limit=None):
+        times = set()
+        seen = set()
+        stack = [(entity.label, entity.identity)]
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            for interval in self.graph.states.get(node, []):
+                times.add(interval.frm)
+            for key in self.graph.outgoing.get(node, []):
+                dest_label = key[3]
+                for dest, intervals in self.graph.edges[key].items():
+                    for interval in intervals:
+                        times.add(interval.frm)
+                    stack.append((dest_label, dest))
+        times = sorted(times, reverse=True)
+        if limit is not None:
+            times = times[:limit]
+        return times
+
+
+class MemoryTransaction(object):
+    """Transaction context for a memory graph.
+
+    Changes are applied immediately and are not rolled back.
+    """
+
+    def __init__(self, backend):
+        """Init the transaction.
+
+        :param backend: Backend to hand to entities
+        :type backend: MemoryBackend
+        """
+        self.backend = backend
+
+    def run(self, statement, parameters=None, **kwparameters):
+        raise NotImplementedError('Memory graphs do not run cypher.')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class MemorySession(MemoryTransaction):
+    """Session for a memory graph."""
+
+    def begin_transaction(self, *args, **kwargs):
+        return MemoryTransaction(self.backend)
+
+    def close(self):
+        pass
+
+
+class MemoryDriver(object):
+    """Driver that hands out sessions on a memory graph."""
+
+    def __init__(self, graph=None):
+        """Init the driver.
+
+        :param graph: Graph to use. A new graph is created by default.
+        :type graph: MemoryGraph
+        """
+        self.graph = graph or MemoryGraph()
+        self.backend = MemoryBackend(self.graph)
+
+    def session(self, *args, **kwargs):
+        return MemorySession(self.backend)
+
+    def close(self):
+        pass
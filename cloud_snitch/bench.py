@@ -0,0 +1,384 @@
+"""Benchmarks for the python side of syncing.
+
+Measurements run without a database. Queries are either answered from a
+recording made with `cloud-snitch-sync --record` or applied to an in
+memory graph, so timings cover parsing run data, building entities and
+constructing queries. Document compressions are compared by disk use and
+read throughput.
+"""
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from cloud_snitch import documents
+from cloud_snitch import runs
+from cloud_snitch.backends import MemoryDriver
+from cloud_snitch.manifest import RunManifest
+from cloud_snitch.models.registry import CACHE_ENV
+from cloud_snitch.replay import ReplayDriver
+from cloud_snitch.sync import SNITCHERS
+
+logger = logging.getLogger(__name__)
+
+
+parser = argparse.ArgumentParser(
+    description="Benchmark cloud snitch without a database."
+)
+subparsers = parser.add_subparsers(dest='command')
+
+replay_parser = subparsers.add_parser(
+    'replay',
+    help="Time snitchers against a recorded sync."
+)
+replay_parser.add_argument(
+    'recording',
+    type=str,
+    help="Recording made with cloud-snitch-sync --record."
+)
+replay_parser.add_argument(
+    'runs',
+    type=str,
+    nargs='+',
+    help="Paths of the runs that were recorded, in sync order."
+)
+replay_parser.add_argument(
+    '--repeat',
+    type=int,
+    default=3,
+    help="How many times to replay the runs."
+)
+
+memory_parser = subparsers.add_parser(
+    'memory',
+    help="Time snitchers against an in memory graph."
+)
+memory_parser.add_argument(
+    'runs',
+    type=str,
+    nargs='+',
+    help="Paths of runs to consume, in sync order."
+)
+memory_parser.add_argument(
+    '--repeat',
+    type=int,
+    default=3,
+    help="How many times to consume the runs into a new graph."
+)
+
+compression_parser = subparsers.add_parser(
+    'compression',
+    help="Compare disk use and read throughput of document compressions."
+)
+compression_parser.add_argument(
+    'runs',
+    type=str,
+    nargs='+',
+    help="Paths of runs whose documents are compressed and read."
+)
+compression_parser.add_argument(
+    '--repeat',
+    type=int,
+    default=3,
+    help="How many times to read the documents."
+)
+
+startup_parser = subparsers.add_parser(
+    'startup',
+    help="Time imports and the first use of the model registry."
+)
+startup_parser.add_argument(
+    'modules',
+    type=str,
+    nargs='*',
+    default=['cloud_snitch.sync', 'cloud_snitch.models'],
+    help="Modules to import in a fresh interpreter."
+)
+startup_parser.add_argument(
+    '--repeat',
+    type=int,
+    default=5,
+    help="How many interpreters to start per measurement."
+)
+
+# Imports a module and loads the registry, printing both durations.
+_STARTUP_SCRIPT = """
+import time
+start = time.time()
+import {module}
+imported = time.time()
+from cloud_snitch.models import registry
+registry.models
+print(imported - start, time.time() - imported)
+"""
+
+
+def summarize(timings):
+    """Summarize lists of timings.
+
+    :param timings: Name -> list of seconds
+    :type timings: dict
+    :returns: List of (name, count, min, mean, max) tuples
+    :rtype: list
+    """
+    rows = []
+    for name, values in timings.items():
+        rows.append((
+            name,
+            len(values),
+            min(values),
+            sum(values) / len(values),
+            max(values)
+        ))
+    return rows
+
+
+def time_snitchers(driver_factory, paths, repeat):
+    """Time every snitcher for every run.
+
+    A fresh driver is used for every repetition so that every repetition
+    starts from the same graph.
+
+    :param driver_factory: Callable returning a new driver
+    :type driver_factory: callable
+    :param paths: Paths of runs
+    :type paths: list
+    :param repeat: Number of repetitions
+    :type repeat: int
+    :returns: Snitcher name -> list of seconds. The key 'total' holds
+        the time of each repetition.
+    :rtype: dict
+    """
+    timings = {s.__name__: [] for s in SNITCHERS}
+    timings['total'] = []
+    for _ in range(repeat):
+        driver = driver_factory()
+        repeat_start = time.time()
+        for path in paths:
+            run = runs.Run(path)
+            for snitcher_class in SNITCHERS:
+                start = time.time()
+                snitcher_class(driver, run).snitch()
+                timings[snitcher_class.__name__].append(time.time() - start)
+        timings['total'].append(time.time() - repeat_start)
+        driver.close()
+    return timings
+
+
+def bench_replay(recording, paths, repeat):
+    """Time every snitcher for every run against a recording.
+
+    :param recording: Path of the recording
+    :type recording: str
+    :param paths: Paths of recorded runs
+    :type paths: list
+    :param repeat: Number of repetitions
+    :type repeat: int
+    :returns: Snitcher name -> list of seconds
+    :rtype: dict
+    """
+    return time_snitchers(lambda: ReplayDriver(recording), paths, repeat)
+
+
+def bench_memory(paths, repeat):
+    """Time every snitcher for every run against an in memory graph.
+
+    :param paths: Paths of runs
+    :type paths: list
+    :param repeat: Number of repetitions
+    :type repeat: int
+    :returns: Tuple of (timings, graph of the last repetition)
+    :rtype: tuple
+    """
+    drivers = []
+
+    def factory():
+        drivers.append(MemoryDriver())
+        return drivers[-1]
+
+    timings = time_snitchers(factory, paths, repeat)
+    return timings, drivers[-1].graph
+
+
+def time_startup(module, env):
+    """Time a fresh interpreter importing a module and loading models.
+
+    :param module: Module to import
+    :type module: str
+    :param env: Environment of the interpreter
+    :type env: dict
+    :returns: Tuple of (import seconds, registry seconds)
+    :rtype: tuple
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-c', _STARTUP_SCRIPT.format(module=module)],
+        env=env
+    )
+    imported, loaded = output.decode('utf-8').split()[-2:]
+    return float(imported), float(loaded)
+
+
+def bench_startup(modules, repeat):
+    """Time startup without the registry cache and with a warm cache.
+
+    :param modules: Modules to import
+    :type modules: list
+    :param repeat: Number of interpreters per measurement
+    :type repeat: int
+    :returns: Measurement name -> list of seconds
+    :rtype: dict
+    """
+    tmpdir = tempfile.mkdtemp()
+    timings = {}
+    try:
+        cold_env = dict(os.environ)
+        cold_env.pop(CACHE_ENV, None)
+        warm_env = dict(os.environ)
+        warm_env[CACHE_ENV] = os.path.join(tmpdir, 'registry.json')
+        for module in modules:
+            # Fill the cache once before timing it.
+            time_startup(module, warm_env)
+            for name, env in (('nocache', cold_env), ('cache', warm_env)):
+                for _ in range(repeat):
+                    imported, loaded = time_startup(module, env)
+                    key = '{} {}'.format(module, name)
+                    timings.setdefault(key + ' import', []).append(imported)
+                    timings.setdefault(key + ' registry', []).append(loaded)
+    finally:
+        shutil.rmtree(tmpdir)
+    return timings
+
+
+def run_documents(path):
+    """List the documents of a run, excluding run data.
+
+    :param path: Path of the run
+    :type path: str
+    :returns: List of paths
+    :rtype: list
+    """
+    manifest = RunManifest.scan(path)
+    paths = [manifest.document_path(f) for f in sorted(manifest.files)]
+    for doctype in sorted(manifest.hosts):
+        paths.extend(p for _, p in manifest.host_documents(doctype))
+    return paths
+
+
+def bench_compression(paths, repeat):
+    """Compare compressions of the documents of runs.
+
+    Documents are rewritten with every available compression into a
+    temporary directory and then read back repeatedly.
+
+    :param paths: Paths of runs
+    :type paths: list
+    :param repeat: Number of times to read all documents
+    :type repeat: int
+    :returns: List of (compression, bytes on disk, uncompressed bytes,
+        list of read seconds) tuples
+    :rtype: list
+    """
+    sources = []
+    for path in paths:
+        sources.extend(run_documents(path))
+
+    results = []
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for compression in documents.available_compressions():
+            written = []
+            raw_bytes = 0
+            for i, source in enumerate(sources):
+                plain, _ = documents.split_suffix(os.path.basename(source))
+                data = documents.read_document(source)
+                target = os.path.join(tmpdir, '{}_{}'.format(i, plain))
+                written.append(documents.write_document(
+                    target,
+                    data,
+                    compression=compression
+                ))
+            disk_bytes = sum(os.path.getsize(p) for p in written)
+
+            timings = []
+            for _ in range(repeat):
+                raw_bytes = 0
+                start = time.time()
+                for p in written:
+                    raw_bytes += len(documents.read_bytes(p))
+                    documents.read_document(p)
+                timings.append(time.time() - start)
+            results.append((
+                compression or 'none',
+                disk_bytes,
+                raw_bytes,
+                timings
+            ))
+            for p in written:
+                os.remove(p)
+    finally:
+        shutil.rmtree(tmpdir)
+    return results
+
+
+def log_compression(results):
+    """Log compression results as a table.
+
+    :param results: Results of bench_compression
+    :type results: list
+    """
+    logger.info('{:<8} {:>14} {:>8} {:>10} {:>10}'.format(
+        'codec', 'disk(bytes)', 'ratio', 'mean(s)', 'MB/s'
+    ))
+    for compression, disk_bytes, raw_bytes, timings in results:
+        mean = sum(timings) / len(timings)
+        logger.info('{:<8} {:>14} {:>8.2f} {:>10.4f} {:>10.2f}'.format(
+            compression,
+            disk_bytes,
+            raw_bytes / float(disk_bytes or 1),
+            mean,
+            raw_bytes / 1e6 / mean if mean else 0.0
+        ))
+
+
+def log_rows(rows):
+    """Log summarized timings as a table.
+
+    :param rows: List of (name, count, min, mean, max) tuples
+    :type rows: list
+    """
+    logger.info('{:<32} {:>6} {:>10} {:>10} {:>10}'.format(
+        'name', 'count', 'min(s)', 'mean(s)', 'max(s)'
+    ))
+    for row in rows:
+        logger.info('{:<32} {:>6} {:>10.4f} {:>10.4f} {:>10.4f}'.format(*row))
+
+
+def main():
+    args = parser.parse_args()
+    if args.command == 'replay':
+        timings = bench_replay(args.recording, args.runs, args.repeat)
+        log_rows(summarize(timings))
+    elif args.command == 'memory':
+        timings, graph = bench_memory(args.runs, args.repeat)
+        log_rows(summarize(timings))
+        logger.info(
+            "Graph has {} identities, {} states and {} edges.".format(
+                graph.node_count(),
+                graph.state_count(),
+                graph.edge_count()
+            )
+        )
+    elif args.command == 'startup':
+        log_rows(sorted(summarize(bench_startup(args.modules, args.repeat))))
+    elif args.command == 'compression':
+        log_compression(bench_compression(args.runs, args.repeat))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
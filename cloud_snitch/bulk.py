@@ -0,0 +1,300 @@
+"""Bulk load the first run of an environment.
+
+The first run of an environment can not match any existing environment
+scoped nodes or edges. The run is consumed into an in memory graph and
+then written with batched UNWIND statements instead of reading and
+comparing current state one entity at a time.
+
+Every statement is idempotent, so a load that failed partway can be
+run again. Identities are merged and states and edges are only created
+when missing. The environment node and its edges are written last, in
+one transaction. Until that transaction commits the environment does
+not exist and the next sync loads the run in bulk again.
+"""
+import logging
+import time
+
+from cloud_snitch import settings
+from cloud_snitch.backends import MemoryDriver
+from cloud_snitch.decorators import transient_retry
+from cloud_snitch.models import EnvironmentEntity
+
+logger = logging.getLogger(__name__)
+
+
+def batches(rows, size):
+    """Split a list into batches.
+
+    :param rows: List to split
+    :type rows: list
+    :param size: Maximum size of each batch
+    :type size: int
+    :yields: Lists of at most size items
+    :ytype: list
+    """
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+@transient_retry
+def write_batch(session, cypher, rows):
+    """Run a statement for a batch of rows in one transaction.
+
+    :param session: neo4j driver session
+    :type session: neo4j.v1.session.BoltSession
+    :param cypher: Statement with an UNWIND over $rows
+    :type cypher: str
+    :param rows: Rows of the batch
+    :type rows: list
+    """
+    with session.begin_transaction() as tx:
+        tx.run(cypher, rows=rows)
+
+
+@transient_retry
+def write_statements(session, statements):
+    """Run several statements in one transaction.
+
+    :param session: neo4j driver session
+    :type session: neo4j.v1.session.BoltSession
+    :param statements: List of (cypher, rows) tuples
+    :type statements: list
+    """
+    with session.begin_transaction() as tx:
+        for cypher, rows in statements:
+            tx.run(cypher, rows=rows)
+
+
+def identity_rows(model, identities):
+    """Build rows for identity nodes of a model.
+
+    :param model: Entity class
+    :type model: type
+    :param identities: identity -> properties
+    :type identities: dict
+    :returns: List of row dicts
+    :rtype: list
+    """
+    rows = []
+    for identity, props in identities.items():
+        static = {}
+        for prop in model.static_properties:
+            if props.get(prop) is not None:
+                static[prop] = props[prop]
+        rows.append({
+            'identity': identity,
+            'created_at': props['created_at'],
+            'static': static
+        })
+    return rows
+
+
+def identity_cypher(model):
+    """Build the statement writing identity nodes of a model.
+
+    :param model: Entity class
+    :type model: type
+    :returns: Cypher statement
+    :rtype: str
+    """
+    if model.shared and model.immutable:
+        cypher = """
+            UNWIND $rows AS row
+            MERGE (n:{} {{ {}: row.identity }})
+            ON CREATE SET n.created_at = row.created_at, n += row.static
+        """
+    elif model.shared:
+        cypher = """
+            UNWIND $rows AS row
+            MERGE (n:{} {{ {}: row.identity }})
+            ON CREATE SET n.created_at = row.created_at, n += row.static
+            ON MATCH SET n += row.static
+        """
+    else:
+        cypher = """
+            UNWIND $rows AS row
+            MERGE (n:{} {{ {}: row.identity }})
+            ON CREATE SET n.created_at = row.created_at
+            SET n += row.static
+        """
+    return cypher.format(model.label, model.identity_property)
+
+
+def state_cypher(model):
+    """Build the statement creating states of a model.
+
+    :param model: Entity class
+    :type model: type
+    :returns: Cypher statement
+    :rtype: str
+    """
+    cypher = """
+        UNWIND $rows AS row
+        MATCH (n:{} {{ {}: row.identity }})
+        WHERE NOT (n)-[:HAS_STATE {{ from: row.from }}]->(:{})
+        CREATE (n)-[:HAS_STATE {{ from: row.from, to: row.to }}]->(s:{})
+        SET s = row.props
+    """
+    return cypher.format(
+        model.label,
+        model.identity_property,
+        model.state_label,
+        model.state_label
+    )
+
+
+def edge_cypher(source, rel_name, dest):
+    """Build the statement creating edges of a relationship.
+
+    :param source: Source entity class
+    :type source: type
+    :param rel_name: Name of the relationship
+    :type rel_name: str
+    :param dest: Destination entity class
+    :type dest: type
+    :returns: Cypher statement
+    :rtype: str
+    """
+    cypher = """
+        UNWIND $rows AS row
+        MATCH (s:{} {{ {}: row.source }})
+        MATCH (d:{} {{ {}: row.dest }})
+        MERGE (s)-[:{} {{ from: row.from, to: row.to }}]->(d)
+    """
+    return cypher.format(
+        source.label,
+        source.identity_property,
+        dest.label,
+        dest.identity_property,
+        rel_name
+    )
+
+
+def write_graph(driver, graph, batch_size):
+    """Write an in memory graph that has no nodes in the database yet.
+
+    :param driver: Neo4J database driver instance
+    :type driver: neo4j.v1.GraphDatabase.driver
+    :param graph: Graph to write
+    :type graph: cloud_snitch.backends.MemoryGraph
+    :param batch_size: Maximum number of rows per transaction
+    :type batch_size: int
+    :returns: Counts of written identities, states and edges
+    :rtype: dict
+    """
+    counts = {'identities': 0, 'states': 0, 'edges': 0}
+
+    # Statements of the environment, written last in one transaction
+    marker = []
+    with driver.session() as session:
+        # Identities first so that states and edges can match them.
+        for label in sorted(graph.identities):
+            model = graph.models[label]
+            cypher = identity_cypher(model)
+            rows = identity_rows(model, graph.identities[label])
+            counts['identities'] += len(rows)
+            if label == EnvironmentEntity.label:
+                marker.append((cypher, rows))
+                continue
+            for batch in batches(rows, batch_size):
+                write_batch(session, cypher, batch)
+
+        state_rows = {}
+        shared_states = []
+        for (label, identity), intervals in graph.states.items():
+            if graph.models[label].shared:
+                shared_states.append((label, identity, intervals[-1]))
+                continue
+            rows = state_rows.setdefault(label, [])
+            for interval in intervals:
+                rows.append({
+                    'identity': identity,
+                    'from': interval.frm,
+                    'to': interval.to,
+                    'props': interval.props
+                })
+        for label in sorted(state_rows):
+            cypher = state_cypher(graph.models[label])
+            counts['states'] += len(state_rows[label])
+            if label == EnvironmentEntity.label:
+                marker.append((cypher, state_rows[label]))
+                continue
+            for batch in batches(state_rows[label], batch_size):
+                write_batch(session, cypher, batch)
+
+        # Shared identities may already have a state to compare with.
+        for label, identity, interval in shared_states:
+            props = dict(graph.identities[label][identity])
+            props.update(interval.props)
+            entity = graph.models[label](**props)
+            with session.begin_transaction() as tx:
+                entity._update_state(tx, interval.frm)
+            counts['states'] += 1
+
+        edge_rows = {}
+        for key, dests in graph.edges.items():
+            source_label, source_identity, rel_name, dest_label = key
+            rows = edge_rows.setdefault(
+                (source_label, rel_name, dest_label),
+                []
+            )
+            for dest_identity, intervals in dests.items():
+                for interval in intervals:
+                    rows.append({
+                        'source': source_identity,
+                        'dest': dest_identity,
+                        'from': interval.frm,
+                        'to': interval.to
+                    })
+        for key in sorted(edge_rows):
+            source_label, rel_name, dest_label = key
+            cypher = edge_cypher(
+                graph.models[source_label],
+                rel_name,
+                graph.models[dest_label]
+            )
+            counts['edges'] += len(edge_rows[key])
+            if EnvironmentEntity.label in (source_label, dest_label):
+                marker.append((cypher, edge_rows[key]))
+                continue
+            for batch in batches(edge_rows[key], batch_size):
+                write_batch(session, cypher, batch)
+
+        # The environment exists once everything else is written.
+        if marker:
+            write_statements(session, marker)
+    return counts
+
+
+def bulk_consume(driver, run, consume, batch_size=None):
+    """Consume the first run of an environment in bulk.
+
+    :param driver: Neo4J database driver instance
+    :type driver: neo4j.v1.GraphDatabase.driver
+    :param run: Run to consume
+    :type run: cloud_snitch.runs.Run
+    :param consume: Callable consuming a run with a driver
+    :type consume: callable
+    :param batch_size: Maximum number of rows per transaction.
+        Defaults to the configured batch size.
+    :type batch_size: int|None
+    """
+    batch_size = batch_size or settings.BULK_LOAD['batch_size']
+
+    start = time.time()
+    memory_driver = MemoryDriver()
+    consume(memory_driver, run)
+    logger.info("Built graph for {} in {:.3f}s.".format(
+        run.path,
+        time.time() - start
+    ))
+
+    start = time.time()
+    counts = write_graph(driver, memory_driver.graph, batch_size)
+    logger.info(
+        "Bulk loaded {identities} identities, {states} states and "
+        "{edges} edges in {seconds:.3f}s.".format(
+            seconds=time.time() - start,
+            **counts
+        )
+    )
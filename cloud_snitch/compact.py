@@ -0,0 +1,472 @@
+"""Compact version history according to a retention policy.
+
+Versions that ended recently are all kept. Older versions are thinned to
+one per day and versions older than that to one per month. Consecutive
+closed state intervals of an entity that fall into the same day or month
+are merged into the last of them and the other state nodes are deleted.
+Closed intervals of an edge between the same two nodes are merged the
+same way. Current states and edges are never touched.
+
+Blob properties still stored inline on state nodes, from before the
+property moved to a blob node, are moved to their blob nodes first.
+With --blobs-only they are moved without compacting any history.
+
+History is rewritten in place, so the epoch of the generation counters
+is incremented afterwards to replace cached results at old times.
+"""
+import argparse
+import logging
+import time
+
+from cloud_snitch import settings
+from cloud_snitch import utils
+from cloud_snitch.bulk import write_statements
+from cloud_snitch.constraints import _models
+from cloud_snitch.driver import DriverContext
+from cloud_snitch.generation import Generations
+
+logger = logging.getLogger(__name__)
+
+DAY_MS = 24 * 3600 * 1000
+
+parser = argparse.ArgumentParser(
+    description="Compact state and edge history of the graph."
+)
+parser.add_argument(
+    '--keep-all-days',
+    type=int,
+    default=settings.COMPACTION['keep_all_days'],
+    help="Keep every version that ended within this many days."
+)
+parser.add_argument(
+    '--daily-days',
+    type=int,
+    default=settings.COMPACTION['daily_days'],
+    help="Keep one version per day within this many days. Older "
+         "versions are kept one per month."
+)
+parser.add_argument(
+    '--batch-size',
+    type=int,
+    default=settings.COMPACTION['batch_size'],
+    help="Maximum number of nodes read and compacted per transaction."
+)
+parser.add_argument(
+    '--dry-run',
+    action='store_true',
+    help="Report what would be reclaimed without changing the graph."
+)
+parser.add_argument(
+    '--blobs-only',
+    action='store_true',
+    help="Only move config file contents stored on state nodes to blob "
+         "nodes. History is left untouched."
+)
+
+_STATE_PAGE = """
+    MATCH (n:{label})
+    WHERE id(n) > $after
+    WITH n ORDER BY id(n) LIMIT $limit
+    OPTIONAL MATCH (n)-[r:HAS_STATE]->(:{state_label})
+    WHERE r.to < $cutoff
+    WITH n, collect(r) AS rels
+    RETURN
+        id(n) AS node,
+        NULL AS dest,
+        [r IN rels | {{
+            rel: id(r), state: id(endNode(r)), from: r.from, to: r.to
+        }}] AS intervals
+"""
+
+_EDGE_PAGE = """
+    MATCH (n:{label})
+    WHERE id(n) > $after
+    WITH n ORDER BY id(n) LIMIT $limit
+    OPTIONAL MATCH (n)-[r:{rel_name}]->(d:{dest_label})
+    WHERE r.to < $cutoff
+    WITH n, d, collect(r) AS rels
+    RETURN
+        id(n) AS node,
+        id(d) AS dest,
+        [r IN rels | {{rel: id(r), from: r.from, to: r.to}}] AS intervals
+"""
+
+_COUNT_INLINE_BLOBS = """
+    MATCH (s:{state_label})
+    WHERE s.{prop} IS NOT NULL AND s.{key} IS NOT NULL
+    RETURN count(s) AS inline
+"""
+
+_MOVE_INLINE_BLOBS = """
+    MATCH (s:{state_label})
+    WHERE s.{prop} IS NOT NULL AND s.{key} IS NOT NULL
+    WITH s LIMIT $limit
+    MERGE (b:{blob_label} {{ {blob_identity}: s.{key} }})
+    ON CREATE SET b.created_at = $now, b.{prop} = s.{prop}
+    REMOVE s.{prop}
+    RETURN count(s) AS moved
+"""
+
+_EXTEND = """
+    UNWIND $rows AS row
+    MATCH ()-[r]->()
+    WHERE id(r) = row.rel
+    SET r.from = row.from
+"""
+
+_DELETE_STATES = """
+    UNWIND $rows AS row
+    MATCH (s)
+    WHERE id(s) = row
+    DETACH DELETE s
+"""
+
+_DELETE_EDGES = """
+    UNWIND $rows AS row
+    MATCH ()-[r]->()
+    WHERE id(r) = row
+    DELETE r
+"""
+
+
+class RetentionPolicy(object):
+    """Decides which closed versions may be merged."""
+
+    def __init__(self, keep_all_days=30, daily_days=365, now=None):
+        """Init the policy.
+
+        :param keep_all_days: Keep every version that ended within
+            this many days.
+        :type keep_all_days: int
+        :param daily_days: Keep one version per day within this many days
+        :type daily_days: int
+        :param now: Reference time in milliseconds. Defaults to now.
+        :type now: int|None
+        """
+        now = utils.milliseconds_now() if now is None else now
+        self.cutoff = now - keep_all_days * DAY_MS
+        self.daily_cutoff = now - max(daily_days, keep_all_days) * DAY_MS
+
+    def bucket(self, to):
+        """Get the retention bucket of a version.
+
+        :param to: End of the version in milliseconds
+        :type to: int
+        :returns: None if the version is kept as is, otherwise a key
+            shared by versions that may be merged.
+        :rtype: tuple|None
+        """
+        if to >= self.cutoff:
+            return None
+        dt = utils.utcdatetime(to)
+        if to >= self.daily_cutoff:
+            return (dt.year, dt.month, dt.day)
+        return (dt.year, dt.month)
+
+
+def plan_merges(intervals, policy):
+    """Group consecutive touching intervals that share a retention bucket.
+
+    Intervals only touch when one ends where the next starts. A gap
+    between intervals, like an edge that was removed and added again,
+    is never merged away.
+
+    :param intervals: Interval dicts with 'from' and 'to' keys
+    :type intervals: list
+    :param policy: Retention policy
+    :type policy: RetentionPolicy
+    :returns: List of (kept interval, new from, removed intervals) tuples.
+        The kept interval is the last of its group.
+    :rtype: list
+    """
+    merges = []
+    group = []
+    group_bucket = None
+    for interval in sorted(intervals, key=lambda i: i['from']):
+        bucket = policy.bucket(interval['to'])
+        if bucket is not None and bucket == group_bucket and \
+                group[-1]['to'] == interval['from']:
+            group.append(interval)
+            continue
+        if len(group) > 1:
+            merges.append((group[-1], group[0]['from'], group[:-1]))
+        group = [interval]
+        group_bucket = bucket
+    if len(group) > 1:
+        merges.append((group[-1], group[0]['from'], group[:-1]))
+    return merges
+
+
+class Compactor(object):
+    """Applies a retention policy to the graph."""
+
+    def __init__(self, driver, policy, batch_size=1000, dry_run=False):
+        """Init the compactor.
+
+        :param driver: Neo4J database driver instance
+        :type driver: neo4j.v1.GraphDatabase.driver
+        :param policy: Retention policy
+        :type policy: RetentionPolicy
+        :param batch_size: Maximum nodes read or rows written at once
+        :type batch_size: int
+        :param dry_run: Only count what would be reclaimed
+        :type dry_run: bool
+        """
+        self.driver = driver
+        self.policy = policy
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+
+    def _pages(self, session, cypher):
+        """Read nodes of a page statement in batches of node ids.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param cypher: Page statement
+        :type cypher: str
+        :yields: Lists of (dest id, intervals) tuples
+        :ytype: list
+        """
+        after = -1
+        while True:
+            with session.begin_transaction() as tx:
+                records = list(tx.run(
+                    cypher,
+                    after=after,
+                    limit=self.batch_size,
+                    cutoff=self.policy.cutoff
+                ))
+            if not records:
+                return
+            after = max(r['node'] for r in records)
+            yield [
+                (r['dest'], r['intervals'])
+                for r in records if len(r['intervals']) > 1
+            ]
+
+    def _apply(self, session, extends, deletes, delete_cypher):
+        """Write a planned page in one transaction.
+
+        Deleting merged versions and extending the kept versions either
+        both happen or neither does, so history never has holes.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param extends: Rows of {rel, from} for kept intervals
+        :type extends: list
+        :param deletes: Ids to delete
+        :type deletes: list
+        :param delete_cypher: Statement deleting ids
+        :type delete_cypher: str
+        """
+        if self.dry_run or not deletes:
+            return
+        # Delete before extending so intervals never overlap.
+        write_statements(
+            session,
+            [(delete_cypher, deletes), (_EXTEND, extends)]
+        )
+
+    def _compact(self, session, cypher, delete_key, delete_cypher):
+        """Compact all pages of a statement.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param cypher: Page statement
+        :type cypher: str
+        :param delete_key: Key of the id to delete in interval dicts
+        :type delete_key: str
+        :param delete_cypher: Statement deleting ids
+        :type delete_cypher: str
+        :returns: Number of deleted states or edges
+        :rtype: int
+        """
+        reclaimed = 0
+        for page in self._pages(session, cypher):
+            extends = []
+            deletes = []
+            for _, intervals in page:
+                for kept, frm, removed in plan_merges(intervals, self.policy):
+                    extends.append({'rel': kept['rel'], 'from': frm})
+                    deletes.extend(i[delete_key] for i in removed)
+            self._apply(session, extends, deletes, delete_cypher)
+            reclaimed += len(deletes)
+        return reclaimed
+
+    def _run_single(self, session, cypher, **params):
+        """Run a statement returning a single value in a transaction.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param cypher: Statement to run
+        :type cypher: str
+        :returns: First value of the single record
+        :rtype: object
+        """
+        with session.begin_transaction() as tx:
+            return tx.run(cypher, **params).single()[0]
+
+    def move_inline_blobs(self, session, model):
+        """Move blob properties stored on state nodes to blob nodes.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param model: Entity class
+        :type model: type
+        :returns: Number of state nodes that held blob properties
+        :rtype: int
+        """
+        moved = 0
+        for prop, (key, blob_model) in sorted(model.blob_properties.items()):
+            fmt = dict(
+                state_label=model.state_label,
+                prop=prop,
+                key=key,
+                blob_label=blob_model.label,
+                blob_identity=blob_model.identity_property
+            )
+            if self.dry_run:
+                moved += self._run_single(
+                    session,
+                    _COUNT_INLINE_BLOBS.format(**fmt)
+                )
+                continue
+            cypher = _MOVE_INLINE_BLOBS.format(**fmt)
+            while True:
+                count = self._run_single(
+                    session,
+                    cypher,
+                    limit=self.batch_size,
+                    now=utils.milliseconds_now()
+                )
+                moved += count
+                if count < self.batch_size:
+                    break
+        return moved
+
+    def compact_states(self, session, model):
+        """Merge state history of a model.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param model: Entity class
+        :type model: type
+        :returns: Number of reclaimed state nodes
+        :rtype: int
+        """
+        cypher = _STATE_PAGE.format(
+            label=model.label,
+            state_label=model.state_label
+        )
+        return self._compact(session, cypher, 'state', _DELETE_STATES)
+
+    def compact_edges(self, session, model, rel_name, dest):
+        """Merge edge history of a relationship.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param model: Source entity class
+        :type model: type
+        :param rel_name: Name of the relationship
+        :type rel_name: str
+        :param dest: Destination entity class
+        :type dest: type
+        :returns: Number of reclaimed edges
+        :rtype: int
+        """
+        cypher = _EDGE_PAGE.format(
+            label=model.label,
+            rel_name=rel_name,
+            dest_label=dest.label
+        )
+        return self._compact(session, cypher, 'rel', _DELETE_EDGES)
+
+    def move_blobs(self):
+        """Move blob properties of every model to blob nodes.
+
+        :returns: Dict of state label -> number of state nodes that held
+            blob properties
+        :rtype: dict
+        """
+        moved = {}
+        with self.driver.session() as session:
+            for model in _models:
+                if model.blob_properties:
+                    moved[model.state_label] = \
+                        self.move_inline_blobs(session, model)
+                    logger.info("Moved inline blobs of {} {} nodes.".format(
+                        moved[model.state_label],
+                        model.state_label
+                    ))
+        return moved
+
+    def compact(self):
+        """Compact the history of every model.
+
+        Inline blobs are moved first.
+
+        :returns: Tuple of (reclaimed states, reclaimed edges) where each
+            is a dict of label or relationship name -> count
+        :rtype: tuple
+        """
+        self.move_blobs()
+        states = {}
+        edges = {}
+        with self.driver.session() as session:
+            for model in _models:
+                states[model.label] = self.compact_states(session, model)
+                logger.info("Reclaimed {} {} nodes.".format(
+                    states[model.label],
+                    model.state_label
+                ))
+                for rel_name, dest in model.children.values():
+                    edges[rel_name] = edges.get(rel_name, 0) + \
+                        self.compact_edges(session, model, rel_name, dest)
+                    logger.info("Reclaimed {} {} edges.".format(
+                        edges[rel_name],
+                        rel_name
+                    ))
+        return states, edges
+
+
+def main():
+    start = time.time()
+    args = parser.parse_args()
+    policy = RetentionPolicy(
+        keep_all_days=args.keep_all_days,
+        daily_days=args.daily_days
+    )
+    with DriverContext() as driver:
+        compactor = Compactor(
+            driver,
+            policy,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run
+        )
+        if args.blobs_only:
+            moved = compactor.move_blobs()
+        else:
+            states, edges = compactor.compact()
+    if not args.dry_run:
+        Generations(settings.GENERATION['redis_url']).bump(epoch=True)
+    if args.blobs_only:
+        logger.info(
+            "{} blobs of {} state nodes in {:.3f} seconds".format(
+                'Would move' if args.dry_run else 'Moved',
+                sum(moved.values()),
+                time.time() - start
+            )
+        )
+        return
+    logger.info(
+        "{} {} state nodes and {} edges in {:.3f} seconds".format(
+            'Would reclaim' if args.dry_run else 'Reclaimed',
+            sum(states.values()),
+            sum(edges.values()),
+            time.time() - start
+        )
+    )
+
+
+if __name__ == '__main__':
+    main()
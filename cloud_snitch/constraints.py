@@ -1,14 +1,47 @@
+"""Manage constraints and indexes of the graph.
+
+The schema the queries need is derived from the models:
+
+- A uniqueness constraint on the identity property of every model.
+- An index on every property the identity property is concatenated
+  from. Searches and the default orderings filter on these.
+- An index on every state property on the state label of its model.
+  Searches filter and sort on state properties. Properties listed in
+  unindexed_properties are too large to index and left out.
+- An index on the from and to properties of HAS_STATE and every child
+  relationship. Every versioned query filters on these. Relationship
+  property indexes need Neo4j 4.3 or newer and are skipped with a
+  notice on older servers.
+
+Managing the schema is idempotent. Only missing constraints and indexes
+are created. Constraints and indexes in the database that are not
+derived from the models are reported as unused but never dropped.
+"""
+import argparse
 import logging
+import re
+import sys
+
+from collections import namedtuple
 
-from cloud_snitch import settings
-from neo4j.v1 import GraphDatabase
 from cloud_snitch import models
+from cloud_snitch.driver import DriverContext
 
 logger = logging.getLogger(__name__)
 
+parser = argparse.ArgumentParser(
+    description="Create missing constraints and indexes of the graph."
+)
+parser.add_argument(
+    '--check',
+    action='store_true',
+    help="Only report the schema. Exits non zero when constraints or "
+         "indexes are missing or failed."
+)
 
 _models = [
     models.AptPackageEntity,
+    models.ConfigfileBlobEntity,
     models.ConfigfileEntity,
     models.ConfiguredInterfaceEntity,
     models.DeviceEntity,
@@ -28,21 +61,321 @@ _models = [
     models.VirtualenvEntity
 ]
 
+UNIQUE = 'unique'
+NODE_INDEX = 'node_index'
+RELATIONSHIP_INDEX = 'relationship_index'
 
-def main():
-    driver = GraphDatabase.driver(
-        settings.NEO4J_URI,
-        auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD)
-    )
-    template = 'CREATE CONSTRAINT ON (n:{label}) ASSERT n.{prop} IS UNIQUE'
-    with driver.session() as session:
-        with session.begin_transaction() as tx:
-            for _model in _models:
-                tx.run(template.format(
-                    label=_model.label,
-                    prop=_model.identity_property)
+# Server versions introducing statement syntax.
+NODE_INDEX_FOR_VERSION = (4, 0)
+RELATIONSHIP_INDEX_VERSION = (4, 3)
+CONSTRAINT_REQUIRE_VERSION = (4, 4)
+
+INTERVAL_PROPERTIES = ('from', 'to')
+
+# Descriptions of db.indexes() rows on 3.x servers without token columns
+_INDEX_DESCRIPTION = re.compile(r'^INDEX ON :`?(\w+)`?\((.+)\)$')
+_CONSTRAINT_DESCRIPTION = re.compile(
+    r'^CONSTRAINT ON \(\s*`?\w+`?:`?(\w+)`?\s*\) '
+    r'ASSERT `?\w+`?\.`?(\w+)`? IS UNIQUE$'
+)
+
+
+class SchemaItem(namedtuple('SchemaItem', ['kind', 'token', 'properties'])):
+    """A constraint or index on a label or relationship type."""
+
+    def __str__(self):
+        if self.kind == RELATIONSHIP_INDEX:
+            return 'INDEX ()-[:{}]-() ON ({})'.format(
+                self.token,
+                ', '.join(self.properties)
+            )
+        return '{} :{}({})'.format(
+            'UNIQUE' if self.kind == UNIQUE else 'INDEX',
+            self.token,
+            ', '.join(self.properties)
+        )
+
+    def create_statement(self, version):
+        """Build the statement creating the item.
+
+        :param version: Server version
+        :type version: tuple
+        :returns: Cypher statement
+        :rtype: str
+        """
+        if self.kind == UNIQUE:
+            if version >= CONSTRAINT_REQUIRE_VERSION:
+                template = 'CREATE CONSTRAINT FOR (n:{}) REQUIRE n.{} ' \
+                    'IS UNIQUE'
+            else:
+                template = 'CREATE CONSTRAINT ON (n:{}) ASSERT n.{} IS UNIQUE'
+            return template.format(self.token, self.properties[0])
+
+        if self.kind == NODE_INDEX:
+            if version >= NODE_INDEX_FOR_VERSION:
+                return 'CREATE INDEX FOR (n:{}) ON ({})'.format(
+                    self.token,
+                    ', '.join('n.{}'.format(p) for p in self.properties)
                 )
-    driver.close()
+            return 'CREATE INDEX ON :{}({})'.format(
+                self.token,
+                ', '.join(self.properties)
+            )
+
+        return 'CREATE INDEX FOR ()-[r:{}]-() ON ({})'.format(
+            self.token,
+            ', '.join('r.{}'.format(p) for p in self.properties)
+        )
+
+
+SchemaReport = namedtuple(
+    'SchemaReport',
+    ['version', 'present', 'missing', 'failed', 'unused', 'unsupported']
+)
+
+
+def required_schema(entities):
+    """Derive the constraints and indexes needed by a set of models.
+
+    :param entities: Entity classes
+    :type entities: list
+    :returns: Sorted list of schema items
+    :rtype: list
+    """
+    items = set()
+    rel_types = set(['HAS_STATE'])
+    for model in entities:
+        items.add(SchemaItem(UNIQUE, model.label, (model.identity_property,)))
+        for props in model.concat_properties.values():
+            for prop in props:
+                items.add(SchemaItem(NODE_INDEX, model.label, (prop,)))
+        for prop in model.state_properties:
+            if prop in model.unindexed_properties:
+                continue
+            items.add(SchemaItem(NODE_INDEX, model.state_label, (prop,)))
+        for rel_name, _ in model.children.values():
+            rel_types.add(rel_name)
+    for rel_type in rel_types:
+        items.add(SchemaItem(
+            RELATIONSHIP_INDEX,
+            rel_type,
+            INTERVAL_PROPERTIES
+        ))
+    return sorted(items)
+
+
+def _parse_description(data):
+    """Get the token, properties and uniqueness from a description.
+
+    Neo4j 3.3 only describes an index in text, like
+    'INDEX ON :Host(hostname)' or
+    'CONSTRAINT ON ( host:Host ) ASSERT host.hostname IS UNIQUE'.
+
+    :param data: Row of db.indexes()
+    :type data: dict
+    :returns: Tuple of (token, properties, unique) or None
+    :rtype: tuple|None
+    """
+    description = (data.get('description') or '').strip()
+    match = _CONSTRAINT_DESCRIPTION.match(description)
+    if match:
+        return match.group(1), (match.group(2),), True
+    match = _INDEX_DESCRIPTION.match(description)
+    if match:
+        properties = tuple(
+            p.strip().strip('`') for p in match.group(2).split(',')
+        )
+        return match.group(1), properties, False
+    return None
+
+
+def existing_item(data):
+    """Build a schema item from a row of db.indexes().
+
+    Handles the columns of 3.x and 4.x servers. Rows without token
+    columns are read from their description.
+
+    :param data: Row of db.indexes()
+    :type data: dict
+    :returns: Schema item or None for indexes that can not be expressed
+        as a schema item, like token lookup indexes.
+    :rtype: SchemaItem|None
+    """
+    tokens = data.get('labelsOrTypes') or data.get('tokenNames')
+    if tokens is None and data.get('label') is not None:
+        tokens = [data['label']]
+    properties = data.get('properties')
+    unique = False
+    if tokens is None and properties is None:
+        parsed = _parse_description(data)
+        if parsed is None:
+            return None
+        token, properties, unique = parsed
+        tokens = [token]
+    if not tokens or len(tokens) != 1 or not properties:
+        return None
+
+    if data.get('entityType') == 'RELATIONSHIP':
+        kind = RELATIONSHIP_INDEX
+    elif unique or data.get('uniqueness') == 'UNIQUE' or \
+            data.get('type') == 'node_unique_property':
+        kind = UNIQUE
+    else:
+        kind = NODE_INDEX
+    return SchemaItem(kind, tokens[0], tuple(properties))
+
+
+class SchemaManager(object):
+    """Compares and creates the schema of the graph."""
+
+    def __init__(self, driver, entities=None):
+        """Init the manager.
+
+        :param driver: Neo4J database driver instance
+        :type driver: neo4j.v1.GraphDatabase.driver
+        :param entities: Entity classes. Defaults to every model.
+        :type entities: list|None
+        """
+        self.driver = driver
+        self.entities = _models if entities is None else entities
+
+    def _read(self, session, cypher):
+        """Read all records of a statement.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param cypher: Statement to run
+        :type cypher: str
+        :returns: Records as dicts
+        :rtype: list
+        """
+        with session.begin_transaction() as tx:
+            return [r.data() for r in tx.run(cypher)]
+
+    def server_version(self, session):
+        """Get the version of the server.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :returns: Version like (3, 3)
+        :rtype: tuple
+        """
+        for row in self._read(session, 'CALL dbms.components()'):
+            if row['name'] == 'Neo4j Kernel':
+                parts = row['versions'][0].split('-')[0].split('.')
+                return tuple(int(p) for p in parts[:2])
+        return (0, 0)
+
+    def existing(self, session):
+        """Get the constraints and indexes in the database.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :returns: Schema item -> state, like 'ONLINE' or 'FAILED'
+        :rtype: dict
+        """
+        items = {}
+        for row in self._read(session, 'CALL db.indexes()'):
+            item = existing_item(row)
+            if item is not None:
+                items[item] = (row.get('state') or '').upper()
+        return items
+
+    def report(self, session):
+        """Compare the schema in the database with the required schema.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :returns: Report of the schema
+        :rtype: SchemaReport
+        """
+        version = self.server_version(session)
+        existing = self.existing(session)
+        required = required_schema(self.entities)
+
+        present = []
+        missing = []
+        failed = []
+        unsupported = []
+        for item in required:
+            if item.kind == RELATIONSHIP_INDEX and \
+                    version < RELATIONSHIP_INDEX_VERSION:
+                unsupported.append(item)
+            elif item not in existing:
+                missing.append(item)
+            elif existing[item] == 'FAILED':
+                failed.append(item)
+            else:
+                present.append(item)
+        unused = sorted(set(existing) - set(required))
+        return SchemaReport(
+            version, present, missing, failed, unused, unsupported
+        )
+
+    def check(self):
+        """Report the schema without changing it.
+
+        :returns: Report of the schema
+        :rtype: SchemaReport
+        """
+        with self.driver.session() as session:
+            return self.report(session)
+
+    def apply(self):
+        """Create missing constraints and indexes.
+
+        :returns: Report of the schema after creating missing items
+        :rtype: SchemaReport
+        """
+        with self.driver.session() as session:
+            report = self.report(session)
+            for item in report.missing:
+                logger.info("Creating {}".format(item))
+                with session.begin_transaction() as tx:
+                    tx.run(item.create_statement(report.version))
+            if not report.missing:
+                return report
+            return self.report(session)
+
+
+def log_report(report):
+    """Log a schema report.
+
+    :param report: Report to log
+    :type report: SchemaReport
+    """
+    logger.info("Schema of Neo4j {}: {} present, {} missing, {} failed, "
+                "{} unused.".format(
+                    '.'.join(str(v) for v in report.version),
+                    len(report.present),
+                    len(report.missing),
+                    len(report.failed),
+                    len(report.unused)
+                ))
+    for item in report.missing:
+        logger.warning("Missing {}".format(item))
+    for item in report.failed:
+        logger.error("Failed {}".format(item))
+    for item in report.unused:
+        logger.info("Unused {}".format(item))
+    if report.unsupported:
+        logger.info(
+            "Relationship property indexes need Neo4j {} or newer, "
+            "skipped {} interval indexes.".format(
+                '.'.join(str(v) for v in RELATIONSHIP_INDEX_VERSION),
+                len(report.unsupported)
+            )
+        )
+
+
+def main():
+    args = parser.parse_args()
+    with DriverContext() as driver:
+        manager = SchemaManager(driver)
+        report = manager.check() if args.check else manager.apply()
+    log_report(report)
+    if report.missing or report.failed:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
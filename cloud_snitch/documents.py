@@ -0,0 +1,113 @@
+"""Read and write json documents of a run.
+
+Documents may be stored as plain json or compressed with gzip or zstd.
+The compression is identified by a suffix following '.json'. zstd
+support requires the optional zstandard package.
+"""
+import gzip
+import json
+import logging
+
+from cloud_snitch.exc import CompressionUnavailableError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Compression name -> file suffix
+SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+
+def available_compressions():
+    """List compressions that can be read and written.
+
+    :returns: List of compression names. None is no compression.
+    :rtype: list
+    """
+    compressions = [None, 'gzip']
+    if zstandard is not None:
+        compressions.append('zstd')
+    return compressions
+
+
+def split_suffix(filename):
+    """Split the compression suffix from a filename.
+
+    :param filename: Filename or path
+    :type filename: str
+    :returns: Tuple of (filename without suffix, compression name or None)
+    :rtype: tuple
+    """
+    for compression, suffix in SUFFIXES.items():
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)], compression
+    return filename, None
+
+
+def read_bytes(path):
+    """Read and decompress the contents of a document.
+
+    :param path: Path of the document
+    :type path: str
+    :returns: Uncompressed contents
+    :rtype: bytes
+    """
+    _, compression = split_suffix(path)
+    if compression == 'gzip':
+        with gzip.open(path, 'rb') as f:
+            return f.read()
+    if compression == 'zstd':
+        if zstandard is None:
+            raise CompressionUnavailableError(compression)
+        # Frames written by write_document carry the content size.
+        with open(path, 'rb') as f:
+            return zstandard.ZstdDecompressor().decompress(f.read())
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def read_document(path):
+    """Load a plain or compressed json document.
+
+    :param path: Path of the document
+    :type path: str
+    :returns: Loaded document
+    :rtype: object
+    """
+    return json.loads(read_bytes(path).decode('utf-8'))
+
+
+def write_document(path, data, compression=None):
+    """Write a json document.
+
+    :param path: Plain path of the document ending in '.json'
+    :type path: str
+    :param data: Json serializable data
+    :type data: object
+    :param compression: None, 'gzip' or 'zstd'
+    :type compression: str|None
+    :returns: Path written including the compression suffix
+    :rtype: str
+    """
+    raw = json.dumps(data).encode('utf-8')
+    if compression is None:
+        with open(path, 'wb') as f:
+            f.write(raw)
+        return path
+
+    path += SUFFIXES[compression]
+    if compression == 'gzip':
+        with gzip.open(path, 'wb') as f:
+            f.write(raw)
+    else:
+        if zstandard is None:
+            raise CompressionUnavailableError(compression)
+        with open(path, 'wb') as f:
+            f.write(zstandard.ZstdCompressor().compress(raw))
+    return path
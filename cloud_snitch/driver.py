@@ -1,6 +1,9 @@
 import logging
 
 from cloud_snitch import settings
+from cloud_snitch.instrumentation import InstrumentedDriver
+from cloud_snitch.replay import RecordingDriver
+from cloud_snitch.replay import ReplayDriver
 from neo4j.v1 import GraphDatabase
 
 logger = logging.getLogger(__name__)
@@ -9,9 +12,21 @@ logger = logging.getLogger(__name__)
 class DriverContext():
     """Provide a driver for a context."""
 
-    def __init__(self):
-        """Init the context."""
+    def __init__(self, recorder=None, record=None, replay=None):
+        """Init the context.
+
+        :param recorder: Optional recorder to instrument the driver with
+        :type recorder: cloud_snitch.instrumentation.QueryRecorder
+        :param record: Optional path of a file to record traffic to
+        :type record: str
+        :param replay: Optional path of a recording to replay instead of
+            connecting to the database.
+        :type replay: str
+        """
         self.driver = None
+        self.recorder = recorder
+        self.record = record
+        self.replay = replay
 
     def __enter__(self):
         """Get an instance of the database driver according to settings.
@@ -19,15 +34,24 @@ class DriverContext():
         :returns: Instance of driver
         :rtype: neo4j.v1.GraphDatabase.driver
         """
-        self.driver = GraphDatabase.driver(
-            settings.NEO4J_URI,
-            auth=(
-                settings.NEO4J_USERNAME,
-                settings.NEO4J_PASSWORD
+        if self.replay is not None:
+            self.driver = ReplayDriver(self.replay)
+        else:
+            self.driver = GraphDatabase.driver(
+                settings.NEO4J_URI,
+                auth=(
+                    settings.NEO4J_USERNAME,
+                    settings.NEO4J_PASSWORD
+                )
             )
-        )
+            if self.record is not None:
+                self.driver = RecordingDriver(self.driver, self.record)
+        if self.recorder is not None:
+            self.driver = InstrumentedDriver(self.driver, self.recorder)
         return self.driver
 
     def __exit__(self, *args):
         """Close the driver."""
         self.driver.close()
+        if self.recorder is not None:
+            self.recorder.log_summary()
@@ -88,3 +88,27 @@ class MaxRetriesExceededError(Exception):
     def __init__(self):
         msg = 'Maximum number of retries has been reached.'
         super(MaxRetriesExceededError, self).__init__(msg)
+
+
+class ReplayMissError(Exception):
+    """Error for a statement missing from a recording."""
+    def __init__(self, statement):
+        """Init the error.
+
+        :param statement: Statement that was not recorded
+        :type statement: str
+        """
+        msg = 'No recorded result for statement: {}'.format(statement)
+        super(ReplayMissError, self).__init__(msg)
+
+
+class CompressionUnavailableError(Exception):
+    """Error for a compression whose module is not installed."""
+    def __init__(self, compression):
+        """Init the error.
+
+        :param compression: Name of the compression
+        :type compression: str
+        """
+        msg = 'Compression {} is not available.'.format(compression)
+        super(CompressionUnavailableError, self).__init__(msg)
@@ -0,0 +1,298 @@
+"""Export runs to csv files for neo4j-admin import.
+
+Every run in a data directory is consumed in time order into an in memory
+versioned graph. The graph is then written as node and relationship csv
+files so that a complete graph can be built with `neo4j-admin import`
+instead of syncing every run.
+"""
+import argparse
+import logging
+import os
+import time
+
+from cloud_snitch import runs
+from cloud_snitch import settings
+from cloud_snitch.backends import MemoryDriver
+from cloud_snitch.sync import consume
+
+logger = logging.getLogger(__name__)
+
+parser = argparse.ArgumentParser(
+    description="Export runs to csv files for neo4j-admin import."
+)
+parser.add_argument(
+    '--data-dir',
+    type=str,
+    default=settings.DATA_DIR,
+    help="Directory containing the runs to export."
+)
+parser.add_argument(
+    'output_dir',
+    type=str,
+    help="Directory to write csv files to."
+)
+
+
+def column_type(values):
+    """Determine the neo4j-admin import type of a column.
+
+    :param values: Values of the column that are not None
+    :type values: list
+    :returns: Type name or None for strings
+    :rtype: str|None
+    """
+    types = set(type(v) for v in values)
+    if types == set([list]):
+        items = [i for v in values for i in v]
+        return '{}[]'.format(column_type(items) or 'string')
+    if types == set([bool]):
+        return 'boolean'
+    if types == set([int]):
+        return 'long'
+    if types and types <= set([int, float]):
+        return 'double'
+    return None
+
+
+def _text(value):
+    """Convert a scalar to text.
+
+    :param value: Property value
+    :type value: object
+    :returns: Text of the value
+    :rtype: str
+    """
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def encode(value):
+    """Encode a value for a csv cell.
+
+    Missing values are left empty and strings are always quoted, so
+    neo4j-admin import keeps empty strings instead of treating them as
+    missing.
+
+    :param value: Property value
+    :type value: object
+    :returns: Cell value
+    :rtype: str
+    """
+    if value is None:
+        return ''
+    if isinstance(value, (bool, int, float)):
+        return _text(value)
+    if isinstance(value, list):
+        value = ';'.join(_text(v) for v in value)
+    return '"{}"'.format(str(value).replace('"', '""'))
+
+
+def write_row(f, cells):
+    """Write a row of encoded cells.
+
+    :param f: File to write to
+    :type f: file
+    :param cells: Encoded cells
+    :type cells: list
+    """
+    f.write(','.join(cells))
+    f.write('\n')
+
+
+def write_nodes(path, label, rows):
+    """Write a node csv file.
+
+    :param path: Path of the file
+    :type path: str
+    :param label: Label of every node in the file
+    :type label: str
+    :param rows: List of (id, properties) tuples
+    :type rows: list
+    """
+    columns = {}
+    for _, props in rows:
+        for key, value in props.items():
+            if value is not None:
+                columns.setdefault(key, []).append(value)
+    keys = sorted(columns)
+
+    header = [':ID', ':LABEL']
+    for key in keys:
+        kind = column_type(columns[key])
+        header.append(key if kind is None else '{}:{}'.format(key, kind))
+
+    with open(path, 'w', newline='') as f:
+        write_row(f, header)
+        for node_id, props in rows:
+            write_row(
+                f,
+                [encode(node_id), encode(label)] +
+                [encode(props.get(key)) for key in keys]
+            )
+
+
+def write_relationships(path, rel_type, rows):
+    """Write a relationship csv file.
+
+    :param path: Path of the file
+    :type path: str
+    :param rel_type: Type of every relationship in the file
+    :type rel_type: str
+    :param rows: List of (start id, end id, from, to) tuples
+    :type rows: list
+    """
+    with open(path, 'w', newline='') as f:
+        write_row(f, [':START_ID', ':END_ID', ':TYPE', 'from:long',
+                      'to:long'])
+        for start, end, frm, to in rows:
+            write_row(f, [encode(v) for v in (start, end, rel_type, frm, to)])
+
+
+def identity_id(label, identity):
+    """Build the import id of an identity node.
+
+    :param label: Node label
+    :type label: str
+    :param identity: Identity of the node
+    :type identity: str
+    :returns: Import id
+    :rtype: str
+    """
+    return '{}|{}'.format(label, identity)
+
+
+def state_id(state_label, identity, frm):
+    """Build the import id of a state node.
+
+    :param state_label: State node label
+    :type state_label: str
+    :param identity: Identity of the entity the state belongs to
+    :type identity: str
+    :param frm: Start of the state in milliseconds
+    :type frm: int
+    :returns: Import id
+    :rtype: str
+    """
+    return '{}|{}|{}'.format(state_label, identity, frm)
+
+
+def export_graph(graph, output_dir):
+    """Write a memory graph as csv files.
+
+    :param graph: Graph to export
+    :type graph: cloud_snitch.backends.MemoryGraph
+    :param output_dir: Directory to write to
+    :type output_dir: str
+    :returns: Tuple of (node files, relationship files)
+    :rtype: tuple
+    """
+    node_files = []
+    rel_files = []
+
+    for label in sorted(graph.identities):
+        rows = [
+            (identity_id(label, identity), props)
+            for identity, props in graph.identities[label].items()
+        ]
+        path = os.path.join(output_dir, 'nodes_{}.csv'.format(label))
+        write_nodes(path, label, rows)
+        node_files.append(path)
+
+    state_rows = {}
+    has_state = []
+    for (label, identity), intervals in graph.states.items():
+        model = graph.models[label]
+        rows = state_rows.setdefault(model.state_label, [])
+        for interval in intervals:
+            sid = state_id(model.state_label, identity, interval.frm)
+            rows.append((sid, interval.props))
+            has_state.append((
+                identity_id(label, identity),
+                sid,
+                interval.frm,
+                interval.to
+            ))
+    for state_label in sorted(state_rows):
+        path = os.path.join(output_dir, 'nodes_{}.csv'.format(state_label))
+        write_nodes(path, state_label, state_rows[state_label])
+        node_files.append(path)
+    if has_state:
+        path = os.path.join(output_dir, 'rels_HAS_STATE.csv')
+        write_relationships(path, 'HAS_STATE', has_state)
+        rel_files.append(path)
+
+    edge_rows = {}
+    for key, dests in graph.edges.items():
+        source_label, source_identity, rel_name, dest_label = key
+        rows = edge_rows.setdefault(rel_name, [])
+        start = identity_id(source_label, source_identity)
+        for dest_identity, intervals in dests.items():
+            end = identity_id(dest_label, dest_identity)
+            for interval in intervals:
+                rows.append((start, end, interval.frm, interval.to))
+    for rel_name in sorted(edge_rows):
+        path = os.path.join(output_dir, 'rels_{}.csv'.format(rel_name))
+        write_relationships(path, rel_name, edge_rows[rel_name])
+        rel_files.append(path)
+
+    return node_files, rel_files
+
+
+def build_graph(data_dir):
+    """Consume all finished runs in a directory in time order.
+
+    :param data_dir: Directory containing runs
+    :type data_dir: str
+    :returns: Graph of all runs
+    :rtype: cloud_snitch.backends.MemoryGraph
+    """
+    driver = MemoryDriver()
+    for run in runs.find_runs(data_dir):
+        if run.status != 'finished':
+            logger.info("Skipping unfinished run {}".format(run.path))
+            continue
+        logger.info("Consuming {}".format(run.path))
+        consume(driver, run)
+    return driver.graph
+
+
+def import_command(node_files, rel_files):
+    """Build the neo4j-admin command importing exported files.
+
+    :param node_files: Paths of node files
+    :type node_files: list
+    :param rel_files: Paths of relationship files
+    :type rel_files: list
+    :returns: Command line
+    :rtype: str
+    """
+    parts = ['neo4j-admin import', '--multiline-fields=true']
+    parts += ['--nodes={}'.format(f) for f in node_files]
+    parts += ['--relationships={}'.format(f) for f in rel_files]
+    return ' '.join(parts)
+
+
+def main():
+    start = time.time()
+    args = parser.parse_args()
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    graph = build_graph(args.data_dir)
+    logger.info(
+        "Built graph with {} identities, {} states and {} edges.".format(
+            graph.node_count(),
+            graph.state_count(),
+            graph.edge_count()
+        )
+    )
+    node_files, rel_files = export_graph(graph, args.output_dir)
+    logger.info("Import with: {}".format(
+        import_command(node_files, rel_files)
+    ))
+    logger.info("Finished in {} seconds".format(time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,13 @@
 import argparse
 import datetime
 import glob
-import json
 import logging
 import os
 import pytz
 
+from cloud_snitch import documents
 from cloud_snitch import settings
+from cloud_snitch.manifest import MANIFEST_FILENAME
 from cloud_snitch.runs import Run
 from cloud_snitch.exc import RunInvalidError
 
@@ -53,7 +54,7 @@ def increment_time(dt, delta_seconds):
 
 
 def iter_run_files(run):
-    """Yields a full path for every .json file in a run.
+    """Yields a full path for every plain or compressed .json file in a run.
 
     :param run: Run object to generate files for.
     :type run: cloud_snitch.run.Run
@@ -62,7 +63,11 @@ def iter_run_files(run):
     """
     for f in os.listdir(run.path):
         full = os.path.join(run.path, f)
-        if os.path.isfile(full) and full.endswith('.json'):
+        plain, _ = documents.split_suffix(full)
+        if f == MANIFEST_FILENAME:
+            # Copies change contents so the manifest would be stale.
+            continue
+        if os.path.isfile(full) and plain.endswith('.json'):
             yield full
 
 
@@ -94,8 +99,7 @@ def copy_run(output_dir, src_run, env_number, run_number):
 
     for filename in iter_run_files(src_run):
         logger.info("Copying file {}".format(filename))
-        with open(filename, 'r') as f:
-            data = json.loads(f.read())
+        data = documents.read_document(filename)
 
         if filename.endswith('run_data.json'):
             if 'synced' in data:
@@ -111,10 +115,10 @@ def copy_run(output_dir, src_run, env_number, run_number):
         data['environment']['name'] = envname
 
         _, filename = os.path.split(filename)
+        filename, compression = documents.split_suffix(filename)
         filename = os.path.join(dirname, filename)
-        with open(filename, 'w') as f:
-            logger.info("Saving file {}".format(filename))
-            f.write(json.dumps(data))
+        logger.info("Saving file {}".format(filename))
+        documents.write_document(filename, data, compression=compression)
 
 
 def fake(args):
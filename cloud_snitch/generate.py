@@ -0,0 +1,673 @@
+"""Generate synthetic fleets of runs for scale testing.
+
+Runs are written in the same directory format the collection callback
+produces. Every environment evolves from run to run according to churn
+rates so that syncing exercises state changes, new and removed edges and
+new shared identities. Output is fully determined by the arguments.
+"""
+import argparse
+import datetime
+import hashlib
+import logging
+import os
+import random
+
+from cloud_snitch import settings
+from cloud_snitch.documents import write_document
+from cloud_snitch.manifest import RunManifest
+
+logger = logging.getLogger(__name__)
+
+parser = argparse.ArgumentParser(
+    description="Generate synthetic runs for scale testing."
+)
+parser.add_argument(
+    '--environments',
+    type=int,
+    default=10,
+    help="How many environments to generate."
+)
+parser.add_argument(
+    '--hosts',
+    type=int,
+    default=10,
+    help="How many hosts per environment."
+)
+parser.add_argument(
+    '--runs',
+    type=int,
+    default=1,
+    help="How many runs per environment."
+)
+parser.add_argument(
+    '--virtualenvs',
+    type=int,
+    default=2,
+    help="How many virtualenvs per host."
+)
+parser.add_argument(
+    '--python-packages',
+    type=int,
+    default=50,
+    help="How many python packages per virtualenv."
+)
+parser.add_argument(
+    '--apt-packages',
+    type=int,
+    default=200,
+    help="How many apt packages per host."
+)
+parser.add_argument(
+    '--configfiles',
+    type=int,
+    default=10,
+    help="How many configuration files per host."
+)
+parser.add_argument(
+    '--configfile-size',
+    type=int,
+    default=2048,
+    help="Average size of configuration files in bytes."
+)
+parser.add_argument(
+    '--interfaces',
+    type=int,
+    default=4,
+    help="How many network interfaces per host."
+)
+parser.add_argument(
+    '--gitrepos',
+    type=int,
+    default=2,
+    help="How many git repos per environment."
+)
+parser.add_argument(
+    '--uservars',
+    type=int,
+    default=20,
+    help="How many user variables per environment."
+)
+parser.add_argument(
+    '--version-churn',
+    type=float,
+    default=0.02,
+    help="Chance per run that a package, kernel or repo changes version."
+)
+parser.add_argument(
+    '--content-churn',
+    type=float,
+    default=0.05,
+    help="Chance per run that a file, interface or variable changes."
+)
+parser.add_argument(
+    '--membership-churn',
+    type=float,
+    default=0.01,
+    help="Chance per run that a member of a collection is replaced."
+)
+parser.add_argument(
+    '--interval',
+    type=int,
+    default=24,
+    help="Hours between runs of an environment."
+)
+parser.add_argument(
+    '--start',
+    type=str,
+    default='2018-01-01T00:00:00',
+    help="Completion time of the first run of every environment."
+)
+parser.add_argument(
+    '--seed',
+    type=int,
+    default=0,
+    help="Seed for the random number generator."
+)
+parser.add_argument(
+    '--compression',
+    choices=['none', 'gzip', 'zstd'],
+    default='none',
+    help="Compression of written documents."
+)
+parser.add_argument(
+    '--output-dir',
+    type=str,
+    default=settings.DATA_DIR,
+    help='Directory in which to place generated data.'
+)
+
+# Size of the pools shared identities are drawn from.
+APT_POOL_SIZE = 5000
+PYTHON_POOL_SIZE = 2000
+NAMESERVERS = ['10.0.0.2', '10.0.0.3', '8.8.8.8', '8.8.4.4', '1.1.1.1']
+GIT_URLS = [
+    'https://git.openstack.org/openstack/openstack-ansible',
+    'https://github.com/openstack/openstack-ansible',
+    'https://github.com/rcbops/rpc-openstack',
+]
+
+
+def version(rng):
+    """Make a random version string.
+
+    :param rng: Random number generator
+    :type rng: random.Random
+    :returns: Version string
+    :rtype: str
+    """
+    return '{}.{}.{}'.format(
+        rng.randint(0, 5),
+        rng.randint(0, 20),
+        rng.randint(0, 30)
+    )
+
+
+def sha(rng):
+    """Make a random 40 character hex string.
+
+    :param rng: Random number generator
+    :type rng: random.Random
+    :returns: Hex string
+    :rtype: str
+    """
+    return '{:040x}'.format(rng.getrandbits(160))
+
+
+def contents(rng, size):
+    """Make random configuration file contents.
+
+    :param rng: Random number generator
+    :type rng: random.Random
+    :param size: Approximate size in bytes
+    :type size: int
+    :returns: File contents
+    :rtype: str
+    """
+    lines = []
+    length = 0
+    while length < size:
+        line = 'option_{} = {}'.format(rng.randint(0, 999), sha(rng)[:16])
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines)
+
+
+def md5(value):
+    """Get md5 hex digest of a string.
+
+    :param value: String to hash
+    :type value: str
+    :returns: Hex digest
+    :rtype: str
+    """
+    return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+
+def churn_dict(rng, d, rate, new_key, new_value):
+    """Replace members of a dict.
+
+    Each member is replaced by a new member with chance rate.
+
+    :param rng: Random number generator
+    :type rng: random.Random
+    :param d: Dict to churn in place
+    :type d: dict
+    :param rate: Chance of replacing each member
+    :type rate: float
+    :param new_key: Callable returning a new key
+    :type new_key: callable
+    :param new_value: Callable returning a new value
+    :type new_value: callable
+    """
+    for key in sorted(d):
+        if rng.random() < rate:
+            del d[key]
+            replacement = new_key()
+            while replacement in d:
+                replacement = new_key()
+            d[replacement] = new_value()
+
+
+def change_values(rng, d, rate, new_value):
+    """Change values of a dict.
+
+    :param rng: Random number generator
+    :type rng: random.Random
+    :param d: Dict to change in place
+    :type d: dict
+    :param rate: Chance of changing each value
+    :type rate: float
+    :param new_value: Callable returning a new value
+    :type new_value: callable
+    """
+    for key in sorted(d):
+        if rng.random() < rate:
+            d[key] = new_value()
+
+
+class HostState:
+    """Generated state of a single host."""
+
+    def __init__(self, rng, hostname, args):
+        """Generate an initial host.
+
+        :param rng: Random number generator
+        :type rng: random.Random
+        :param hostname: Name of the host
+        :type hostname: str
+        :param args: Parsed arguments
+        :type args: object
+        """
+        self.rng = rng
+        self.args = args
+        self.hostname = hostname
+        self.kernel = '4.4.0-{}-generic'.format(rng.randint(100, 130))
+        self.memtotal_mb = rng.choice([65536, 131072, 262144])
+        self.cores = rng.choice([8, 12, 16, 24])
+        self.ipv4 = '172.29.{}.{}'.format(
+            rng.randint(0, 255),
+            rng.randint(1, 254)
+        )
+        self.nameservers = sorted(rng.sample(NAMESERVERS, 2))
+
+        self.apt = {}
+        while len(self.apt) < args.apt_packages:
+            self.apt[self.new_apt_name()] = version(rng)
+
+        self.virtualenvs = {}
+        for i in range(args.virtualenvs):
+            path = '/openstack/venvs/venv-{}'.format(i)
+            self.virtualenvs[path] = self.new_virtualenv()
+
+        self.configfiles = {}
+        while len(self.configfiles) < args.configfiles:
+            self.configfiles[self.new_configfile_path()] = \
+                self.new_contents()
+
+        self.interfaces = {}
+        for i in range(args.interfaces):
+            self.interfaces['eth{}'.format(i)] = self.new_interface()
+
+    def new_apt_name(self):
+        """Pick an apt package name from the shared pool."""
+        return 'apt-package-{}'.format(self.rng.randint(0, APT_POOL_SIZE))
+
+    def new_python_name(self):
+        """Pick a python package name from the shared pool."""
+        return 'python-package-{}'.format(
+            self.rng.randint(0, PYTHON_POOL_SIZE)
+        )
+
+    def new_virtualenv(self):
+        """Generate the packages of a virtualenv."""
+        packages = {}
+        while len(packages) < self.args.python_packages:
+            packages[self.new_python_name()] = version(self.rng)
+        return packages
+
+    def new_configfile_path(self):
+        """Generate a configuration file path."""
+        return '/etc/service-{}/config-{}.conf'.format(
+            self.rng.randint(0, 20),
+            self.rng.randint(0, 1000)
+        )
+
+    def new_contents(self):
+        """Generate configuration file contents."""
+        size = int(self.rng.expovariate(1.0 / self.args.configfile_size))
+        return contents(self.rng, max(size, 16))
+
+    def new_interface(self):
+        """Generate a network interface."""
+        return {
+            'mtu': self.rng.choice([1500, 9000]),
+            'active': True,
+            'promisc': False,
+            'macaddress': ':'.join(
+                '{:02x}'.format(self.rng.randint(0, 255)) for _ in range(6)
+            ),
+            'ipv4_address': '10.{}.{}.{}'.format(
+                self.rng.randint(0, 255),
+                self.rng.randint(0, 255),
+                self.rng.randint(1, 254)
+            )
+        }
+
+    def churn(self):
+        """Evolve the host by one run."""
+        rng = self.rng
+        args = self.args
+
+        if rng.random() < args.version_churn:
+            self.kernel = '4.4.0-{}-generic'.format(rng.randint(100, 130))
+        change_values(rng, self.apt, args.version_churn,
+                      lambda: version(rng))
+        churn_dict(rng, self.apt, args.membership_churn,
+                   self.new_apt_name, lambda: version(rng))
+
+        for path in sorted(self.virtualenvs):
+            packages = self.virtualenvs[path]
+            change_values(rng, packages, args.version_churn,
+                          lambda: version(rng))
+            churn_dict(rng, packages, args.membership_churn,
+                       self.new_python_name, lambda: version(rng))
+
+        change_values(rng, self.configfiles, args.content_churn,
+                      self.new_contents)
+        churn_dict(rng, self.configfiles, args.membership_churn,
+                   self.new_configfile_path, self.new_contents)
+
+        for name in sorted(self.interfaces):
+            if rng.random() < args.content_churn:
+                self.interfaces[name]['mtu'] = rng.choice([1500, 9000])
+
+        if rng.random() < args.membership_churn:
+            self.nameservers = sorted(rng.sample(NAMESERVERS, 2))
+
+    def facts(self):
+        """Build ansible facts of the host.
+
+        :returns: Facts as gathered by ansible
+        :rtype: dict
+        """
+        facts = {
+            'ansible_architecture': 'x86_64',
+            'ansible_bios_date': '01/01/2017',
+            'ansible_bios_version': '2.4.3',
+            'ansible_kernel': self.kernel,
+            'ansible_memtotal_mb': self.memtotal_mb,
+            'ansible_fqdn': '{}.example.com'.format(self.hostname),
+            'ansible_pkg_mgr': 'apt',
+            'ansible_processor_cores': self.cores,
+            'ansible_processor_count': 2,
+            'ansible_processor_threads_per_core': 2,
+            'ansible_processor_vcpus': self.cores * 4,
+            'ansible_python_version': '2.7.12',
+            'ansible_service_mgr': 'systemd',
+            'ansible_selinux': False,
+            'ansible_default_ipv4': {'address': self.ipv4},
+            'ansible_lsb': {
+                'codename': 'xenial',
+                'description': 'Ubuntu 16.04.3 LTS',
+                'id': 'Ubuntu',
+                'major_release': '16',
+                'release': '16.04'
+            },
+            'ansible_python': {
+                'executable': '/usr/bin/python',
+                'type': 'CPython'
+            },
+            'ansible_version': {'full': '2.3.2.0'},
+            'ansible_dns': {'nameservers': self.nameservers},
+            'ansible_mounts': [{
+                'mount': '/',
+                'fstype': 'ext4',
+                'size_total': 500107862016,
+                'device': '/dev/sda1'
+            }],
+            'ansible_devices': {
+                'sda': {
+                    'removable': '0',
+                    'rotational': '1',
+                    'size': '465.76 GB',
+                    'partitions': {
+                        'sda1': {'size': '465.76 GB', 'start': '2048'}
+                    }
+                }
+            },
+            'ansible_interfaces': sorted(self.interfaces)
+        }
+        for name, interface in self.interfaces.items():
+            facts['ansible_{}'.format(name)] = {
+                'active': interface['active'],
+                'device': name,
+                'macaddress': interface['macaddress'],
+                'mtu': interface['mtu'],
+                'promisc': interface['promisc'],
+                'ipv4': {'address': interface['ipv4_address']}
+            }
+        return facts
+
+    def documents(self):
+        """Build per host documents.
+
+        :returns: doctype -> data
+        :rtype: dict
+        """
+        return {
+            'facts': self.facts(),
+            'dpkg_list': [
+                {
+                    'status': 'installed',
+                    'desired_action': 'install',
+                    'name': name,
+                    'version': v
+                }
+                for name, v in sorted(self.apt.items())
+            ],
+            'pip_list': {
+                path: [
+                    {'name': name, 'version': v}
+                    for name, v in sorted(packages.items())
+                ]
+                for path, packages in self.virtualenvs.items()
+            },
+            'file_dict': {
+                path: {
+                    'contents': text,
+                    'is_binary': 'false',
+                    'md5': md5(text)
+                }
+                for path, text in self.configfiles.items()
+            },
+            'configuredinterface': {
+                name: {
+                    'mtu': str(interface['mtu']),
+                    'address': interface['ipv4_address'],
+                    'netmask': '255.255.255.0'
+                }
+                for name, interface in self.interfaces.items()
+            }
+        }
+
+
+class EnvironmentState:
+    """Generated state of an environment and its hosts."""
+
+    def __init__(self, rng, number, args):
+        """Generate an initial environment.
+
+        :param rng: Random number generator
+        :type rng: random.Random
+        :param number: Number of the environment
+        :type number: int
+        :param args: Parsed arguments
+        :type args: object
+        """
+        self.rng = rng
+        self.args = args
+        self.account_number = str(100000 + number)
+        self.name = 'generated_{}'.format(format(number, '05'))
+        self.host_count = 0
+
+        self.hosts = {}
+        for _ in range(args.hosts):
+            self.add_host()
+
+        self.gitrepos = {}
+        for i in range(args.gitrepos):
+            self.gitrepos['/opt/repo-{}'.format(i)] = self.new_gitrepo()
+
+        self.uservars = {}
+        for i in range(args.uservars):
+            self.uservars['uservar_{}'.format(i)] = self.new_uservar()
+
+    @property
+    def environment(self):
+        """Environment dict as written by the callback.
+
+        :returns: Dict with account number and name
+        :rtype: dict
+        """
+        return {'account_number': self.account_number, 'name': self.name}
+
+    def add_host(self):
+        """Add a new host to the environment."""
+        hostname = '{}-host-{}'.format(self.name, self.host_count)
+        self.host_count += 1
+        self.hosts[hostname] = HostState(self.rng, hostname, self.args)
+
+    def new_gitrepo(self):
+        """Generate a git repo."""
+        return {
+            'head_sha': sha(self.rng),
+            'url': self.rng.choice(GIT_URLS),
+            'dirty': False
+        }
+
+    def new_uservar(self):
+        """Generate the value of a user variable."""
+        return self.rng.choice([
+            self.rng.randint(0, 1000),
+            sha(self.rng)[:12],
+            [sha(self.rng)[:8], sha(self.rng)[:8]]
+        ])
+
+    def churn(self):
+        """Evolve the environment by one run."""
+        rng = self.rng
+        args = self.args
+        for hostname in sorted(self.hosts):
+            if rng.random() < args.membership_churn:
+                del self.hosts[hostname]
+                self.add_host()
+        for hostname in sorted(self.hosts):
+            self.hosts[hostname].churn()
+
+        for path in sorted(self.gitrepos):
+            repo = self.gitrepos[path]
+            if rng.random() < args.version_churn:
+                repo['head_sha'] = sha(rng)
+            if rng.random() < args.content_churn:
+                repo['dirty'] = not repo['dirty']
+
+        change_values(rng, self.uservars, args.content_churn,
+                      self.new_uservar)
+
+    def gitrepos_document(self):
+        """Build the git repos document.
+
+        :returns: List of git repo dicts
+        :rtype: list
+        """
+        repos = []
+        for path, repo in sorted(self.gitrepos.items()):
+            repos.append({
+                'path': path,
+                'active_branch_name': 'master',
+                'is_detached': False,
+                'head_sha': repo['head_sha'],
+                'remotes': {'origin': [repo['url']]},
+                'merge_base': {'name': 'origin/master', 'diff': []},
+                'working_tree': {
+                    'is_dirty': repo['dirty'],
+                    'diff': ['diff --git a/x b/x'] if repo['dirty'] else [],
+                    'untracked_files': []
+                }
+            })
+        return repos
+
+
+def write_run(output_dir, env, run_number, completed, compression=None):
+    """Write a run of an environment.
+
+    :param output_dir: Directory to write the run into
+    :type output_dir: str
+    :param env: Environment to write
+    :type env: EnvironmentState
+    :param run_number: Number of the run
+    :type run_number: int
+    :param completed: Completion time of the run
+    :type completed: datetime.datetime
+    :param compression: Compression of documents other than run data
+    :type compression: str|None
+    :returns: Path of the run
+    :rtype: str
+    """
+    dirname = os.path.join(output_dir, '{}_{}'.format(
+        env.name,
+        format(run_number, '04')
+    ))
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+
+    for hostname, host in env.hosts.items():
+        for doctype, data in host.documents().items():
+            write_document(
+                os.path.join(dirname, '{}_{}.json'.format(doctype, hostname)),
+                {'environment': env.environment, 'host': hostname,
+                 'data': data},
+                compression=compression
+            )
+    write_document(
+        os.path.join(dirname, 'gitrepos.json'),
+        {'environment': env.environment, 'data': env.gitrepos_document()},
+        compression=compression
+    )
+    write_document(
+        os.path.join(dirname, 'uservars.json'),
+        {'environment': env.environment, 'data': env.uservars},
+        compression=compression
+    )
+
+    RunManifest.scan(dirname, checksums=True).save()
+
+    # Run data goes last so partially written runs are never found.
+    started = completed - datetime.timedelta(minutes=10)
+    write_document(os.path.join(dirname, 'run_data.json'), {
+        'status': 'finished',
+        'started': started.isoformat(),
+        'completed': completed.isoformat(),
+        'environment': env.environment
+    })
+    return dirname
+
+
+def generate(args):
+    """Generate all environments and runs.
+
+    :param args: Namespaced object from parsed arguments.
+    :type args: object
+    """
+    start = datetime.datetime.strptime(args.start, '%Y-%m-%dT%H:%M:%S')
+    interval = datetime.timedelta(hours=args.interval)
+    compression = None if args.compression == 'none' else args.compression
+    for i in range(args.environments):
+        rng = random.Random('{}-{}'.format(args.seed, i))
+        env = EnvironmentState(rng, i, args)
+        for j in range(args.runs):
+            if j:
+                env.churn()
+            path = write_run(
+                args.output_dir,
+                env,
+                j,
+                start + interval * j,
+                compression=compression
+            )
+            logger.info("Wrote run {} of {} for {} to {}".format(
+                j + 1,
+                args.runs,
+                env.name,
+                path
+            ))
+
+
+def main():
+    """Parse args and run the generate() function."""
+    args = parser.parse_args()
+    generate(args)
+
+
+if __name__ == '__main__':
+    main()
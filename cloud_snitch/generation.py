@@ -0,0 +1,112 @@
+"""Generation counters of the graph.
+
+Every completed sync increments a global counter in Redis. Readers of
+the graph can key cached results by generation so cached results are
+replaced exactly when new data lands.
+
+Results at old times are keyed by an epoch instead, so they survive
+regular syncs. The epoch is incremented by compaction, which rewrites
+old history, and by syncs of runs that completed longer ago than the
+settle window, which change history at old times.
+
+Redis is optional. Without the redis package or a configured url,
+counters are not kept and readers see no generation.
+"""
+import logging
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'cloud_snitch:generation:global'
+EPOCH_KEY = 'cloud_snitch:epoch'
+
+
+class Generations(object):
+    """Reads and increments generation counters."""
+
+    def __init__(self, url=None, client=None):
+        """Init the counters.
+
+        :param url: Redis url like redis://localhost:6379/2
+        :type url: str|None
+        :param client: Optional redis client to use instead of the url
+        :type client: redis.StrictRedis|None
+        """
+        self.client = client
+        if self.client is None and url and redis is not None:
+            self.client = redis.StrictRedis.from_url(url)
+
+    @property
+    def enabled(self):
+        """Whether counters are kept.
+
+        :returns: True if there is a redis client
+        :rtype: bool
+        """
+        return self.client is not None
+
+    def bump(self, epoch=False):
+        """Increment the generation after the graph changed.
+
+        Failures are logged but never raised. A sync should not fail
+        because cached results can not be invalidated.
+
+        :param epoch: Also increment the epoch because history at old
+            times changed.
+        :type epoch: bool
+        :returns: New generation or None
+        :rtype: int|None
+        """
+        if not self.enabled:
+            return None
+        try:
+            pipe = self.client.pipeline()
+            pipe.incr(GENERATION_KEY)
+            if epoch:
+                pipe.incr(EPOCH_KEY)
+            values = pipe.execute()
+        except Exception:
+            logger.exception('Unable to increment generation counters.')
+            return None
+        logger.debug("Generation is {}{}".format(
+            values[0],
+            ', epoch is {}'.format(values[1]) if epoch else ''
+        ))
+        return values[0]
+
+    def _read(self, key):
+        """Read a counter.
+
+        :param key: Redis key of the counter
+        :type key: str
+        :returns: Value or None if unknown
+        :rtype: int|None
+        """
+        if not self.enabled:
+            return None
+        try:
+            value = self.client.get(key)
+        except Exception:
+            logger.exception('Unable to read counter {}.'.format(key))
+            return None
+        return int(value or 0)
+
+    def current(self):
+        """Get the current generation.
+
+        :returns: Generation or None if unknown
+        :rtype: int|None
+        """
+        return self._read(GENERATION_KEY)
+
+    def epoch(self):
+        """Get the current epoch.
+
+        :returns: Epoch or None if unknown
+        :rtype: int|None
+        """
+        return self._read(EPOCH_KEY)
@@ -0,0 +1,533 @@
+"""Instrumentation for neo4j drivers.
+
+Wraps a driver so that every statement run through one of its sessions or
+transactions is timed and summarized by query template. Statements slower
+than a threshold are written to a slow query log and a sampled fraction of
+read only statements can be re-run with PROFILE to capture db hits.
+
+Results are streamed to the caller. Latency and row counts are recorded
+once the caller finishes a result.
+"""
+import logging
+import random
+import re
+import time
+import warnings
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('cloud_snitch.slow_query')
+
+_WHITESPACE = re.compile(r'\s+')
+
+# Clauses that make a statement unsafe to run a second time.
+_WRITE_CLAUSES = re.compile(
+    r'\b(CREATE|MERGE|SET|DELETE|REMOVE|DROP|CALL|LOAD\s+CSV)\b',
+    re.IGNORECASE
+)
+
+
+def template(statement):
+    """Normalize a statement into a template.
+
+    Statements are built from formatted strings with parameters passed
+    separately, so collapsing whitespace is enough to group them.
+
+    :param statement: Cypher statement
+    :type statement: str
+    :returns: Normalized statement
+    :rtype: str
+    """
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+def parameter_size(value):
+    """Compute an approximate size of a parameter value.
+
+    :param value: Parameter value
+    :type value: object
+    :returns: Length of sized values, 1 otherwise.
+    :rtype: int
+    """
+    if isinstance(value, (str, bytes, list, tuple, dict, set)):
+        return len(value)
+    return 1
+
+
+def parameter_sizes(parameters):
+    """Compute sizes of all parameters.
+
+    :param parameters: Statement parameters
+    :type parameters: dict
+    :returns: Parameter name -> size
+    :rtype: dict
+    """
+    return {k: parameter_size(v) for k, v in parameters.items()}
+
+
+def is_read_only(statement):
+    """Determine if a statement is safe to run more than once.
+
+    :param statement: Cypher statement
+    :type statement: str
+    :returns: True if the statement only reads, False otherwise
+    :rtype: bool
+    """
+    stripped = statement.lstrip().upper()
+    if stripped.startswith('PROFILE') or stripped.startswith('EXPLAIN'):
+        return False
+    return _WRITE_CLAUSES.search(statement) is None
+
+
+def db_hits(plan):
+    """Sum db hits of a profiled plan and all of its children.
+
+    :param plan: Profiled plan from a result summary
+    :type plan: neo4j.v1.result.ProfiledPlan
+    :returns: Total number of db hits
+    :rtype: int
+    """
+    if plan is None:
+        return 0
+    total = getattr(plan, 'db_hits', 0) or 0
+    for child in getattr(plan, 'children', []) or []:
+        total += db_hits(child)
+    return total
+
+
+class QueryStats:
+    """Aggregated statistics for a single query template."""
+
+    def __init__(self, template):
+        """Init the stats.
+
+        :param template: Query template the stats are for.
+        :type template: str
+        """
+        self.template = template
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+        self.max_parameter_size = 0
+        self.profiled = 0
+        self.db_hits = 0
+
+    def record(self, elapsed, rows, sizes):
+        """Record a single execution.
+
+        :param elapsed: Execution time in seconds
+        :type elapsed: float
+        :param rows: Number of records returned
+        :type rows: int
+        :param sizes: Parameter name -> size
+        :type sizes: dict
+        """
+        self.count += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.rows += rows
+        self.max_parameter_size = max(
+            [self.max_parameter_size] + list(sizes.values())
+        )
+
+    def record_profile(self, hits):
+        """Record db hits from a profiled execution.
+
+        :param hits: Number of db hits
+        :type hits: int
+        """
+        self.profiled += 1
+        self.db_hits += hits
+
+    def todict(self):
+        """Dictionary representation of the stats.
+
+        :returns: Dict of stats
+        :rtype: dict
+        """
+        avg_db_hits = None
+        if self.profiled:
+            avg_db_hits = float(self.db_hits) / self.profiled
+        return dict(
+            template=self.template,
+            count=self.count,
+            total_time=self.total_time,
+            avg_time=self.total_time / self.count if self.count else 0.0,
+            max_time=self.max_time,
+            rows=self.rows,
+            max_parameter_size=self.max_parameter_size,
+            profiled=self.profiled,
+            avg_db_hits=avg_db_hits
+        )
+
+
+class QueryRecorder:
+    """Collects statistics about statements run through a driver."""
+
+    def __init__(self, slow_query_ms=None, profile_sample_rate=0.0, rng=None):
+        """Init the recorder.
+
+        :param slow_query_ms: Statements slower than this are logged.
+            None disables the slow query log.
+        :type slow_query_ms: int|None
+        :param profile_sample_rate: Fraction of read only statements to
+            re-run with PROFILE.
+        :type profile_sample_rate: float
+        :param rng: Random number generator used for sampling.
+        :type rng: random.Random
+        """
+        self.slow_query_ms = slow_query_ms
+        self.profile_sample_rate = profile_sample_rate or 0.0
+        self.rng = rng or random.Random()
+        self.stats = {}
+
+    def _stats(self, statement):
+        """Get or create stats for a statement's template.
+
+        :param statement: Cypher statement
+        :type statement: str
+        :returns: Stats for the template
+        :rtype: QueryStats
+        """
+        key = template(statement)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = QueryStats(key)
+            self.stats[key] = stats
+        return stats
+
+    def record(self, statement, parameters, elapsed, rows):
+        """Record the execution of a statement.
+
+        :param statement: Cypher statement
+        :type statement: str
+        :param parameters: Statement parameters
+        :type parameters: dict
+        :param elapsed: Execution time in seconds
+        :type elapsed: float
+        :param rows: Number of records returned
+        :type rows: int
+        """
+        sizes = parameter_sizes(parameters)
+        stats = self._stats(statement)
+        stats.record(elapsed, rows, sizes)
+
+        elapsed_ms = elapsed * 1000
+        if self.slow_query_ms is not None and \
+                elapsed_ms >= self.slow_query_ms:
+            slow_logger.warning(
+                "Slow query ({:.1f} ms, {} rows, parameter sizes {}): {}"
+                .format(elapsed_ms, rows, sizes, stats.template)
+            )
+
+    def should_profile(self, statement):
+        """Decide if a statement should be re-run with PROFILE.
+
+        :param statement: Cypher statement
+        :type statement: str
+        :returns: True to profile, False otherwise
+        :rtype: bool
+        """
+        if self.profile_sample_rate <= 0:
+            return False
+        if not is_read_only(statement):
+            return False
+        return self.rng.random() < self.profile_sample_rate
+
+    def record_profile(self, statement, plan):
+        """Record the profiled plan of a statement.
+
+        :param statement: Cypher statement
+        :type statement: str
+        :param plan: Profiled plan
+        :type plan: neo4j.v1.result.ProfiledPlan
+        """
+        self._stats(statement).record_profile(db_hits(plan))
+
+    def summary(self, limit=None):
+        """Get stats ordered by total time spent.
+
+        :param limit: Maximum number of templates to include
+        :type limit: int|None
+        :returns: List of stat dicts
+        :rtype: list
+        """
+        stats = sorted(
+            self.stats.values(),
+            key=lambda s: s.total_time,
+            reverse=True
+        )
+        if limit is not None:
+            stats = stats[:limit]
+        return [s.todict() for s in stats]
+
+    def log_summary(self, limit=10):
+        """Log the most expensive query templates.
+
+        :param limit: Maximum number of templates to log
+        :type limit: int
+        """
+        for s in self.summary(limit=limit):
+            logger.info(
+                "{count} calls, {total_time:.3f}s total, {max_time:.3f}s max, "
+                "{rows} rows, db hits/profile {avg_db_hits}: {template}"
+                .format(**s)
+            )
+
+
+class InstrumentedResult:
+    """Result wrapper that records a statement once it is finished.
+
+    Records are streamed to the caller as they arrive. The statement is
+    recorded when iteration finishes, when the result is consumed,
+    detached or summarized, or when its transaction or session ends.
+    """
+
+    def __init__(self, result, on_finish):
+        """Init the wrapper.
+
+        :param result: Result to wrap
+        :type result: neo4j.v1.api.StatementResult
+        :param on_finish: Called with the number of rows once finished
+        :type on_finish: callable
+        """
+        self.result = result
+        self.on_finish = on_finish
+        self.rows = 0
+        self.finished = False
+
+    def finish(self, remaining=0):
+        """Record the statement unless already recorded.
+
+        :param remaining: Rows buffered but not yet seen by the caller
+        :type remaining: int
+        """
+        if self.finished:
+            return
+        self.finished = True
+        self.on_finish(self.rows + remaining)
+
+    def __iter__(self):
+        for record in self.result:
+            if not self.finished:
+                self.rows += 1
+            yield record
+        self.finish()
+
+    def records(self):
+        """Generator for records of the result."""
+        return iter(self)
+
+    def detach(self):
+        """Fetch the rest of the result into the buffer and record it.
+
+        :returns: Number of records fetched
+        :rtype: int
+        """
+        fetched = self.result.detach()
+        self.finish(fetched)
+        return fetched
+
+    def summary(self):
+        """Get the summary, buffering any remaining records."""
+        self.detach()
+        return self.result.summary()
+
+    def consume(self):
+        """Consume the rest of the result and get the summary."""
+        for _ in self:
+            pass
+        return self.summary()
+
+    def single(self):
+        """Get the only remaining record or None."""
+        records = list(self)
+        if not records:
+            return None
+        if len(records) != 1:
+            warnings.warn(
+                "Expected a result with a single record, but this result "
+                "contains {}".format(len(records))
+            )
+        return records[0]
+
+    def value(self, item=0, default=None):
+        """Get the rest of the result as a list of values."""
+        return [record.value(item, default) for record in self]
+
+    def values(self, *items):
+        """Get the rest of the result as a list of tuples."""
+        return [record.values(*items) for record in self]
+
+    def data(self, *items):
+        """Get the rest of the result as a list of dicts."""
+        return [record.data(*items) for record in self]
+
+    def __getattr__(self, name):
+        return getattr(self.result, name)
+
+
+class _Instrumented:
+    """Runs and records statements on a session or transaction."""
+
+    def _run(self, target, statement, parameters, kwparameters):
+        """Run a statement and record it once its result is finished.
+
+        A sampled read only statement is re-run with PROFILE after the
+        caller is done with its result. Only the profiled result is
+        buffered.
+
+        :param target: Session or transaction to run the statement with
+        :type target: neo4j.v1.api.Session|neo4j.v1.api.Transaction
+        :param statement: Cypher statement
+        :type statement: str
+        :param parameters: Dict of parameters
+        :type parameters: dict|None
+        :param kwparameters: Parameters passed as keyword arguments
+        :type kwparameters: dict
+        :returns: Streaming result of the statement
+        :rtype: InstrumentedResult
+        """
+        params = dict(parameters or {})
+        params.update(kwparameters)
+        recorder = self.recorder
+        start = time.time()
+
+        def on_finish(rows):
+            recorder.record(statement, params, time.time() - start, rows)
+            if recorder.should_profile(statement):
+                try:
+                    profiled = target.run('PROFILE ' + statement, params)
+                    recorder.record_profile(
+                        statement,
+                        profiled.summary().profile
+                    )
+                except Exception:
+                    logger.exception('Unable to profile statement.')
+
+        result = InstrumentedResult(target.run(statement, params), on_finish)
+        self._pending = [r for r in self._pending if not r.finished]
+        self._pending.append(result)
+        return result
+
+    def _finish_pending(self):
+        """Record results the caller did not finish."""
+        pending, self._pending = self._pending, []
+        for result in pending:
+            result.finish()
+
+
+class InstrumentedTransaction(_Instrumented):
+    """Transaction wrapper that records every statement."""
+
+    def __init__(self, tx, recorder):
+        """Init the wrapper.
+
+        :param tx: Transaction to wrap
+        :type tx: neo4j.v1.api.Transaction
+        :param recorder: Recorder to collect stats with
+        :type recorder: QueryRecorder
+        """
+        self.tx = tx
+        self.recorder = recorder
+        self._pending = []
+
+    def run(self, statement, parameters=None, **kwparameters):
+        """Run a statement in the transaction and record it."""
+        return self._run(self.tx, statement, parameters, kwparameters)
+
+    def commit(self):
+        """Record unfinished statements and commit."""
+        self._finish_pending()
+        return self.tx.commit()
+
+    def rollback(self):
+        """Record unfinished statements and roll back."""
+        self._finish_pending()
+        return self.tx.rollback()
+
+    def close(self):
+        """Record unfinished statements and close."""
+        self._finish_pending()
+        return self.tx.close()
+
+    def __enter__(self):
+        self.tx.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self._finish_pending()
+        return self.tx.__exit__(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.tx, name)
+
+
+class InstrumentedSession(_Instrumented):
+    """Session wrapper that hands out instrumented transactions."""
+
+    def __init__(self, session, recorder):
+        """Init the wrapper.
+
+        :param session: Session to wrap
+        :type session: neo4j.v1.api.Session
+        :param recorder: Recorder to collect stats with
+        :type recorder: QueryRecorder
+        """
+        self.session = session
+        self.recorder = recorder
+        self._pending = []
+
+    def begin_transaction(self, *args, **kwargs):
+        """Begin an instrumented transaction."""
+        tx = self.session.begin_transaction(*args, **kwargs)
+        return InstrumentedTransaction(tx, self.recorder)
+
+    def run(self, statement, parameters=None, **kwparameters):
+        """Run an autocommit statement and record it."""
+        return self._run(self.session, statement, parameters, kwparameters)
+
+    def close(self):
+        """Record unfinished statements and close."""
+        self._finish_pending()
+        return self.session.close()
+
+    def __enter__(self):
+        self.session.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self._finish_pending()
+        return self.session.__exit__(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+class InstrumentedDriver:
+    """Driver wrapper that hands out instrumented sessions."""
+
+    def __init__(self, driver, recorder):
+        """Init the wrapper.
+
+        :param driver: Driver to wrap
+        :type driver: neo4j.v1.GraphDatabase.driver
+        :param recorder: Recorder to collect stats with
+        :type recorder: QueryRecorder
+        """
+        self.driver = driver
+        self.recorder = recorder
+
+    def session(self, *args, **kwargs):
+        """Get an instrumented session."""
+        return InstrumentedSession(
+            self.driver.session(*args, **kwargs),
+            self.recorder
+        )
+
+    def close(self):
+        """Close the wrapped driver."""
+        self.driver.close()
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
@@ -0,0 +1,196 @@
+"""Manifest of the documents in a run.
+
+A manifest maps every per host document of a run to its file, size and
+checksum. The collector writes one into the run directory. Runs without
+a manifest file are scanned once instead.
+
+Manifest files look like:
+
+    {
+        "hosts": {
+            "<doctype>": {
+                "<hostname>": {"file": ..., "size": ..., "checksum": ...}
+            }
+        },
+        "files": {
+            "gitrepos.json": {"file": ..., "size": ..., "checksum": ...}
+        }
+    }
+"""
+import hashlib
+import json
+import logging
+import os
+
+from cloud_snitch import documents
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = 'manifest.json'
+
+# Doctypes written once per host as <doctype>_<hostname>.json
+HOST_DOCTYPES = [
+    'configuredinterface',
+    'dpkg_list',
+    'facts',
+    'file_dict',
+    'pip_list',
+]
+
+# Documents written once per run
+RUN_DOCUMENTS = [
+    'gitrepos.json',
+    'uservars.json',
+]
+
+
+def checksum(path):
+    """Compute the md5 of a file as stored on disk.
+
+    :param path: Path of the file
+    :type path: str
+    :returns: Hex digest
+    :rtype: str
+    """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def parse_filename(filename):
+    """Determine doctype and hostname of a document filename.
+
+    :param filename: Name of the file, optionally compressed
+    :type filename: str
+    :returns: Tuple of (doctype, hostname). Run documents have a hostname
+        of None. (None, None) for files that are not documents.
+    :rtype: tuple
+    """
+    plain, _ = documents.split_suffix(filename)
+    if plain in RUN_DOCUMENTS:
+        return plain, None
+    if not plain.endswith('.json'):
+        return None, None
+    stem = plain[:-len('.json')]
+    for doctype in HOST_DOCTYPES:
+        prefix = doctype + '_'
+        if stem.startswith(prefix) and len(stem) > len(prefix):
+            return doctype, stem[len(prefix):]
+    return None, None
+
+
+class RunManifest(object):
+    """Index of the documents in a run directory."""
+
+    def __init__(self, path, hosts=None, files=None):
+        """Init the manifest.
+
+        :param path: Path of the run
+        :type path: str
+        :param hosts: doctype -> hostname -> entry
+        :type hosts: dict
+        :param files: run document name -> entry
+        :type files: dict
+        """
+        self.path = path
+        self.hosts = hosts or {}
+        self.files = files or {}
+
+    @classmethod
+    def scan(cls, path, checksums=False):
+        """Build a manifest by listing a run directory once.
+
+        When a document exists both plain and compressed the first in
+        sorted order is used.
+
+        :param path: Path of the run
+        :type path: str
+        :param checksums: Whether or not to compute checksums
+        :type checksums: bool
+        :returns: Manifest of the run
+        :rtype: RunManifest
+        """
+        manifest = cls(path)
+        for filename in sorted(os.listdir(path)):
+            doctype, hostname = parse_filename(filename)
+            if doctype is None:
+                continue
+            full = os.path.join(path, filename)
+            entry = {
+                'file': filename,
+                'size': os.path.getsize(full),
+                'checksum': checksum(full) if checksums else None
+            }
+            if hostname is None:
+                manifest.files.setdefault(doctype, entry)
+            else:
+                manifest.hosts.setdefault(doctype, {}) \
+                    .setdefault(hostname, entry)
+        return manifest
+
+    @classmethod
+    def load(cls, path):
+        """Load the manifest file of a run.
+
+        :param path: Path of the run
+        :type path: str
+        :returns: Manifest or None if there is no readable manifest file
+        :rtype: RunManifest|None
+        """
+        try:
+            with open(os.path.join(path, MANIFEST_FILENAME), 'r') as f:
+                data = json.loads(f.read())
+        except (IOError, ValueError):
+            return None
+        return cls(path, hosts=data.get('hosts'), files=data.get('files'))
+
+    @classmethod
+    def for_run(cls, path):
+        """Load the manifest file of a run or scan the run.
+
+        :param path: Path of the run
+        :type path: str
+        :returns: Manifest of the run
+        :rtype: RunManifest
+        """
+        manifest = cls.load(path)
+        if manifest is None:
+            logger.debug('No manifest for {}, scanning.'.format(path))
+            manifest = cls.scan(path)
+        return manifest
+
+    def save(self):
+        """Write the manifest file into the run directory."""
+        data = {'hosts': self.hosts, 'files': self.files}
+        with open(os.path.join(self.path, MANIFEST_FILENAME), 'w') as f:
+            f.write(json.dumps(data, sort_keys=True))
+
+    def host_documents(self, doctype):
+        """List documents of a doctype.
+
+        :param doctype: Doctype like 'facts'
+        :type doctype: str
+        :returns: List of (hostname, path) tuples sorted by hostname
+        :rtype: list
+        """
+        entries = self.hosts.get(doctype, {})
+        return [
+            (hostname, os.path.join(self.path, entries[hostname]['file']))
+            for hostname in sorted(entries)
+        ]
+
+    def document_path(self, filename):
+        """Get the path of a run document.
+
+        :param filename: Plain name of the document, like 'gitrepos.json'
+        :type filename: str
+        :returns: Path of the document. The plain path if the run does
+            not have the document.
+        :rtype: str
+        """
+        entry = self.files.get(filename)
+        if entry is None:
+            return os.path.join(self.path, filename)
+        return os.path.join(self.path, entry['file'])
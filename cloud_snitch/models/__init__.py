@@ -1,4 +1,5 @@
 from .apt import AptPackageEntity  # noqa F401
+from .configfile import ConfigfileBlobEntity  # noqa F401
 from .configfile import ConfigfileEntity  # noqa F401
 from .environment import EnvironmentEntity  # noqa F401
 from .environmentlock import EnvironmentLockEntity  # noqa F401
@@ -11,6 +11,7 @@ class AptPackageEntity(VersionedEntity):
     label = 'AptPackage'
     state_label = 'AptPackageState'
     identity_property = 'name_version'
+    shared = True
     static_properties = [
         'name',
         'version'
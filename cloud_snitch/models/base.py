@@ -1,7 +1,6 @@
 import json
 import logging
-import pprint
-from cloud_snitch import utils
+from cloud_snitch.backends import get_backend
 from cloud_snitch.decorators import transient_retry
 from cloud_snitch.exc import PropertyAlreadyExistsError
 
@@ -35,6 +34,8 @@ class VersionedEdgeSet(object):
 
         Create the edges that need to be added.
 
+        The work is done by the backend of the transaction.
+
         :param tx: neo4j transaction context
         :type tx: neo4j.v1.api.Transaction
         :param edges: List of entity objects to maintain relationships to
@@ -43,95 +44,7 @@ class VersionedEdgeSet(object):
         :type time_in_ms: int
         """
         new_edges = set([e.identity for e in edges])
-
-        # Match existing edges
-        cypher = """\
-            MATCH (s:{} {{ {}:$identity }})-[r:{} {{to:$time}}]->(d:{})
-            RETURN d.{}
-        """
-        cypher = cypher.format(
-            self.source.label,
-            self.source.identity_property,
-            self.name,
-            self.dest_type.label,
-            self.dest_type.identity_property
-        )
-        logger.debug("Finding current edges:")
-        logger.debug(cypher)
-        resp = tx.run(
-            cypher,
-            identity=self.source.identity,
-            time=utils.EOT
-        )
-
-        logger.debug("New edges: {}".format(new_edges))
-
-        current_edges = set()
-        key = 'd.{}'.format(self.dest_type.identity_property)
-        for record in resp:
-            current_edges.add(record[key])
-
-        logger.debug("Current edges: {}".format(current_edges))
-
-        # Set `to` on edges that are no longer current
-        old_edges = current_edges - new_edges
-        logger.debug("Old edges: {}".format(old_edges))
-
-        for old_identity in old_edges:
-            cypher = """
-                MATCH (s:{} {{ {}:$srcIdentity}})
-                MATCH (d:{} {{ {}:$destIdentity}})
-                MATCH (s)-[r:{} {{ to: $eot }}]->(d)
-                SET r.to = $to
-            """
-            cypher = cypher.format(
-                self.source.label,
-                self.source.identity_property,
-                self.dest_type.label,
-                self.dest_type.identity_property,
-                self.name
-            )
-            logger.debug("Marking {} --> {} as old".format(
-                self.source.identity,
-                old_identity)
-            )
-            logger.debug(cypher)
-            tx.run(
-                cypher,
-                srcIdentity=self.source.identity,
-                destIdentity=old_identity,
-                eot=utils.EOT,
-                to=time_in_ms
-            )
-
-        # Merge in new edges
-        add_edges = new_edges - current_edges
-        for add_identity in add_edges:
-            cypher = """
-                MATCH (s:{} {{ {}:$srcIdentity }})
-                MATCH (d:{} {{ {}:$destIdentity }})
-                MERGE (s)-[r:{} {{ to: $to }}]->(d)
-                ON CREATE SET r.from = $frm
-            """
-            cypher = cypher.format(
-                self.source.label,
-                self.source.identity_property,
-                self.dest_type.label,
-                self.dest_type.identity_property,
-                self.name
-            )
-            logger.debug("Creating edge {} --> {}:".format(
-                self.source.identity,
-                add_identity)
-            )
-            logger.debug(cypher)
-            tx.run(
-                cypher,
-                srcIdentity=self.source.identity,
-                destIdentity=add_identity,
-                frm=time_in_ms,
-                to=utils.EOT
-            )
+        get_backend(tx).reconcile_edges(tx, self, new_edges, time_in_ms)
 
     @transient_retry
     def update(self, session, edges, time_in_ms):
@@ -179,12 +92,28 @@ class VersionedEntity(object):
     # Properties we do need to version
     state_properties = []
 
+    # State properties too large to index, like serialized values
+    unindexed_properties = []
+
     # Properties that are concatenations of other properties
     concat_properties = {}
 
     # Children - Relationships to other entities from this entity
     children = {}
 
+    # Whether identities are shared between environments. Identities of
+    # models that are not shared include their environment.
+    shared = False
+
+    # Whether static properties never change once the identity exists.
+    # Static properties of immutable entities are only set on create.
+    immutable = False
+
+    # Properties stored once in a separate node instead of on this
+    # entity. Maps property -> (state property holding the key of the
+    # other node, entity class of the other node)
+    blob_properties = {}
+
     def __init__(self, **kwargs):
         """Init the versioned entity instance.
 
@@ -266,23 +195,14 @@ class VersionedEntity(object):
         :returns: Instance of versioned entity
         :rtype: VersionedEntity|None
         """
-        find = 'MATCH (n:{} {{ {}:${} }}) RETURN (n)'.format(
-            cls.label,
-            cls.identity_property,
-            cls.identity_property
-        )
-        find_map = {}
-        find_map[cls.identity_property] = identity
-
-        record = tx.run(find, **find_map).single()
+        props = get_backend(tx).find(tx, cls, identity)
 
         # Check for empty result
-        if record is None:
-            return record
+        if props is None:
+            return None
 
         # Build and return entity
-        record = record[0]
-        return cls(**({k: v for k, v in record.items()}))
+        return cls(**props)
 
     def _prop_clause(self, props):
         """Return info helpful to building property clauses.
@@ -327,79 +247,7 @@ class VersionedEntity(object):
         """
         if not self.state_properties:
             return
-
-        parts, prop_map = self._prop_clause(self.state_properties)
-
-        # Match current state
-        cypher = """\
-            MATCH (a:{} {{ {}: $identity}})
-                -[r:HAS_STATE {{to: $state_rel_to}}]
-                ->(currentState:{})
-            RETURN currentState
-        """
-        cypher = cypher.format(
-            self.label,
-            self.identity_property,
-            self.state_label
-        )
-        resp = tx.run(cypher, state_rel_to=utils.EOT, identity=self.identity)
-        record = resp.single()
-        if record is None:
-            current_properties = {}
-        else:
-            current_properties = {k: v for k, v in record[0].items()}
-
-        # Determine if new state is different from current
-        dirty = False
-        for prop in self.state_properties:
-            if current_properties.get(prop) != prop_map.get(prop):
-                dirty = True
-
-        if dirty:
-            logger.debug("Data is dirty, making a new state.")
-
-            # Mark current state as old
-            cypher = """
-                MATCH (c:{} {{ {}:$identity }})
-                   -[r1:HAS_STATE {{to: $EOT}}]
-                   ->(currentState:{})
-                SET r1.to = $completed
-            """
-            cypher = cypher.format(
-                self.label,
-                self.identity_property,
-                self.state_label
-            )
-            tx.run(
-                cypher,
-                identity=self.identity,
-                completed=time_in_ms,
-                EOT=utils.EOT
-            )
-
-            # Create relationship
-            prop_map.update({
-                'EOT': utils.EOT,
-                'completed': time_in_ms,
-                'identity': self.identity
-            })
-            cyper = """
-                MATCH (s:{} {{ {}:$identity }})
-                CREATE (s)
-                    -[r2:HAS_STATE {{to: $EOT, from: $completed }}]
-                    ->(newState:{} {{ {} }})
-                RETURN newState
-            """
-            cypher = cyper.format(
-                self.label,
-                self.identity_property,
-                self.state_label,
-                parts
-            )
-            logger.debug('Update state cypher:')
-            logger.debug(cypher)
-            logger.debug("With params:\n{}".format(pprint.pformat(prop_map)))
-            resp = tx.run(cypher, **prop_map)
+        get_backend(tx).update_state(tx, self, time_in_ms)
 
     def _update(self, tx, time_in_ms):
         """Update the entity in the graph.
@@ -409,42 +257,7 @@ class VersionedEntity(object):
         :param tx: Time in milliseconds
         :type tx: int
         """
-        static_props = {}
-        for prop in self.static_properties:
-            val = getattr(self, prop, None)
-            if val is not None:
-                static_props[prop] = val
-
-        parts, prop_map = self._props_set_clause('n', self.static_properties)
-
-        if prop_map:
-            create_clause = (
-                'ON CREATE SET  n.created_at = $completed, {}'.format(parts)
-            )
-            update_clause = 'ON MATCH SET {}'.format(parts)
-        else:
-            create_clause = 'ON CREATE SET  n.created_at = $completed'
-            update_clause = ''
-
-        cypher = """
-            MERGE (n:{} {{ {}:$identity }})
-            {}
-            {}
-            RETURN n
-        """
-        cypher = cypher.format(
-            self.label,
-            self.identity_property,
-            create_clause,
-            update_clause
-        )
-        logger.debug("Updating identity:\n{}".format(cypher))
-        tx.run(
-            cypher,
-            completed=time_in_ms,
-            identity=self.identity,
-            **prop_map
-        )
+        get_backend(tx).merge_identity(tx, self, time_in_ms)
         self._update_state(tx, time_in_ms)
 
     @transient_retry
@@ -5,6 +5,23 @@ from .base import VersionedEntity
 logger = logging.getLogger(__name__)
 
 
+class ConfigfileBlobEntity(VersionedEntity):
+    """Model the contents of configuration files with the same md5.
+
+    Contents are stored once no matter how many files, hosts or
+    environments share them.
+    """
+
+    label = 'ConfigfileBlob'
+    state_label = 'ConfigfileBlobState'
+    identity_property = 'md5'
+    static_properties = [
+        'contents'
+    ]
+    shared = True
+    immutable = True
+
+
 class ConfigfileEntity(VersionedEntity):
     """Model a configuration file in the graph."""
 
@@ -19,9 +36,11 @@ class ConfigfileEntity(VersionedEntity):
     ]
     state_properties = [
         'md5',
-        'contents',
         'is_binary'
     ]
+    blob_properties = {
+        'contents': ('md5', ConfigfileBlobEntity)
+    }
     concat_properties = {
         'path_host': [
             'path',
@@ -1,5 +1,7 @@
 import logging
 
+from cloud_snitch.backends import get_backend
+
 from .base import VersionedEntity
 from .host import HostEntity
 from .gitrepo import GitRepoEntity
@@ -31,35 +33,17 @@ class EnvironmentEntity(VersionedEntity):
         'uservars': ('HAS_USERVAR', UservarEntity)
     }
 
-    def _times_query(self):
-        """Build query for finding times the environment graph was updated.
-
-        :returns: Query string with $identity parameter
-        :rtype: str
-        """
-        cypher = """
-            MATCH p = (e:{} {{ {}:$identity }})-[*]->(n)
-            WITH relationships(p) AS rels
-            UNWIND rels AS r
-            RETURN DISTINCT r.from AS t
-            ORDER BY t DESC
-        """
-        cypher = cypher.format(self.label, self.identity_property)
-        return cypher
-
-    def _times_updated(self, tx):
+    def _times_updated(self, tx, limit=None):
         """Query for list of times an environment was updated.
 
         :param tx: neo4j transaction context.
         :type tx: neo4j.v1.api.Transaction
-        :returns: List of timestamps
+        :param limit: Optional maximum number of times
+        :type limit: int|None
+        :returns: List of timestamps, newest first
         :rtype: list
         """
-        cypher = self._times_query()
-        logger.debug("Running query to gather timestamps.")
-        logger.debug(cypher)
-        result = tx.run(cypher, identity=self.identity)
-        return [r['t'] for r in result]
+        return get_backend(tx).times_updated(tx, self, limit=limit)
 
     def times_updated(self, session):
         """Query for list of times an environment was updated.
@@ -81,10 +65,7 @@ class EnvironmentEntity(VersionedEntity):
         :rtype: int
         """
         with session.begin_transaction() as tx:
-            cypher = self._times_query()
-            cypher += ' LIMIT 1'
-            result = tx.run(cypher, identity=self.identity)
-            record = result.single()
-            if record is None:
+            times = self._times_updated(tx, limit=1)
+            if not times:
                 return None
-            return record['t']
+            return times[0]
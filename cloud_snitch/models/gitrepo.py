@@ -11,6 +11,7 @@ class GitUntrackedFileEntity(VersionedEntity):
     label = 'GitUntrackedFile'
     state_label = 'GitUntrackedFile'
     identity_property = 'path'
+    shared = True
 
 
 class GitUrlEntity(VersionedEntity):
@@ -19,6 +20,7 @@ class GitUrlEntity(VersionedEntity):
     label = 'GitUrl'
     state_label = 'GitUrlState'
     identity_property = 'url'
+    shared = True
 
 
 class GitRemoteEntity(VersionedEntity):
@@ -14,6 +14,7 @@ class NameServerEntity(VersionedEntity):
     label = 'NameServer'
     state_label = 'NameServerState'
     identity_property = 'ip'
+    shared = True
 
 
 class PartitionEntity(VersionedEntity):
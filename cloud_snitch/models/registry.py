@@ -1,11 +1,125 @@
+import hashlib
+import importlib
+import json
 import logging
-
-from pkg_resources import iter_entry_points
+import os
+import sys
+import threading
 
 logger = logging.getLogger(__name__)
 
 _REGISTRY = None
 
+ENTRY_POINT_GROUP = 'cloud_snitch_models'
+
+# Path of an optional cache of the entry point scan
+CACHE_ENV = 'CLOUD_SNITCH_REGISTRY_CACHE'
+
+_METADATA_SUFFIXES = ('.dist-info', '.egg-info', '.egg-link', '.egg')
+
+
+def distributions_fingerprint(paths=None):
+    """Fingerprint the metadata of installed distributions.
+
+    Changes when a distribution is installed, removed or upgraded, or
+    when the entry points of a development install are regenerated.
+
+    :param paths: Paths to search. Defaults to sys.path.
+    :type paths: list|None
+    :returns: Hex digest
+    :rtype: str
+    """
+    digest = hashlib.sha1()
+    for entry in (sys.path if paths is None else paths):
+        entry = entry or '.'
+        try:
+            names = sorted(os.listdir(entry))
+        except OSError:
+            continue
+        for name in names:
+            if not name.endswith(_METADATA_SUFFIXES):
+                continue
+            path = os.path.join(entry, name)
+            mtimes = []
+            for p in (path, os.path.join(path, 'entry_points.txt')):
+                try:
+                    mtimes.append(str(os.stat(p).st_mtime))
+                except OSError:
+                    pass
+            digest.update('{}:{}\n'.format(
+                path,
+                ':'.join(mtimes)
+            ).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def scan_entry_points():
+    """Scan installed distributions for model entry points.
+
+    pkg_resources is slow to import, so it is only imported here.
+
+    :returns: Entry point name -> module:attrs reference
+    :rtype: dict
+    """
+    from pkg_resources import iter_entry_points
+    refs = {}
+    for ep in iter_entry_points(group=ENTRY_POINT_GROUP):
+        refs[ep.name] = '{}:{}'.format(ep.module_name, '.'.join(ep.attrs))
+    return refs
+
+
+def cached_entry_points(cache_path=None):
+    """Get model entry points from a cache file or by scanning.
+
+    The cache is used while the fingerprint of installed distributions
+    is unchanged. Otherwise entry points are scanned and the cache is
+    rewritten.
+
+    :param cache_path: Path of the cache file. None disables the cache.
+    :type cache_path: str|None
+    :returns: Entry point name -> module:attrs reference
+    :rtype: dict
+    """
+    if not cache_path:
+        return scan_entry_points()
+
+    fingerprint = distributions_fingerprint()
+    try:
+        with open(cache_path, 'r') as f:
+            data = json.load(f)
+        if data['fingerprint'] == fingerprint:
+            return data['entry_points']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+
+    refs = scan_entry_points()
+    tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({'fingerprint': fingerprint, 'entry_points': refs}, f)
+        os.replace(tmp_path, cache_path)
+    except (IOError, OSError):
+        logger.warning(
+            'Unable to write registry cache {}'.format(cache_path)
+        )
+    return refs
+
+
+def load_reference(ref):
+    """Load an object from a module:attrs reference.
+
+    :param ref: Reference like cloud_snitch.models:HostEntity
+    :type ref: str
+    :returns: Referenced object
+    :rtype: object
+    """
+    module_name, _, attrs = ref.partition(':')
+    obj = importlib.import_module(module_name)
+    for attr in attrs.split('.'):
+        if attr:
+            obj = getattr(obj, attr)
+    return obj
+
 
 class Node:
     """Models node in a tree in a forest."""
@@ -121,22 +235,104 @@ class Forest:
 
 
 class Registry:
-    """Model information about models."""
+    """Model information about models.
+
+    Models are loaded when the registry is first used instead of when it
+    is created, so importing the registry is cheap. Per label metadata is
+    computed once when models are loaded. Lists returned by the
+    accessors are copies, so callers can not change the precomputed
+    metadata.
+    """
     def __init__(self):
         """Init the registry."""
-        self.models = {}
-        self.load_models()
-        self.forest = Forest(self.models)
+        self._models = None
+        self._forest = None
+        self._lock = threading.Lock()
+
+    @property
+    def models(self):
+        """Get the loaded models.
+
+        :returns: Models keyed by label
+        :rtype: dict
+        """
+        self.load()
+        return self._models
+
+    @property
+    def forest(self):
+        """Get the forest of model trees.
+
+        :returns: Forest of the loaded models
+        :rtype: Forest
+        """
+        self.load()
+        return self._forest
+
+    def load(self):
+        """Load models and compute metadata unless already loaded."""
+        if self._models is not None:
+            return
+        with self._lock:
+            if self._models is not None:
+                return
+            models = self.load_models()
+            self._forest = Forest(models)
+            self.precompute(models)
+            self._models = models
+
+    def precompute(self, models):
+        """Compute per label metadata from loaded models.
+
+        :param models: Models keyed by label
+        :type models: dict
+        """
+        self._properties = {}
+        self._property_sets = {}
+        self._state_properties = {}
+        self._state_property_sets = {}
+        self._static_properties = {}
+        self._paths = {}
+        self._paths_from = {}
+
+        all_properties = set()
+        for label, klass in models.items():
+            props = set([klass.identity_property])
+            props.update(klass.static_properties)
+            props.update(klass.state_properties)
+            props.update(klass.blob_properties)
+            all_properties |= props
+
+            self._properties[label] = tuple(sorted(props))
+            self._property_sets[label] = frozenset(props)
+            self._state_properties[label] = \
+                tuple(sorted(klass.state_properties))
+            self._state_property_sets[label] = \
+                frozenset(klass.state_properties)
+            self._static_properties[label] = \
+                tuple(sorted(klass.static_properties))
+            self._paths[label] = tuple(self._forest.path(label))
+            self._paths_from[label] = tuple(
+                tuple(p) for p in self._forest.paths_from(label)
+            )
+        self._all_properties = tuple(sorted(all_properties))
 
     def load_models(self):
-        """Load installed models from entry points."""
-        for ep in iter_entry_points(group='cloud_snitch_models'):
+        """Load installed models from entry points.
+
+        :returns: Models keyed by entry point name
+        :rtype: dict
+        """
+        models = {}
+        refs = cached_entry_points(os.environ.get(CACHE_ENV))
+        for name, ref in refs.items():
             try:
-                self.models[ep.name] = ep.load()
+                models[name] = load_reference(ref)
             except Exception:
                 logger.warn(
-                    'Unable to load cloud snitch model {}'.format(ep.name)
+                    'Unable to load cloud snitch model {}'.format(name)
                 )
+        return models
 
     def identity_property(self, model):
         """Return the identity property of a targeted model.
@@ -159,10 +355,48 @@ class Registry:
         :returns: List of state properties or None
         :rtype: list|None
         """
-        klass = self.models.get(model)
-        if klass is None:
+        self.load()
+        props = self._state_properties.get(model)
+        if props is None:
             return None
-        return sorted(klass.state_properties)
+        return list(props)
+
+    def has_property(self, model, prop):
+        """Check if a model has a property.
+
+        :param model: Model name
+        :type model: str
+        :param prop: Property name
+        :type prop: str
+        :returns: True if the model exists and has the property
+        :rtype: bool
+        """
+        self.load()
+        return prop in self._property_sets.get(model, ())
+
+    def has_state_property(self, model, prop):
+        """Check if a property is a state property of a model.
+
+        :param model: Model name
+        :type model: str
+        :param prop: Property name
+        :type prop: str
+        :returns: True if the model exists and prop is a state property
+        :rtype: bool
+        """
+        self.load()
+        return prop in self._state_property_sets.get(model, ())
+
+    def has_state(self, model):
+        """Check if a model has state properties.
+
+        :param model: Model name
+        :type model: str
+        :returns: True if the model exists and has state properties
+        :rtype: bool
+        """
+        self.load()
+        return bool(self._state_property_sets.get(model))
 
     def static_properties(self, model):
         """Return the static properties of a model
@@ -172,10 +406,28 @@ class Registry:
         :returns: List of static properties or None
         :rtype: list|None
         """
+        self.load()
+        props = self._static_properties.get(model)
+        if props is None:
+            return None
+        return list(props)
+
+    def blob_properties(self, model):
+        """Return the blob properties of a model
+
+        Blob properties are stored once in a separate node that is keyed
+        by a state or static property of the model.
+
+        :param model: Model name
+        :type model: str
+        :returns: Dict of property -> (key property, blob model class)
+            or None
+        :rtype: dict|None
+        """
         klass = self.models.get(model)
         if klass is None:
             return None
-        return sorted(klass.static_properties)
+        return dict(klass.blob_properties)
 
     def children(self, model):
         """Return the children of a model
@@ -214,6 +466,7 @@ class Registry:
             identity=klass.identity_property,
             static_properties=klass.static_properties,
             state_properties=klass.state_properties,
+            blob_properties=sorted(klass.blob_properties),
             children=children
         )
 
@@ -236,23 +489,10 @@ class Registry:
         :returns: List of properties.
         :rtype: list
         """
-        prop_set = set()
-
+        self.load()
         if model is None:
-            models = self.models.keys()
-        else:
-            models = [model]
-
-        for model in models:
-            klass = self.models.get(model)
-            if klass is not None:
-                prop_set.add(klass.identity_property)
-                for prop in klass.static_properties:
-                    prop_set.add(prop)
-                for prop in klass.state_properties:
-                    prop_set.add(prop)
-
-        return sorted(list(prop_set))
+            return list(self._all_properties)
+        return list(self._properties.get(model, ()))
 
     def path(self, label):
         """Get path of a label within forest.
@@ -262,4 +502,19 @@ class Registry:
         :returns: List of (label, relationship name) tuples
         :rtype: list|None
         """
-        return self.forest.path(label)
+        self.load()
+        path = self._paths.get(label)
+        if path is None:
+            return None
+        return list(path)
+
+    def paths_from(self, label):
+        """Get all paths from a label to the leaves of its tree.
+
+        :param label: Model label
+        :type label: str
+        :returns: List of lists of labels
+        :rtype: list
+        """
+        self.load()
+        return [list(p) for p in self._paths_from.get(label, ())]
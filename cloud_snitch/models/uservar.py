@@ -19,6 +19,9 @@ class UservarEntity(VersionedEntity):
     state_properties = [
         'value'
     ]
+    unindexed_properties = [
+        'value'
+    ]
     concat_properties = {
         'name_environment': [
             'name',
@@ -11,6 +11,7 @@ class PythonPackageEntity(VersionedEntity):
     label = 'PythonPackage'
     state_label = 'PythonPackageState'
     identity_property = 'name_version'
+    shared = True
     static_properties = ['name', 'version']
     concat_properties = {
         'name_version': [
@@ -0,0 +1,495 @@
+"""Record and replay neo4j driver traffic.
+
+A recording driver wraps a real driver and writes every statement, its
+parameters and its records to a gzipped json lines file. A replay driver
+reads such a file and serves the recorded records without a database so
+that a sync can be run end to end offline.
+
+Each distinct statement text is written once to the file and referenced
+by id afterwards. A recorded line looks like one of:
+
+    {"type": "statement", "id": 0, "text": "MATCH ..."}
+    {"type": "run", "statement": 0, "parameters": {...},
+     "keys": [...], "records": [[...], ...]}
+
+During replay a statement is answered by the oldest unused recording with
+the same statement and parameters. Statements whose parameters can not be
+reproduced, such as lock times, fall back to the oldest unused recording
+of the same statement.
+"""
+import collections
+import gzip
+import json
+import logging
+
+from neo4j.v1 import Record
+from neo4j.v1.types import Node
+from neo4j.v1.types import Relationship
+
+from cloud_snitch.exc import ReplayMissError
+from cloud_snitch.instrumentation import template
+
+logger = logging.getLogger(__name__)
+
+
+def encode_value(value):
+    """Encode a record value into something json serializable.
+
+    :param value: Value from a neo4j record
+    :type value: object
+    :returns: Json serializable value
+    :rtype: object
+    """
+    if isinstance(value, Node):
+        return {'$node': {
+            'id': value.id,
+            'labels': sorted(value.labels),
+            'properties': encode_value(dict(value.items()))
+        }}
+    if isinstance(value, Relationship):
+        return {'$rel': {
+            'id': value.id,
+            'start': value.start,
+            'end': value.end,
+            'type': value.type,
+            'properties': encode_value(dict(value.items()))
+        }}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(v) for v in value]
+    if isinstance(value, dict):
+        return {k: encode_value(v) for k, v in value.items()}
+    return value
+
+
+def decode_value(value):
+    """Decode a value encoded with encode_value.
+
+    :param value: Encoded value
+    :type value: object
+    :returns: Decoded value
+    :rtype: object
+    """
+    if isinstance(value, list):
+        return [decode_value(v) for v in value]
+    if isinstance(value, dict):
+        if '$node' in value:
+            node = value['$node']
+            return Node.hydrate(
+                node['id'],
+                node['labels'],
+                decode_value(node['properties'])
+            )
+        if '$rel' in value:
+            rel = value['$rel']
+            return Relationship.hydrate(
+                rel['id'],
+                rel['start'],
+                rel['end'],
+                rel['type'],
+                decode_value(rel['properties'])
+            )
+        return {k: decode_value(v) for k, v in value.items()}
+    return value
+
+
+def parameter_key(parameters):
+    """Build a hashable key from statement parameters.
+
+    :param parameters: Statement parameters
+    :type parameters: dict
+    :returns: Canonical json string
+    :rtype: str
+    """
+    return json.dumps(parameters, sort_keys=True, default=str)
+
+
+class BufferedResult:
+    """Statement result whose records are already in memory.
+
+    Provides the parts of neo4j.v1.api.StatementResult used in this
+    project.
+    """
+
+    def __init__(self, keys, records, summary=None):
+        """Init the result.
+
+        :param keys: Names of the returned fields
+        :type keys: list
+        :param records: List of neo4j.v1.Record
+        :type records: list
+        :param summary: Optional summary of the original result
+        :type summary: neo4j.v1.api.ResultSummary
+        """
+        self._keys = tuple(keys)
+        self._records = collections.deque(records)
+        self._summary = summary
+
+    def __iter__(self):
+        return self.records()
+
+    def keys(self):
+        """Get the names of the returned fields.
+
+        :returns: Field names
+        :rtype: tuple
+        """
+        return self._keys
+
+    def records(self):
+        """Yield remaining records.
+
+        :yields: Records
+        :ytype: neo4j.v1.Record
+        """
+        while self._records:
+            yield self._records.popleft()
+
+    def detach(self):
+        """Records are always detached.
+
+        :returns: Number of remaining records
+        :rtype: int
+        """
+        return len(self._records)
+
+    def single(self):
+        """Get the next and only record.
+
+        :returns: First record or None
+        :rtype: neo4j.v1.Record|None
+        """
+        records = list(self)
+        if not records:
+            return None
+        return records[0]
+
+    def peek(self):
+        """Get the next record without consuming it.
+
+        :returns: Next record or None
+        :rtype: neo4j.v1.Record|None
+        """
+        return self._records[0] if self._records else None
+
+    def data(self):
+        """Get remaining records as dicts.
+
+        :returns: List of dicts
+        :rtype: list
+        """
+        return [dict(zip(r.keys(), r.values())) for r in self]
+
+    def summary(self):
+        """Get the summary of the original result if any.
+
+        :returns: Result summary or None
+        :rtype: neo4j.v1.api.ResultSummary|None
+        """
+        return self._summary
+
+    def consume(self):
+        """Discard remaining records.
+
+        :returns: Result summary or None
+        :rtype: neo4j.v1.api.ResultSummary|None
+        """
+        self._records.clear()
+        return self._summary
+
+
+class RecordingWriter:
+    """Writes recorded statements to a gzipped json lines file."""
+
+    def __init__(self, path):
+        """Init the writer.
+
+        Files are opened for appending so that sequential drivers can
+        share a single recording.
+
+        :param path: Path of the recording file
+        :type path: str
+        """
+        self.path = path
+        self._file = gzip.open(path, 'at')
+        self._statements = {}
+        self.count = 0
+
+    def _write(self, obj):
+        """Write a single line.
+
+        :param obj: Json serializable object
+        :type obj: dict
+        """
+        self._file.write(json.dumps(obj, default=str))
+        self._file.write('\n')
+
+    def write(self, statement, parameters, keys, records):
+        """Write a single statement execution.
+
+        :param statement: Cypher statement
+        :type statement: str
+        :param parameters: Statement parameters
+        :type parameters: dict
+        :param keys: Names of the returned fields
+        :type keys: tuple
+        :param records: Returned records
+        :type records: list
+        """
+        statement_id = self._statements.get(statement)
+        if statement_id is None:
+            statement_id = len(self._statements)
+            self._statements[statement] = statement_id
+            self._write({
+                'type': 'statement',
+                'id': statement_id,
+                'text': statement
+            })
+        self._write({
+            'type': 'run',
+            'statement': statement_id,
+            'parameters': parameters,
+            'keys': list(keys),
+            'records': [encode_value(list(r.values())) for r in records]
+        })
+        self.count += 1
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
+
+
+def read_recording(path):
+    """Read a recording file.
+
+    :param path: Path of the recording file
+    :type path: str
+    :yields: Tuples of (statement, parameters, keys, records)
+    :ytype: tuple
+    """
+    statements = {}
+    with gzip.open(path, 'rt') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            if obj['type'] == 'statement':
+                # Ids restart with every appended writer.
+                statements[obj['id']] = obj['text']
+            elif obj['type'] == 'run':
+                yield (
+                    statements[obj['statement']],
+                    obj['parameters'],
+                    obj['keys'],
+                    obj['records']
+                )
+
+
+class _RecordingTarget:
+    """Base for recording sessions and transactions."""
+
+    def __init__(self, target, writer):
+        """Init the wrapper.
+
+        :param target: Session or transaction to wrap
+        :type target: neo4j.v1.api.Session|neo4j.v1.api.Transaction
+        :param writer: Writer to record statements with
+        :type writer: RecordingWriter
+        """
+        self.target = target
+        self.writer = writer
+
+    def run(self, statement, parameters=None, **kwparameters):
+        """Run a statement and record its parameters and records."""
+        params = dict(parameters or {})
+        params.update(kwparameters)
+        result = self.target.run(statement, params)
+        records = list(result)
+        keys = result.keys()
+        self.writer.write(statement, params, keys, records)
+        return BufferedResult(keys, records, summary=result.summary())
+
+    def __enter__(self):
+        self.target.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        return self.target.__exit__(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+
+class RecordingTransaction(_RecordingTarget):
+    """Transaction wrapper that records every statement."""
+
+
+class RecordingSession(_RecordingTarget):
+    """Session wrapper that hands out recording transactions."""
+
+    def begin_transaction(self, *args, **kwargs):
+        """Begin a recording transaction."""
+        tx = self.target.begin_transaction(*args, **kwargs)
+        return RecordingTransaction(tx, self.writer)
+
+
+class RecordingDriver:
+    """Driver wrapper that records all traffic to a file."""
+
+    def __init__(self, driver, path):
+        """Init the driver.
+
+        :param driver: Driver to wrap
+        :type driver: neo4j.v1.GraphDatabase.driver
+        :param path: Path of the recording file
+        :type path: str
+        """
+        self.driver = driver
+        self.writer = RecordingWriter(path)
+
+    def session(self, *args, **kwargs):
+        """Get a recording session."""
+        return RecordingSession(
+            self.driver.session(*args, **kwargs),
+            self.writer
+        )
+
+    def close(self):
+        """Close the wrapped driver and the recording."""
+        self.driver.close()
+        self.writer.close()
+        logger.info("Recorded {} statements to {}".format(
+            self.writer.count,
+            self.writer.path
+        ))
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+
+class ReplayTransaction:
+    """Transaction that answers statements from a recording."""
+
+    def __init__(self, driver):
+        """Init the transaction.
+
+        :param driver: Replay driver holding the recording
+        :type driver: ReplayDriver
+        """
+        self.driver = driver
+        self.success = None
+
+    def run(self, statement, parameters=None, **kwparameters):
+        """Answer a statement from the recording."""
+        params = dict(parameters or {})
+        params.update(kwparameters)
+        return self.driver.replay(statement, params)
+
+    def commit(self):
+        self.success = True
+
+    def rollback(self):
+        self.success = False
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class ReplaySession(ReplayTransaction):
+    """Session that answers statements from a recording."""
+
+    def begin_transaction(self, *args, **kwargs):
+        """Begin a replay transaction."""
+        return ReplayTransaction(self.driver)
+
+
+class ReplayDriver:
+    """Driver that serves recorded results without a database."""
+
+    def __init__(self, path, strict=False):
+        """Init the driver by loading a recording.
+
+        :param path: Path of the recording file
+        :type path: str
+        :param strict: Raise ReplayMissError for statements that are
+            not in the recording instead of returning no records.
+        :type strict: bool
+        """
+        self.path = path
+        self.strict = strict
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+        self._exact = collections.defaultdict(collections.deque)
+        self._by_template = collections.defaultdict(collections.deque)
+        for statement, params, keys, records in read_recording(path):
+            records = [Record(keys, decode_value(v)) for v in records]
+            entry = [keys, records, False]
+            key = template(statement)
+            self._exact[(key, parameter_key(params))].append(entry)
+            self._by_template[key].append(entry)
+
+    def _pop(self, queue):
+        """Pop the oldest unused entry from a queue.
+
+        :param queue: Queue of entries
+        :type queue: collections.deque
+        :returns: Entry or None
+        :rtype: list|None
+        """
+        while queue:
+            entry = queue.popleft()
+            if not entry[2]:
+                entry[2] = True
+                return entry
+        return None
+
+    def replay(self, statement, parameters):
+        """Answer a statement.
+
+        :param statement: Cypher statement
+        :type statement: str
+        :param parameters: Statement parameters
+        :type parameters: dict
+        :returns: Recorded result
+        :rtype: BufferedResult
+        """
+        key = template(statement)
+        entry = self._pop(self._exact[(key, parameter_key(parameters))])
+        if entry is None:
+            entry = self._pop(self._by_template[key])
+            if entry is not None:
+                self.fallbacks += 1
+        if entry is None:
+            self.misses += 1
+            if self.strict:
+                raise ReplayMissError(key)
+            logger.debug("No recording for statement: {}".format(key))
+            return BufferedResult([], [])
+
+        self.hits += 1
+        keys, records, _ = entry
+        return BufferedResult(keys, records)
+
+    def session(self, *args, **kwargs):
+        """Get a replay session."""
+        return ReplaySession(self)
+
+    def close(self):
+        """Log replay statistics."""
+        logger.info(
+            "Replayed {} statements from {}, {} by statement only, "
+            "{} missing.".format(
+                self.hits,
+                self.path,
+                self.fallbacks,
+                self.misses
+            )
+        )
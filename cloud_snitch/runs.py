@@ -8,6 +8,7 @@ from cloud_snitch import utils
 from cloud_snitch.exc import RunAlreadySyncedError
 from cloud_snitch.exc import RunInvalidError
 from cloud_snitch.exc import RunInvalidStatusError
+from cloud_snitch.manifest import RunManifest
 
 logger = logging.getLogger(__name__)
 
@@ -91,6 +92,19 @@ class Run:
         """
         return self.run_data.get('environment', {}).get('name')
 
+    @property
+    def manifest(self):
+        """Get the manifest of documents in the run.
+
+        Loaded or built once per run object.
+
+        :returns: Manifest of the run
+        :rtype: cloud_snitch.manifest.RunManifest
+        """
+        if self._manifest is None:
+            self._manifest = RunManifest.for_run(self.path)
+        return self._manifest
+
     def _save_data(self):
         """Save run data to disk"""
         with open(os.path.join(self.path, 'run_data.json'), 'w') as f:
@@ -107,6 +121,7 @@ class Run:
         self.path = path
         self.run_data = self._read_data()
         self._completed = None
+        self._manifest = None
 
     def start(self):
         """Mark run as syncing.
@@ -145,14 +160,16 @@ class Run:
         self._save_data()
 
 
-def find_runs():
+def find_runs(data_dir=None):
     """Create a list of run objects from the configured data directory.
 
+    :param data_dir: Directory to search instead of the configured one
+    :type data_dir: str|None
     :returns: List of run objects
     :rtype: list
     """
     runs = []
-    for root, dirs, files in os.walk(settings.DATA_DIR):
+    for root, dirs, files in os.walk(data_dir or settings.DATA_DIR):
         for d in dirs:
             run_data = os.path.join(root, d, 'run_data.json')
             if os.path.isfile(run_data):
@@ -64,3 +64,40 @@ NEO4J_URI = conf_data.get('neo4j', {}).get('uri')
 MAX_RETRIES = conf_data.get('neo4j', {}).get('max_retries', 5)
 
 DATA_DIR = conf_data.get('data_dir')
+
+# Query instrumentation
+_instrumentation = conf_data.get('instrumentation', {})
+INSTRUMENTATION = {
+    'enabled': _instrumentation.get('enabled', False),
+    'slow_query_ms': _instrumentation.get('slow_query_ms', 1000),
+    'profile_sample_rate': _instrumentation.get('profile_sample_rate', 0.0)
+}
+
+# Bulk loading of the first run of an environment
+_bulk_load = conf_data.get('bulk_load', {})
+BULK_LOAD = {
+    'enabled': _bulk_load.get('enabled', True),
+    'batch_size': _bulk_load.get('batch_size', 1000)
+}
+
+# Schema check before syncing
+_schema = conf_data.get('schema', {})
+SCHEMA = {
+    'preflight': _schema.get('preflight', True)
+}
+
+# Generation counters bumped by completed syncs
+_generation = conf_data.get('generation', {})
+GENERATION = {
+    'redis_url': _generation.get('redis_url'),
+    # Must match settle_ms of the web query cache.
+    'settle_ms': _generation.get('settle_ms', 24 * 60 * 60 * 1000)
+}
+
+# Retention of version history for compaction
+_compaction = conf_data.get('compaction', {})
+COMPACTION = {
+    'keep_all_days': _compaction.get('keep_all_days', 30),
+    'daily_days': _compaction.get('daily_days', 365),
+    'batch_size': _compaction.get('batch_size', 1000)
+}
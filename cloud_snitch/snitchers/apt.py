@@ -1,4 +1,3 @@
-import json
 import logging
 
 from .base import BaseSnitcher
@@ -12,7 +11,7 @@ logger = logging.getLogger(__name__)
 class AptSnitcher(BaseSnitcher):
     """Models path host -> virtualenv -> python package path in graph."""
 
-    file_pattern = '^dpkg_list_(?P<hostname>.*).json$'
+    doctype = 'dpkg_list'
 
     def _update_apt_package(self, session, pkgdict):
         """Updates apt package in graph.
@@ -48,7 +47,7 @@ class AptSnitcher(BaseSnitcher):
             name=self.run.environment_name
         )
 
-        for hostname, filename in self._find_host_tuples(self.file_pattern):
+        for hostname, filename in self._find_host_tuples(self.doctype):
             aptpkgs = []
 
             # Find host in graph, continue if host not found.
@@ -61,9 +60,8 @@ class AptSnitcher(BaseSnitcher):
                 continue
 
             # Read data from file
-            with open(filename, 'r') as f:
-                aptdata = json.loads(f.read())
-                aptlist = aptdata.get('data', [])
+            aptdata = self._read_document(filename)
+            aptlist = aptdata.get('data', [])
 
             # Iterate over package maps
             for aptdict in aptlist:
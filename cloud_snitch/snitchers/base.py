@@ -1,8 +1,8 @@
 import logging
 import os
-import re
 import time
 
+from cloud_snitch import documents
 from cloud_snitch import utils
 
 logger = logging.getLogger(__name__)
@@ -31,27 +31,35 @@ class BaseSnitcher(object):
         """
         return os.path.join(self.run.path)
 
-    def _find_host_tuples(self, pattern):
-        """Iterate over datadir looking for matching files.
-
-        Target format is 'hostvar_<hostname>.json'
+    def _find_host_tuples(self, doctype):
+        """List documents of a doctype from the run manifest.
 
+        :param doctype: Doctype like 'facts'
+        :type doctype: str
         :returns: List of tuples of (hostname, filename)
         :rtype: list
         """
-        basedir = self._basedir()
-        host_tuples = []
-        exp = re.compile(pattern)
-
-        for f in os.listdir(basedir):
-            r = exp.search(f)
-            if r:
-                hostname = r.group('hostname')
-                host_tuples.append(
-                    (hostname, os.path.join(basedir, f))
-                )
-
-        return host_tuples
+        return self.run.manifest.host_documents(doctype)
+
+    def _document_path(self, filename):
+        """Get the path of a single document of the run.
+
+        :param filename: Plain name of the document, like 'uservars.json'
+        :type filename: str
+        :returns: Path of the plain or compressed document
+        :rtype: str
+        """
+        return self.run.manifest.document_path(filename)
+
+    def _read_document(self, filename):
+        """Load a plain or compressed json document.
+
+        :param filename: Path of the document
+        :type filename: str
+        :returns: Loaded document
+        :rtype: object
+        """
+        return documents.read_document(filename)
 
     def _snitch(self, session):
         """All subclasses must implement this.
@@ -1,9 +1,9 @@
 import hashlib
-import json
 import logging
 import os
 
 from .base import BaseSnitcher
+from cloud_snitch.models import ConfigfileBlobEntity
 from cloud_snitch.models import ConfigfileEntity
 from cloud_snitch.models import EnvironmentEntity
 from cloud_snitch.models import HostEntity
@@ -14,7 +14,35 @@ logger = logging.getLogger(__name__)
 class ConfigfileSnitcher(BaseSnitcher):
     """Models path host -> configfile"""
 
-    file_pattern = '^file_dict_(?P<hostname>.*).json$'
+    doctype = 'file_dict'
+
+    def __init__(self, driver, run):
+        """Init the snitcher.
+
+        :param driver: Instance of driver
+        :type driver: neo4j.v1.GraphDatabase.driver
+        :param run: Run information object
+        :type run: cloud_snitch.runs.Run
+        """
+        super(ConfigfileSnitcher, self).__init__(driver, run)
+        # md5s of contents already written during this run
+        self._blobs = set()
+
+    def _update_blob(self, session, md5, contents):
+        """Store contents once per md5.
+
+        :param session: neo4j driver session
+        :type session: neo4j.v1.session.BoltSession
+        :param md5: md5 of the contents
+        :type md5: str
+        :param contents: Contents of the file
+        :type contents: str
+        """
+        if md5 is None or md5 in self._blobs:
+            return
+        blob = ConfigfileBlobEntity(md5=md5, contents=contents)
+        blob.update(session, self.time_in_ms)
+        self._blobs.add(md5)
 
     def _update_host(self, session, hostname, filename):
         """Update configuration files for a host.
@@ -26,15 +54,13 @@ class ConfigfileSnitcher(BaseSnitcher):
         :param filename: Name of file
         :type filename: str
         """
-        # Extract config and environment data.
-        with open(filename, 'r') as f:
-            configdata = json.loads(f.read())
-            envdict = configdata.get('environment', {})
-            env = EnvironmentEntity(
-                account_number=envdict.get('account_number'),
-                name=envdict.get('name')
-            )
-            configdata = configdata.get('data', {})
+        # Extract config data.
+        configdata = self._read_document(filename)
+        env = EnvironmentEntity(
+            account_number=self.run.environment_account_number,
+            name=self.run.environment_name
+        )
+        configdata = configdata.get('data', {})
 
         # Find parent host object - return early if not exists.
         host = HostEntity(hostname=hostname, environment=env.identity)
@@ -48,12 +74,18 @@ class ConfigfileSnitcher(BaseSnitcher):
         for filename, metadata in configdata.items():
             _, name = os.path.split(filename)
 
+            # Contents are shared by every file with the same md5
+            self._update_blob(
+                session,
+                metadata.get('md5'),
+                metadata.get('contents')
+            )
+
             # Update configfile node
             configfile = ConfigfileEntity(
                 path=filename,
                 host=host.identity,
                 md5=metadata.get('md5'),
-                contents=metadata.get('contents'),
                 is_binary=metadata.get('is_binary'),
                 name=name
             )
@@ -69,5 +101,5 @@ class ConfigfileSnitcher(BaseSnitcher):
         :param session: neo4j driver session
         :type session: neo4j.v1.session.BoltSession
         """
-        for hostname, filename in self._find_host_tuples(self.file_pattern):
+        for hostname, filename in self._find_host_tuples(self.doctype):
             self._update_host(session, hostname, filename)
@@ -1,4 +1,3 @@
-import json
 import logging
 
 from .base import BaseSnitcher
@@ -12,7 +11,7 @@ logger = logging.getLogger(__name__)
 class ConfiguredInterfaceSnitcher(BaseSnitcher):
     """Models path host -> configuredinterface"""
 
-    file_pattern = '^configuredinterface_(?P<hostname>.*).json$'
+    doctype = 'configuredinterface'
 
     def _update_host(self, session, hostname, filename):
         """Update configuredinterfaces for a host.
@@ -24,15 +23,13 @@ class ConfiguredInterfaceSnitcher(BaseSnitcher):
         :param filename: Name of file
         :type filename: str
         """
-        # Extract config and environment data.
-        with open(filename, 'r') as f:
-            data = json.loads(f.read())
-            envdict = data.get('environment', {})
-            env = EnvironmentEntity(
-                account_number=envdict.get('account_number'),
-                name=envdict.get('name')
-            )
-            configdata = data.get('data', {})
+        # Extract config data.
+        data = self._read_document(filename)
+        env = EnvironmentEntity(
+            account_number=self.run.environment_account_number,
+            name=self.run.environment_name
+        )
+        configdata = data.get('data', {})
 
         # Find parent host object - return early if not exists.
         host = HostEntity(hostname=hostname, environment=env.identity)
@@ -67,5 +64,5 @@ class ConfiguredInterfaceSnitcher(BaseSnitcher):
         :param session: neo4j driver session
         :type session: neo4j.v1.session.BoltSession
         """
-        for hostname, filename in self._find_host_tuples(self.file_pattern):
+        for hostname, filename in self._find_host_tuples(self.doctype):
             self._update_host(session, hostname, filename)
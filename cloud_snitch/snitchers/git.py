@@ -1,7 +1,5 @@
 import hashlib
-import json
 import logging
-import os
 
 from .base import BaseSnitcher
 from cloud_snitch.models import EnvironmentEntity
@@ -132,17 +130,16 @@ class GitSnitcher(BaseSnitcher):
         """
         # Load saved git data
         try:
-            filename = os.path.join(self._basedir(), 'gitrepos.json')
-            with open(filename, 'r') as f:
-                gitdata = json.loads(f.read())
+            filename = self._document_path('gitrepos.json')
+            gitdata = self._read_document(filename)
         except IOError:
             logger.info('No data for git could be found.')
             return
 
         # Let model compute environment identity
         env = EnvironmentEntity(
-            account_number=gitdata['environment']['account_number'],
-            name=gitdata['environment']['name']
+            account_number=self.run.environment_account_number,
+            name=self.run.environment_name
         )
         identity = env.identity
 
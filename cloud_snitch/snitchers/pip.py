@@ -1,4 +1,3 @@
-import json
 import logging
 
 from .base import BaseSnitcher
@@ -13,7 +12,7 @@ logger = logging.getLogger(__name__)
 class PipSnitcher(BaseSnitcher):
     """Models path host -> virtualenv -> python package path in graph."""
 
-    file_pattern = '^pip_list_(?P<hostname>.*).json$'
+    doctype = 'pip_list'
 
     def _update_python_package(self, session, virtualenv, pkg):
         """Updates python package in graph.
@@ -71,7 +70,7 @@ class PipSnitcher(BaseSnitcher):
             name=self.run.environment_name
         )
 
-        for hostname, filename in self._find_host_tuples(self.file_pattern):
+        for hostname, filename in self._find_host_tuples(self.doctype):
             virtualenvs = []
             host = HostEntity(hostname=hostname, environment=env.identity)
             host = HostEntity.find(session, host.identity)
@@ -81,9 +80,8 @@ class PipSnitcher(BaseSnitcher):
                 )
                 continue
 
-            with open(filename, 'r') as f:
-                pipdict = json.loads(f.read())
-                pipdict = pipdict.get('data', {})
+            pipdict = self._read_document(filename)
+            pipdict = pipdict.get('data', {})
 
             for path, pkglist in pipdict.items():
                 virtualenv = self._update_virtualenv(
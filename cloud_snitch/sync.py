@@ -23,12 +23,18 @@ from cloud_snitch.snitchers.configuredinterface import \
     ConfiguredInterfaceSnitcher
 
 from cloud_snitch import runs
+from cloud_snitch import settings
 from cloud_snitch import utils
+from cloud_snitch.bulk import bulk_consume
+from cloud_snitch.constraints import SchemaManager
+from cloud_snitch.constraints import log_report
 from cloud_snitch.driver import DriverContext
 from cloud_snitch.exc import EnvironmentLockedError
 from cloud_snitch.exc import RunInvalidStatusError
 from cloud_snitch.exc import RunAlreadySyncedError
 from cloud_snitch.exc import RunContainsOldDataError
+from cloud_snitch.generation import Generations
+from cloud_snitch.instrumentation import QueryRecorder
 from cloud_snitch.models import EnvironmentEntity
 from cloud_snitch.lock import lock_environment
 
@@ -44,6 +50,63 @@ parser.add_argument(
     default=1,
     help="How many concurrent processes to use."
 )
+parser.add_argument(
+    '--instrument',
+    action='store_true',
+    default=settings.INSTRUMENTATION['enabled'],
+    help="Record latency and result counts of every query."
+)
+parser.add_argument(
+    '--slow-query-ms',
+    type=int,
+    default=settings.INSTRUMENTATION['slow_query_ms'],
+    help="Log instrumented queries slower than this many milliseconds."
+)
+parser.add_argument(
+    '--profile-sample-rate',
+    type=float,
+    default=settings.INSTRUMENTATION['profile_sample_rate'],
+    help="Fraction of instrumented read queries to re-run with PROFILE."
+)
+parser.add_argument(
+    '--record',
+    type=str,
+    default=None,
+    help="Record all queries and results to this file. Forces a "
+         "concurrency of 1."
+)
+parser.add_argument(
+    '--replay',
+    type=str,
+    default=None,
+    help="Replay queries from a recording instead of using the database."
+)
+parser.add_argument(
+    '--no-bulk-load',
+    dest='bulk_load',
+    action='store_false',
+    default=settings.BULK_LOAD['enabled'],
+    help="Sync the first run of an environment like any other run."
+)
+parser.add_argument(
+    '--no-schema-check',
+    dest='schema_check',
+    action='store_false',
+    default=settings.SCHEMA['preflight'],
+    help="Do not create missing constraints and indexes before syncing."
+)
+
+# Snitchers in the order they consume a run.
+SNITCHERS = [
+    EnvironmentSnitcher,
+    GitSnitcher,
+    HostSnitcher,
+    ConfigfileSnitcher,
+    PipSnitcher,
+    AptSnitcher,
+    UservarsSnitcher,
+    ConfiguredInterfaceSnitcher
+]
 
 
 def check_run_time(driver, run):
@@ -55,6 +118,8 @@ def check_run_time(driver, run):
     :type driver: neo4j.v1.GraphDatabase.driver
     :param run: Date run instance
     :type run: cloud_snitch.runs.Run
+    :returns: The environment or None if it does not exist yet
+    :rtype: EnvironmentEntity|None
     """
     # Check to see if run data is new
     with driver.session() as session:
@@ -72,6 +137,7 @@ def check_run_time(driver, run):
             )
             if run.completed <= last_update:
                 raise RunContainsOldDataError(run, last_update)
+        return e
 
 
 def consume(driver, run):
@@ -80,35 +146,54 @@ def consume(driver, run):
     :param run: Run to consume
     :type run: runs.Run
     """
-    snitchers = [
-        EnvironmentSnitcher(driver, run),
-        GitSnitcher(driver, run),
-        HostSnitcher(driver, run),
-        ConfigfileSnitcher(driver, run),
-        PipSnitcher(driver, run),
-        AptSnitcher(driver, run),
-        UservarsSnitcher(driver, run),
-        ConfiguredInterfaceSnitcher(driver, run)
-    ]
-    for snitcher in snitchers:
-        snitcher.snitch()
-
-
-def sync_run(driver, run):
+    for snitcher_class in SNITCHERS:
+        snitcher_class(driver, run).snitch()
+
+
+def bump_generation(run):
+    """Bump the generation counters after a completed run.
+
+    A run that completed longer ago than the settle window changes
+    history at times whose cached results are kept by epoch, so the
+    epoch is bumped as well.
+
+    :param run: Completed run
+    :type run: runs.Run
+    """
+    age = utils.milliseconds_now() - utils.milliseconds(run.completed)
+    Generations(settings.GENERATION['redis_url']).bump(
+        epoch=age >= settings.GENERATION['settle_ms']
+    )
+
+
+def sync_run(driver, run, bulk=True, replay=False):
     """Syncs an individuals run.
 
     :param run: Run to sync
     :type run: runs.Run
+    :param bulk: Bulk load the run if it is the first of its environment.
+    :type bulk: bool
+    :param replay: The driver replays a recording. The run is consumed
+        without checking or changing its status and without bumping
+        generations, so a recorded run can be replayed again.
+    :type replay: bool
     """
     try:
-        check_run_time(driver, run)
-        run.start()
+        env = check_run_time(driver, run)
+        if not replay:
+            run.start()
         logger.info("Starting collection on {}".format(run.path))
-        consume(driver, run)
+        if bulk and env is None:
+            logger.info("First run of environment, loading in bulk.")
+            bulk_consume(driver, run, consume)
+        else:
+            consume(driver, run)
         logger.info("Run completion time: {}".format(
             utils.milliseconds(run.completed)
         ))
-        run.finish()
+        if not replay:
+            run.finish()
+            bump_generation(run)
     except RunAlreadySyncedError as e:
         logger.info(e)
     except RunInvalidStatusError as e:
@@ -117,28 +202,77 @@ def sync_run(driver, run):
         logger.info(e)
     except Exception:
         logger.exception('Unable to complete run.')
-    run.error()
+    if not replay:
+        run.error()
+
+
+def instrumentation_options(args):
+    """Get instrumentation options from parsed arguments.
+
+    :param args: Namespaced object from parsed arguments.
+    :type args: object
+    :returns: Keyword arguments for a QueryRecorder or None if disabled
+    :rtype: dict|None
+    """
+    if not args.instrument:
+        return None
+    return {
+        'slow_query_ms': args.slow_query_ms,
+        'profile_sample_rate': args.profile_sample_rate
+    }
 
 
-def sync_paths(paths):
+def sync_paths(paths, instrumentation=None, record=None, replay=None,
+               bulk=True):
     """Sync all runs indicated by paths.
 
     :param paths: list of paths indicating runs.
     :type paths: list
+    :param instrumentation: Optional QueryRecorder keyword arguments.
+        Queries are instrumented when provided.
+    :type instrumentation: dict|None
+    :param record: Optional path of a file to record queries to
+    :type record: str|None
+    :param replay: Optional path of a recording to replay
+    :type replay: str|None
+    :param bulk: Bulk load first runs of environments
+    :type bulk: bool
     """
+    recorder = None
+    if instrumentation is not None:
+        recorder = QueryRecorder(**instrumentation)
+
     # Start a neo4j driver context.
-    with DriverContext() as driver:
+    context = DriverContext(recorder=recorder, record=record, replay=replay)
+    with context as driver:
         for path in paths:
             run = runs.Run(path)
             # Try to acquire environment lock.
             # @TODO - Implement wait until timeout loop.
             try:
                 with lock_environment(driver, run):
-                    sync_run(driver, run)
+                    sync_run(
+                        driver,
+                        run,
+                        bulk=bulk,
+                        replay=replay is not None
+                    )
             except EnvironmentLockedError as e:
                 logger.error(e)
 
 
+def preflight():
+    """Create missing constraints and indexes before syncing.
+
+    :returns: Whether or not the schema is usable
+    :rtype: bool
+    """
+    with DriverContext() as driver:
+        report = SchemaManager(driver).apply()
+    log_report(report)
+    return not (report.missing or report.failed)
+
+
 def sort_key(item):
     """Returns a string to sort by for a run.
 
@@ -175,13 +309,32 @@ def groupby_key(item):
 def main():
     start = time.time()
     args = parser.parse_args()
+    instrumentation = instrumentation_options(args)
+    concurrency = args.concurrency
+    if args.record is not None:
+        # Every group appends to the same recording.
+        concurrency = 1
+        open(args.record, 'wb').close()
+    # A replay has no database to check.
+    if args.schema_check and args.replay is None and not preflight():
+        logger.error("Schema check failed, not syncing.")
+        return
     foundruns = runs.find_runs()
     foundruns = sorted(foundruns, key=sort_key)
-    with ProcessPoolExecutor(max_workers=args.concurrency) as executor:
+    with ProcessPoolExecutor(max_workers=concurrency) as executor:
         future_to_sync = set()
         for _, group in groupby(foundruns, groupby_key):
             paths = [r.path for r in group]
-            future_to_sync.add(executor.submit(sync_paths, paths))
+            future_to_sync.add(
+                executor.submit(
+                    sync_paths,
+                    paths,
+                    instrumentation,
+                    args.record,
+                    args.replay,
+                    args.bulk_load
+                )
+            )
 
         for future in as_completed(future_to_sync):
             try:
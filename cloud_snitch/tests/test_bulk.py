@@ -0,0 +1,129 @@
+import unittest
+
+from cloud_snitch import bulk
+from cloud_snitch.backends.memory import Interval
+from cloud_snitch.backends.memory import MemoryGraph
+from cloud_snitch.models import EnvironmentEntity
+from cloud_snitch.models import HostEntity
+
+
+class FakeTransaction(object):
+
+    def __init__(self, session):
+        self.session = session
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.session.committed.append(self.statements)
+
+    def run(self, cypher, **params):
+        if len(self.session.committed) == self.session.fail_at:
+            raise RuntimeError('Connection lost')
+        self.statements.append(cypher)
+
+
+class FakeSession(object):
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.committed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def begin_transaction(self):
+        return FakeTransaction(self)
+
+
+class FakeDriver(object):
+
+    def __init__(self, session):
+        self._session = session
+
+    def session(self):
+        return self._session
+
+
+def _graph():
+    """Build the graph of an environment with two hosts."""
+    graph = MemoryGraph()
+    graph.models = {
+        EnvironmentEntity.label: EnvironmentEntity,
+        HostEntity.label: HostEntity
+    }
+    graph.identities = {
+        EnvironmentEntity.label: {
+            '1_env': {
+                'account_number': '1',
+                'name': 'env',
+                'created_at': 10
+            }
+        },
+        HostEntity.label: {
+            'a_1_env': {'hostname': 'a', 'created_at': 10},
+            'b_1_env': {'hostname': 'b', 'created_at': 10}
+        }
+    }
+    graph.states = {
+        (HostEntity.label, 'a_1_env'): [Interval(10, props={'kernel': 'k'})],
+        (HostEntity.label, 'b_1_env'): [Interval(10, props={'kernel': 'k'})]
+    }
+    graph.edges = {
+        (EnvironmentEntity.label, '1_env', 'HAS_HOST', HostEntity.label): {
+            'a_1_env': [Interval(10)],
+            'b_1_env': [Interval(10)]
+        }
+    }
+    return graph
+
+
+def _mentions_environment(statements):
+    return any(':Environment ' in cypher for cypher in statements)
+
+
+class TestWriteGraph(unittest.TestCase):
+
+    def test_environment_last(self):
+        """Test that the environment and its edges commit together last."""
+        session = FakeSession()
+        counts = bulk.write_graph(FakeDriver(session), _graph(), 1)
+        self.assertEqual(
+            counts,
+            {'identities': 3, 'states': 2, 'edges': 2}
+        )
+        for statements in session.committed[:-1]:
+            self.assertFalse(_mentions_environment(statements))
+        last = session.committed[-1]
+        self.assertEqual(len(last), 2)
+        self.assertTrue(all(':Environment ' in c for c in last))
+        self.assertTrue('HAS_HOST' in last[1])
+
+    def test_failure_partway(self):
+        """Test that a failed load leaves no environment and can rerun."""
+        session = FakeSession(fail_at=2)
+        with self.assertRaises(RuntimeError):
+            bulk.write_graph(FakeDriver(session), _graph(), 1)
+        self.assertEqual(len(session.committed), 2)
+        for statements in session.committed:
+            self.assertFalse(_mentions_environment(statements))
+
+        # Running the load again only uses idempotent statements.
+        session = FakeSession()
+        bulk.write_graph(FakeDriver(session), _graph(), 1)
+        for statements in session.committed:
+            for cypher in statements:
+                self.assertFalse('CREATE (n:' in cypher)
+                self.assertFalse('CREATE (s)-[' in cypher)
+                if 'HAS_STATE' in cypher:
+                    self.assertTrue('WHERE NOT' in cypher)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import mock
+import unittest
+
+from cloud_snitch import compact
+
+from .test_bulk import FakeSession
+
+DAY = compact.DAY_MS
+NOW = 1000 * DAY
+
+
+class TestPlanMerges(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = compact.RetentionPolicy(
+            keep_all_days=30,
+            daily_days=365,
+            now=NOW
+        )
+
+    def test_touching(self):
+        """Test that touching intervals in a bucket are merged."""
+        start = NOW - 400 * DAY
+        intervals = [
+            {'rel': 1, 'from': start, 'to': start + 1},
+            {'rel': 2, 'from': start + 1, 'to': start + 2},
+            {'rel': 3, 'from': start + 2, 'to': start + 3}
+        ]
+        merges = compact.plan_merges(intervals, self.policy)
+        self.assertEqual(len(merges), 1)
+        kept, frm, removed = merges[0]
+        self.assertEqual(kept['rel'], 3)
+        self.assertEqual(frm, start)
+        self.assertEqual([i['rel'] for i in removed], [1, 2])
+
+    def test_gap(self):
+        """Test that intervals with a gap between them are kept apart."""
+        start = NOW - 400 * DAY
+        intervals = [
+            {'rel': 1, 'from': start, 'to': start + 1},
+            {'rel': 2, 'from': start + 5, 'to': start + 6}
+        ]
+        self.assertEqual(compact.plan_merges(intervals, self.policy), [])
+
+
+class TestApply(unittest.TestCase):
+
+    def test_one_transaction(self):
+        """Test that deletes and extends of a page commit together."""
+        session = FakeSession()
+        compactor = compact.Compactor(mock.Mock(), mock.Mock(), batch_size=1)
+        compactor._apply(
+            session,
+            [{'rel': 3, 'from': 1}, {'rel': 6, 'from': 4}],
+            [1, 2, 4, 5],
+            compact._DELETE_EDGES
+        )
+        self.assertEqual(
+            session.committed,
+            [[compact._DELETE_EDGES, compact._EXTEND]]
+        )
+
+    def test_failure(self):
+        """Test that a failed page writes nothing."""
+        session = FakeSession(fail_at=0)
+        compactor = compact.Compactor(mock.Mock(), mock.Mock())
+        with self.assertRaises(RuntimeError):
+            compactor._apply(
+                session,
+                [{'rel': 3, 'from': 1}],
+                [1, 2],
+                compact._DELETE_EDGES
+            )
+        self.assertEqual(session.committed, [])
+
+
+class TestMain(unittest.TestCase):
+
+    def main(self, argv):
+        m_compactor = mock.Mock()
+        m_compactor.move_blobs.return_value = {'ConfigfileState': 2}
+        m_compactor.compact.return_value = ({}, {})
+        with mock.patch.object(compact, 'DriverContext', mock.MagicMock()), \
+                mock.patch.object(compact, 'Generations'), \
+                mock.patch.object(
+                    compact,
+                    'Compactor',
+                    return_value=m_compactor):
+            with mock.patch('sys.argv', ['cloud-snitch-compact'] + argv):
+                compact.main()
+        return m_compactor
+
+    def test_blobs_only(self):
+        """Test that --blobs-only never compacts history."""
+        m_compactor = self.main(['--blobs-only'])
+        m_compactor.move_blobs.assert_called_once_with()
+        self.assertEqual(m_compactor.compact.call_count, 0)
+
+    def test_compact(self):
+        m_compactor = self.main([])
+        m_compactor.compact.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
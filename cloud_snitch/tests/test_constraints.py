@@ -0,0 +1,128 @@
+import mock
+import unittest
+
+from cloud_snitch import constraints
+from cloud_snitch.models import EnvironmentEntity
+from cloud_snitch.models import HostEntity
+from cloud_snitch.models import UservarEntity
+
+
+def _v33_row(item):
+    """Build a db.indexes() row like Neo4j 3.3 returns."""
+    return {
+        'description': 'INDEX ON :{}({})'.format(
+            item.token,
+            ', '.join(item.properties)
+        ),
+        'state': 'online',
+        'type': 'node_unique_property'
+        if item.kind == constraints.UNIQUE else 'node_label_property'
+    }
+
+
+class TestExistingItem(unittest.TestCase):
+
+    def test_v33_index(self):
+        """Test reading an index from its description."""
+        item = constraints.existing_item({
+            'description': 'INDEX ON :Host(hostname)',
+            'state': 'online',
+            'type': 'node_label_property'
+        })
+        self.assertEqual(
+            item,
+            constraints.SchemaItem(
+                constraints.NODE_INDEX,
+                'Host',
+                ('hostname',)
+            )
+        )
+
+    def test_v33_unique(self):
+        """Test reading a uniqueness constraint from its description."""
+        expected = constraints.SchemaItem(
+            constraints.UNIQUE,
+            'Host',
+            ('hostname_environment',)
+        )
+        item = constraints.existing_item({
+            'description': 'INDEX ON :Host(hostname_environment)',
+            'state': 'online',
+            'type': 'node_unique_property'
+        })
+        self.assertEqual(item, expected)
+        item = constraints.existing_item({
+            'description': 'CONSTRAINT ON ( host:Host ) '
+                           'ASSERT host.hostname_environment IS UNIQUE'
+        })
+        self.assertEqual(item, expected)
+
+    def test_unknown(self):
+        """Test that unreadable rows are skipped."""
+        self.assertIsNone(constraints.existing_item({'description': 'x'}))
+        self.assertIsNone(constraints.existing_item({}))
+
+
+class TestReport(unittest.TestCase):
+
+    def _manager(self, rows):
+        manager = constraints.SchemaManager(
+            None,
+            entities=[EnvironmentEntity, HostEntity]
+        )
+
+        def read(session, cypher):
+            if cypher == 'CALL dbms.components()':
+                return [{'name': 'Neo4j Kernel', 'versions': ['3.3.5']}]
+            return rows
+
+        manager._read = mock.Mock(side_effect=read)
+        return manager
+
+    def test_v33_present(self):
+        """Test that an applied schema on 3.3 is reported as present."""
+        required = constraints.required_schema(
+            [EnvironmentEntity, HostEntity]
+        )
+        rows = [
+            _v33_row(item) for item in required
+            if item.kind != constraints.RELATIONSHIP_INDEX
+        ]
+        report = self._manager(rows).report(None)
+        self.assertEqual(report.version, (3, 3))
+        self.assertEqual(report.missing, [])
+        self.assertEqual(report.failed, [])
+        self.assertEqual(len(report.present), len(rows))
+
+    def test_v33_missing(self):
+        """Test that absent items on 3.3 are reported as missing."""
+        report = self._manager([]).report(None)
+        self.assertTrue(report.missing)
+        self.assertEqual(report.present, [])
+
+
+class TestRequiredSchema(unittest.TestCase):
+
+    def test_state_indexes(self):
+        """Test that state properties are indexed on the state label."""
+        required = constraints.required_schema([HostEntity, UservarEntity])
+        self.assertIn(
+            constraints.SchemaItem(
+                constraints.NODE_INDEX,
+                'HostState',
+                ('kernel',)
+            ),
+            required
+        )
+        self.assertNotIn(
+            constraints.SchemaItem(
+                constraints.NODE_INDEX,
+                'UservarState',
+                ('value',)
+            ),
+            required
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
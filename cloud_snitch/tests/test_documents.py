@@ -0,0 +1,69 @@
+import gzip
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloud_snitch import documents
+from cloud_snitch.exc import CompressionUnavailableError
+
+DATA = {'hostname': 'a', 'packages': [{'name': 'pkg', 'version': '1.0'}]}
+
+
+class TestDocuments(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'facts_a.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_split_suffix(self):
+        cases = [
+            ('facts_a.json', ('facts_a.json', None)),
+            ('facts_a.json.gz', ('facts_a.json', 'gzip')),
+            ('/run/facts_a.json.zst', ('/run/facts_a.json', 'zstd')),
+            ('facts_a.gz.json', ('facts_a.gz.json', None))
+        ]
+        for filename, expected in cases:
+            self.assertEqual(documents.split_suffix(filename), expected)
+
+    def test_plain(self):
+        written = documents.write_document(self.path, DATA)
+        self.assertEqual(written, self.path)
+        self.assertEqual(documents.read_document(written), DATA)
+
+    def test_gzip(self):
+        written = documents.write_document(self.path, DATA, 'gzip')
+        self.assertEqual(written, self.path + '.gz')
+        self.assertFalse(os.path.exists(self.path))
+        with gzip.open(written, 'rb') as f:
+            self.assertTrue(f.read().startswith(b'{'))
+        self.assertEqual(documents.read_document(written), DATA)
+
+    @unittest.skipIf(documents.zstandard is None, 'zstandard not installed')
+    def test_zstd(self):
+        written = documents.write_document(self.path, DATA, 'zstd')
+        self.assertEqual(written, self.path + '.zst')
+        self.assertEqual(documents.read_document(written), DATA)
+        self.assertIn('zstd', documents.available_compressions())
+
+    def test_zstd_unavailable(self):
+        """Test zstd documents raise without the zstandard package."""
+        with open(self.path + '.zst', 'wb') as f:
+            f.write(b'not read')
+        with mock.patch.object(documents, 'zstandard', None):
+            self.assertEqual(
+                documents.available_compressions(),
+                [None, 'gzip']
+            )
+            with self.assertRaises(CompressionUnavailableError):
+                documents.write_document(self.path, DATA, 'zstd')
+            with self.assertRaises(CompressionUnavailableError):
+                documents.read_document(self.path + '.zst')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloud_snitch import export
+from cloud_snitch import generate
+
+
+def _read(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.tmpdir, 'data')
+        self.output_dir = os.path.join(self.tmpdir, 'csv')
+        os.makedirs(self.output_dir)
+        args = generate.parser.parse_args([
+            '--environments', '1',
+            '--hosts', '2',
+            '--runs', '2',
+            '--apt-packages', '3',
+            '--python-packages', '2',
+            '--configfiles', '2',
+            '--configfile-size', '20',
+            '--output-dir', self.data_dir
+        ])
+        generate.generate(args)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_export(self):
+        """Test the csv files of a small generated fleet."""
+        graph = export.build_graph(self.data_dir)
+        node_files, rel_files = export.export_graph(graph, self.output_dir)
+        names = [os.path.basename(f) for f in node_files + rel_files]
+        self.assertIn('nodes_Host.csv', names)
+        self.assertIn('nodes_HostState.csv', names)
+        self.assertIn('rels_HAS_STATE.csv', names)
+        self.assertIn('rels_HAS_HOST.csv', names)
+
+        hosts = _read(os.path.join(self.output_dir, 'nodes_Host.csv'))
+        self.assertEqual(hosts[0][:2], [':ID', ':LABEL'])
+        self.assertIn('hostname_environment', hosts[0])
+        self.assertEqual(len(hosts), 3)
+        ids = set()
+        for row in hosts[1:]:
+            self.assertEqual(len(row), len(hosts[0]))
+            self.assertEqual(row[1], 'Host')
+            ids.add(row[0])
+
+        edges = _read(os.path.join(self.output_dir, 'rels_HAS_HOST.csv'))
+        self.assertEqual(
+            edges[0],
+            [':START_ID', ':END_ID', ':TYPE', 'from:long', 'to:long']
+        )
+        self.assertEqual(set(row[1] for row in edges[1:]), ids)
+        for row in edges[1:]:
+            self.assertEqual(row[2], 'HAS_HOST')
+            self.assertLess(int(row[3]), int(row[4]))
+
+        has_state = _read(os.path.join(self.output_dir, 'rels_HAS_STATE.csv'))
+        self.assertEqual(len(has_state) - 1, graph.state_count())
+
+        command = export.import_command(node_files, rel_files)
+        self.assertNotIn('--ignore-empty-strings', command)
+
+    def test_empty_strings(self):
+        """Test that empty strings stay distinct from missing values."""
+        path = os.path.join(self.output_dir, 'nodes.csv')
+        export.write_nodes(path, 'ConfigfileBlob', [
+            ('a', {'contents': '', 'md5': 'a'}),
+            ('b', {'contents': None, 'md5': 'b'}),
+            ('c', {'contents': 'x = "1"\ny = 2', 'md5': 'c'})
+        ])
+        with open(path) as f:
+            lines = f.read().split('\n')
+        self.assertEqual(lines[0], ':ID,:LABEL,contents,md5')
+        self.assertEqual(lines[1], '"a","ConfigfileBlob","","a"')
+        self.assertEqual(lines[2], '"b","ConfigfileBlob",,"b"')
+        rows = _read(path)
+        self.assertEqual(rows[3][2], 'x = "1"\ny = 2')
+
+    def test_encode(self):
+        self.assertEqual(export.encode(None), '')
+        self.assertEqual(export.encode(True), 'true')
+        self.assertEqual(export.encode(3), '3')
+        self.assertEqual(export.encode(['a', 'b']), '"a;b"')
+        self.assertEqual(export.encode('a"b'), '"a""b"')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import datetime
+import mock
+import unittest
+
+from cloud_snitch import generation
+from cloud_snitch import sync
+from cloud_snitch import utils
+
+
+class FakeRedis(object):
+    """Dictionary backed redis client supporting counters."""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline(object):
+
+    def __init__(self, client):
+        self.client = client
+        self.keys = []
+
+    def incr(self, key):
+        self.keys.append(key)
+
+    def execute(self):
+        return [self.client.incr(key) for key in self.keys]
+
+
+class TestGenerations(unittest.TestCase):
+
+    def test_disabled(self):
+        gens = generation.Generations()
+        self.assertIsNone(gens.bump())
+        self.assertIsNone(gens.current())
+        self.assertIsNone(gens.epoch())
+
+    def test_bump(self):
+        gens = generation.Generations(client=FakeRedis())
+        self.assertEqual(gens.current(), 0)
+        self.assertEqual(gens.epoch(), 0)
+        self.assertEqual(gens.bump(), 1)
+        self.assertEqual(gens.bump(epoch=True), 2)
+        self.assertEqual(gens.current(), 2)
+        self.assertEqual(gens.epoch(), 1)
+
+    def test_failures_are_logged(self):
+        client = mock.Mock()
+        client.pipeline.side_effect = Exception('down')
+        client.get.side_effect = Exception('down')
+        gens = generation.Generations(client=client)
+        self.assertIsNone(gens.bump(epoch=True))
+        self.assertIsNone(gens.current())
+
+
+class TestBumpGeneration(unittest.TestCase):
+
+    def bump(self, age_ms):
+        run = mock.Mock()
+        run.completed = utils.utcdatetimenow() - datetime.timedelta(
+            milliseconds=age_ms
+        )
+        m_gens = mock.Mock()
+        with mock.patch.object(sync, 'Generations', return_value=m_gens):
+            with mock.patch.dict(
+                sync.settings.GENERATION,
+                {'redis_url': None, 'settle_ms': 60000}
+            ):
+                sync.bump_generation(run)
+        return m_gens.bump
+
+    def test_recent_run(self):
+        self.bump(1000).assert_called_once_with(epoch=False)
+
+    def test_late_run_bumps_epoch(self):
+        self.bump(120000).assert_called_once_with(epoch=True)
@@ -0,0 +1,176 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloud_snitch import documents
+from cloud_snitch import manifest
+from cloud_snitch import runs
+from cloud_snitch.manifest import RunManifest
+from cloud_snitch.snitchers.base import BaseSnitcher
+
+RUN_DATA = {
+    'status': 'finished',
+    'completed': '2018-01-01T00:00:00',
+    'environment': {'account_number': '1', 'name': 'env'}
+}
+
+
+class TestParseFilename(unittest.TestCase):
+
+    def test_parse_filename(self):
+        cases = [
+            ('facts_host-a.json', ('facts', 'host-a')),
+            ('dpkg_list_host_b.json.gz', ('dpkg_list', 'host_b')),
+            ('file_dict_c.json.zst', ('file_dict', 'c')),
+            ('gitrepos.json', ('gitrepos.json', None)),
+            ('uservars.json.gz', ('uservars.json', None)),
+            ('facts_.json', (None, None)),
+            ('run_data.json', (None, None)),
+            ('facts_host-a.txt', (None, None)),
+            (manifest.MANIFEST_FILENAME, (None, None))
+        ]
+        for filename, expected in cases:
+            self.assertEqual(manifest.parse_filename(filename), expected)
+
+
+class TestRunManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        with open(os.path.join(self.path, 'run_data.json'), 'w') as f:
+            f.write(json.dumps(RUN_DATA))
+        self._write('facts_host-a.json', {'host': 'a'})
+        self._write('facts_host-b.json', {'host': 'b'}, 'gzip')
+        self._write('dpkg_list_host-a.json', [], 'gzip')
+        self._write('uservars.json', {'var': 1}, 'gzip')
+        self._write('gitrepos.json', [])
+        with open(os.path.join(self.path, 'notes.txt'), 'w') as f:
+            f.write('not a document')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _write(self, filename, data, compression=None):
+        return documents.write_document(
+            os.path.join(self.path, filename),
+            data,
+            compression
+        )
+
+    def _file(self, filename):
+        return os.path.join(self.path, filename)
+
+    def test_scan(self):
+        """Test documents found by listing the run directory."""
+        scanned = RunManifest.scan(self.path)
+        self.assertEqual(
+            scanned.host_documents('facts'),
+            [
+                ('host-a', self._file('facts_host-a.json')),
+                ('host-b', self._file('facts_host-b.json.gz'))
+            ]
+        )
+        self.assertEqual(
+            scanned.host_documents('dpkg_list'),
+            [('host-a', self._file('dpkg_list_host-a.json.gz'))]
+        )
+        self.assertEqual(scanned.host_documents('pip_list'), [])
+        self.assertEqual(
+            scanned.document_path('uservars.json'),
+            self._file('uservars.json.gz')
+        )
+        self.assertEqual(
+            scanned.document_path('gitrepos.json'),
+            self._file('gitrepos.json')
+        )
+        entry = scanned.hosts['facts']['host-a']
+        self.assertEqual(
+            entry['size'],
+            os.path.getsize(self._file('facts_host-a.json'))
+        )
+        self.assertIsNone(entry['checksum'])
+
+    def test_scan_checksums(self):
+        scanned = RunManifest.scan(self.path, checksums=True)
+        self.assertEqual(
+            scanned.hosts['facts']['host-b']['checksum'],
+            manifest.checksum(self._file('facts_host-b.json.gz'))
+        )
+
+    def test_scan_plain_and_compressed(self):
+        """Test the first document in sorted order wins."""
+        self._write('facts_host-a.json', {'host': 'z'}, 'gzip')
+        scanned = RunManifest.scan(self.path)
+        self.assertEqual(
+            scanned.hosts['facts']['host-a']['file'],
+            'facts_host-a.json'
+        )
+
+    def test_missing_run_document(self):
+        """Test the plain path of documents the run does not have."""
+        self.assertEqual(
+            RunManifest.scan(self.path).document_path('missing.json'),
+            self._file('missing.json')
+        )
+
+    def test_for_run_without_manifest(self):
+        """Test a run without a manifest file is scanned."""
+        self.assertIsNone(RunManifest.load(self.path))
+        loaded = RunManifest.for_run(self.path)
+        self.assertEqual(
+            loaded.hosts,
+            RunManifest.scan(self.path).hosts
+        )
+
+    def test_for_run_with_manifest(self):
+        """Test the manifest file is used instead of scanning."""
+        saved = RunManifest.scan(self.path, checksums=True)
+        del saved.hosts['facts']['host-b']
+        saved.save()
+        loaded = RunManifest.for_run(self.path)
+        self.assertEqual(loaded.hosts, saved.hosts)
+        self.assertEqual(loaded.files, saved.files)
+        self.assertEqual(
+            [h for h, _ in loaded.host_documents('facts')],
+            ['host-a']
+        )
+
+    def test_for_run_unreadable_manifest(self):
+        """Test an unreadable manifest file falls back to a scan."""
+        with open(self._file(manifest.MANIFEST_FILENAME), 'w') as f:
+            f.write('{not json')
+        loaded = RunManifest.for_run(self.path)
+        self.assertEqual(len(loaded.host_documents('facts')), 2)
+
+    def test_find_host_tuples(self):
+        """Test snitchers read compressed documents through the manifest."""
+        run = runs.Run(self.path)
+        snitcher = BaseSnitcher(None, run)
+        tuples = snitcher._find_host_tuples('facts')
+        self.assertEqual([h for h, _ in tuples], ['host-a', 'host-b'])
+        self.assertEqual(
+            [snitcher._read_document(f) for _, f in tuples],
+            [{'host': 'a'}, {'host': 'b'}]
+        )
+        self.assertEqual(
+            snitcher._read_document(snitcher._document_path('uservars.json')),
+            {'var': 1}
+        )
+        self.assertEqual(snitcher._find_host_tuples('pip_list'), [])
+
+    @unittest.skipIf(documents.zstandard is None, 'zstandard not installed')
+    def test_find_host_tuples_zstd(self):
+        self._write('pip_list_host-c.json', ['pkg'], 'zstd')
+        snitcher = BaseSnitcher(None, runs.Run(self.path))
+        tuples = snitcher._find_host_tuples('pip_list')
+        self.assertEqual(
+            tuples,
+            [('host-c', self._file('pip_list_host-c.json.zst'))]
+        )
+        self.assertEqual(snitcher._read_document(tuples[0][1]), ['pkg'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+import shutil
+import tempfile
+import unittest
+
+from cloud_snitch import generate
+from cloud_snitch import runs
+from cloud_snitch import utils
+from cloud_snitch.backends import MemoryDriver
+from cloud_snitch.models import ConfigfileBlobEntity
+from cloud_snitch.models import EnvironmentEntity
+from cloud_snitch.models import HostEntity
+from cloud_snitch.sync import consume
+
+T1 = 1000
+T2 = 2000
+T3 = 3000
+
+
+class TestMemoryBackend(unittest.TestCase):
+    """Test the primitives through entities on a memory graph."""
+
+    def setUp(self):
+        self.driver = MemoryDriver()
+        self.graph = self.driver.graph
+        self.session = self.driver.session()
+
+    def _env(self):
+        return EnvironmentEntity(account_number='1', name='env')
+
+    def _host(self, hostname, **kwargs):
+        return HostEntity(hostname=hostname, environment='1-env', **kwargs)
+
+    def test_merge_identity(self):
+        """Test identities are created once and static props updated."""
+        self._host('a').update(self.session, T1)
+        host = HostEntity(hostname='b', environment='1-env')
+        host.hostname_environment = 'a-1-env'
+        host.update(self.session, T2)
+        self.assertEqual(
+            self.graph.identities['Host'],
+            {'a-1-env': {
+                'hostname_environment': 'a-1-env',
+                'hostname': 'b',
+                'environment': '1-env',
+                'created_at': T1
+            }}
+        )
+        self.assertIs(self.graph.models['Host'], HostEntity)
+
+    def test_merge_immutable(self):
+        """Test static props of immutable entities are set on create."""
+        ConfigfileBlobEntity(md5='m', contents='').update(self.session, T1)
+        ConfigfileBlobEntity(md5='m', contents='x').update(self.session, T2)
+        self.assertEqual(
+            self.graph.identities['ConfigfileBlob']['m'],
+            {'md5': 'm', 'contents': '', 'created_at': T1}
+        )
+        self.assertNotIn(('ConfigfileBlob', 'm'), self.graph.states)
+
+    def test_roll_state(self):
+        """Test states are rolled only when state properties change."""
+        self._host('a', kernel='4.4').update(self.session, T1)
+        self._host('a', kernel='4.4').update(self.session, T2)
+        self._host('a', kernel='4.15').update(self.session, T3)
+        intervals = self.graph.states[('Host', 'a-1-env')]
+        self.assertEqual(
+            [(i.frm, i.to, i.props) for i in intervals],
+            [
+                (T1, T3, {'kernel': '4.4'}),
+                (T3, utils.EOT, {'kernel': '4.15'})
+            ]
+        )
+        self.assertEqual(self.graph.state_count(), 2)
+
+    def test_roll_state_without_identity(self):
+        """Test no state is created for a missing identity."""
+        backend = self.driver.backend
+        backend.roll_state(None, self._host('a'), {'kernel': '4.4'}, T1)
+        self.assertEqual(self.graph.states, {})
+
+    def test_edges(self):
+        """Test edges are created, closed and created again."""
+        env = self._env()
+        env.update(self.session, T1)
+        a = self._host('a')
+        b = self._host('b')
+        a.update(self.session, T1)
+        b.update(self.session, T1)
+
+        env.hosts.update(self.session, [a, b], T1)
+        env.hosts.update(self.session, [a, b], T2)
+        env.hosts.update(self.session, [a], T2)
+        env.hosts.update(self.session, [a, b], T3)
+
+        key = ('Environment', '1-env', 'HAS_HOST', 'Host')
+        self.assertEqual(self.graph.current[key], set(['a-1-env', 'b-1-env']))
+        dests = self.graph.edges[key]
+        self.assertEqual(
+            [(i.frm, i.to) for i in dests['a-1-env']],
+            [(T1, utils.EOT)]
+        )
+        self.assertEqual(
+            [(i.frm, i.to) for i in dests['b-1-env']],
+            [(T1, T2), (T3, utils.EOT)]
+        )
+        self.assertEqual(self.graph.edge_count(), 3)
+        self.assertEqual(
+            self.graph.outgoing[('Environment', '1-env')],
+            set([key])
+        )
+
+    def test_edges_to_missing_destinations(self):
+        """Test edges are only created between existing identities."""
+        env = self._env()
+        env.update(self.session, T1)
+        env.hosts.update(self.session, [self._host('missing')], T1)
+        key = ('Environment', '1-env', 'HAS_HOST', 'Host')
+        self.assertEqual(self.graph.current.get(key, set()), set())
+        self.assertEqual(self.graph.edge_count(), 0)
+
+        # Closing an edge that was never created does nothing.
+        self.driver.backend.close_edge(None, env.hosts, 'missing', T2)
+        self.assertEqual(self.graph.edge_count(), 0)
+
+        # A missing source creates no edge either.
+        host = self._host('a')
+        host.update(self.session, T1)
+        other = EnvironmentEntity(account_number='2', name='other')
+        other.hosts.update(self.session, [host], T1)
+        self.assertEqual(self.graph.edge_count(), 0)
+
+    def test_times_updated(self):
+        """Test times of states and edges reachable from an entity."""
+        env = self._env()
+        env.update(self.session, T1)
+        host = self._host('a', kernel='4.4')
+        host.update(self.session, T1)
+        env.hosts.update(self.session, [host], T1)
+        self._host('a', kernel='4.15').update(self.session, T3)
+        self._host('b', kernel='4.4').update(self.session, T2)
+
+        backend = self.driver.backend
+        self.assertEqual(backend.times_updated(None, env), [T3, T1])
+        self.assertEqual(backend.times_updated(None, env, limit=1), [T3])
+
+
+class TestConsumeRuns(unittest.TestCase):
+    """Consume generated runs into a memory graph."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        args = generate.parser.parse_args([
+            '--environments', '1',
+            '--hosts', '2',
+            '--runs', '2',
+            '--apt-packages', '3',
+            '--python-packages', '2',
+            '--configfiles', '2',
+            '--configfile-size', '20',
+            '--version-churn', '1',
+            '--content-churn', '1',
+            '--membership-churn', '1',
+            '--output-dir', self.tmpdir
+        ])
+        generate.generate(args)
+        self.runs = runs.find_runs(self.tmpdir)
+        self.driver = MemoryDriver()
+        for run in self.runs:
+            consume(self.driver, run)
+        self.graph = self.driver.graph
+        self.times = [utils.milliseconds(r.completed) for r in self.runs]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_identities(self):
+        """Test the identities of the fleet."""
+        self.assertEqual(len(self.runs), 2)
+        self.assertEqual(self.graph.node_count('Environment'), 1)
+        self.assertGreaterEqual(self.graph.node_count('Host'), 2)
+        env = list(self.graph.identities['Environment'])[0]
+        self.assertEqual(
+            len(self.graph.current[('Environment', env, 'HAS_HOST', 'Host')]),
+            2
+        )
+        for props in self.graph.identities['Host'].values():
+            self.assertIn(props['created_at'], self.times)
+            self.assertEqual(
+                props['hostname_environment'],
+                '-'.join([props['hostname'], props['environment']])
+            )
+        self.assertTrue(self.graph.node_count('ConfigfileBlob'))
+
+    def test_intervals(self):
+        """Test state intervals are contiguous and end in a current state."""
+        rolled = 0
+        for (label, identity), intervals in self.graph.states.items():
+            self.assertIn(identity, self.graph.identities[label])
+            self.assertTrue(intervals[-1].current)
+            for before, after in zip(intervals, intervals[1:]):
+                self.assertEqual(before.to, after.frm)
+            for interval in intervals:
+                self.assertIn(interval.frm, self.times)
+            if len(intervals) > 1:
+                rolled += 1
+        self.assertTrue(rolled)
+
+    def test_edges(self):
+        """Test current edges match the intervals of every edge set."""
+        closed = 0
+        for key, dests in self.graph.edges.items():
+            source_label, source, _, dest_label = key
+            self.assertIn(source, self.graph.identities[source_label])
+            current = set()
+            for dest, intervals in dests.items():
+                self.assertIn(dest, self.graph.identities[dest_label])
+                if intervals[-1].current:
+                    current.add(dest)
+                for interval in intervals:
+                    if not interval.current:
+                        self.assertEqual(interval.to, self.times[1])
+                        closed += 1
+            self.assertEqual(self.graph.current.get(key, set()), current)
+        self.assertTrue(closed)
+
+    def test_times_updated(self):
+        """Test both runs are times the environment was updated."""
+        env_id = self.runs[0].environment_account_number + '-' + \
+            self.runs[0].environment_name
+        env = EnvironmentEntity.find(self.driver.session(), env_id)
+        self.assertEqual(
+            self.driver.backend.times_updated(None, env),
+            sorted(self.times, reverse=True)
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from cloud_snitch import generate
+from cloud_snitch import runs
+from cloud_snitch import sync
+from cloud_snitch.lock import lock_environment
+from cloud_snitch.replay import RecordingDriver
+from cloud_snitch.replay import ReplayDriver
+
+
+class EmptyResult(object):
+
+    def keys(self):
+        return ()
+
+    def __iter__(self):
+        return iter([])
+
+    def summary(self):
+        return None
+
+
+class EmptyTransaction(object):
+    """Transaction of a database without any data."""
+
+    def run(self, statement, parameters=None, **kwparameters):
+        return EmptyResult()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class EmptySession(EmptyTransaction):
+
+    def begin_transaction(self, *args, **kwargs):
+        return EmptyTransaction()
+
+
+class EmptyDriver(object):
+
+    def session(self, *args, **kwargs):
+        return EmptySession()
+
+    def close(self):
+        pass
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        args = generate.parser.parse_args([
+            '--environments', '1',
+            '--hosts', '2',
+            '--runs', '1',
+            '--apt-packages', '3',
+            '--python-packages', '2',
+            '--configfiles', '2',
+            '--configfile-size', '20',
+            '--output-dir', self.tmpdir
+        ])
+        generate.generate(args)
+        self.path = runs.find_runs(self.tmpdir)[0].path
+        self.recording = os.path.join(self.tmpdir, 'recording.json.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _sync(self, driver, replay):
+        run = runs.Run(self.path)
+        with lock_environment(driver, run):
+            sync.sync_run(driver, run, bulk=False, replay=replay)
+
+    def _run_data(self):
+        with open(os.path.join(self.path, 'run_data.json')) as f:
+            return f.read()
+
+    @mock.patch('cloud_snitch.sync.bump_generation')
+    def test_record_then_replay(self, m_bump):
+        """Test that a recorded run replays offline without side effects."""
+        driver = RecordingDriver(EmptyDriver(), self.recording)
+        self._sync(driver, False)
+        driver.close()
+        self.assertEqual(m_bump.call_count, 1)
+        recorded = driver.writer.count
+        run_data = self._run_data()
+        self.assertTrue('synced' in run_data)
+
+        m_bump.reset_mock()
+        driver = ReplayDriver(self.recording, strict=True)
+        self._sync(driver, True)
+        self.assertEqual(driver.hits, recorded)
+        self.assertEqual(driver.misses, 0)
+        m_bump.assert_not_called()
+        self.assertEqual(self._run_data(), run_data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,10 +2,18 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 import datetime
+import gzip
+import hashlib
+import io
 import json
 import os
 import yaml
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 try:
     from ansible.plugins.callback import CallbackBase
 except ImportError:
@@ -20,6 +28,12 @@ conf_file = os.environ.get(
 with open(conf_file, 'r') as f:
     settings = yaml.load(f.read())
 
+# Compression of saved documents. One of none, gzip or zstd.
+# zstd falls back to gzip when the zstandard module is missing.
+COMPRESSION = settings.get('compression') or 'none'
+if COMPRESSION == 'zstd' and zstandard is None:
+    COMPRESSION = 'gzip'
+
 DOCUMENTATION = '''
     callback: snitcher
     short_description: Gathers output from cloud snitch modules
@@ -54,20 +68,40 @@ class FileHandler:
     def _save(self):
         """Save contents of _doc to file.
 
-        Data is encoded as json.
+        Data is encoded as json and optionally compressed. Compressed
+        files get a '.gz' or '.zst' suffix.
+
+        :returns: Manifest entry of the written file
+        :rtype: dict
         """
-        data = json.dumps(self._doc)
-        with open(self._outfile_name, 'w') as f:
+        data = json.dumps(self._doc).encode('utf-8')
+        path = self._outfile_name
+        if COMPRESSION == 'gzip':
+            path += '.gz'
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+                f.write(data)
+            data = buf.getvalue()
+        elif COMPRESSION == 'zstd':
+            path += '.zst'
+            data = zstandard.ZstdCompressor().compress(data)
+        with open(path, 'wb') as f:
             f.write(data)
+        return {
+            'file': os.path.basename(path),
+            'size': len(data),
+            'checksum': hashlib.md5(data).hexdigest()
+        }
 
-    def handle(self, doctype, host, result):
+    def handle(self, doctype, host, result, manifest):
         """Writes payload as json to file.
 
         Stores md5 of json. Used to determine if change
         has occurred.
 
         Filenames will be:
-            <doctype>_<host>.json, <doctype>_<host>.json
+            <doctype>_<host>.json, <doctype>_<host>.json.gz or
+            <doctype>_<host>.json.zst
 
 
         :param doctype: Type of the document.
@@ -76,26 +110,29 @@ class FileHandler:
         :type host: str
         :param result: The output result from ansible task
         :type result: dict
+        :param manifest: Manifest of the run to record the file in
+        :type manifest: dict
         """
         outfile_name = '{}_{}.json'.format(doctype, host)
         self._outfile_name = os.path.join(self.basedir, outfile_name)
         self._doc['host'] = host
         self._doc['data'] = result.get('payload', {})
-        self._save()
+        entry = self._save()
+        manifest['hosts'].setdefault(doctype, {})[host] = entry
 
 
 class SingleFileHandler(FileHandler):
 
     filename_prefix = 'single'
 
-    def handle(self, doctype, host, result):
+    def handle(self, doctype, host, result, manifest):
         """Handles a a single file output from a snitch.
 
         Should only be called on one host. The execution will happen
         on the deployment host.
 
         Stored files will be:
-            <filename_prefix>.json, <filename_prefix>.md5
+            <filename_prefix>.json, optionally with a compression suffix
 
         :param doctype: Type of document
         :type doctype: str
@@ -103,11 +140,13 @@ class SingleFileHandler(FileHandler):
         :type host: str
         :param result: Result of task|action
         :type result: dict
+        :param manifest: Manifest of the run to record the file in
+        :type manifest: dict
         """
         outfile_name = '{}.json'.format(self.filename_prefix)
         self._outfile_name = os.path.join(self.basedir, outfile_name)
         self._doc['data'] = result.get('payload', {})
-        self._save()
+        manifest['files'][outfile_name] = self._save()
 
 
 class GitFileHandler(SingleFileHandler):
@@ -170,7 +209,7 @@ class CallbackModule(CallbackBase):
         if doctype not in TARGET_DOCTYPES:
             return
         handler = DOCTYPE_HANDLERS.get(doctype, FileHandler)
-        handler(self.dirpath).handle(doctype, host, result)
+        handler(self.dirpath).handle(doctype, host, result, self.manifest)
 
     def _run_data_filename(self):
         """Compute filename of run data.
@@ -189,6 +228,12 @@ class CallbackModule(CallbackBase):
         with open(self._run_data_filename(), 'w') as f:
             f.write(json.dumps(data))
 
+    def _write_manifest(self):
+        """Writes the index of documents saved during the run."""
+        filename = os.path.join(self.dirpath, 'manifest.json')
+        with open(filename, 'w') as f:
+            f.write(json.dumps(self.manifest, sort_keys=True))
+
     def _read_run_data(self):
         """Read information about the run
 
@@ -210,6 +255,7 @@ class CallbackModule(CallbackBase):
         # Create the new directory
         if not os.path.exists(self.dirpath):
             os.makedirs(self.dirpath)
+        self.manifest = {'hosts': {}, 'files': {}}
 
         # Saved some stats
         self._write_run_data({
@@ -225,6 +271,9 @@ class CallbackModule(CallbackBase):
         """Used as a on_playbook_end."""
         now = datetime.datetime.utcnow()
 
+        # Index documents before the run is marked finished.
+        self._write_manifest()
+
         # Get saved data
         data = self._read_run_data()
 
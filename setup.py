@@ -26,6 +26,10 @@ entry_points = """
     cloud-snitch-fake=cloud_snitch.fake:main
     cloud-snitch-constraints=cloud_snitch.constraints:main
     cloud-snitch-clean=cloud_snitch.clean:main
+    cloud-snitch-bench=cloud_snitch.bench:main
+    cloud-snitch-generate=cloud_snitch.generate:main
+    cloud-snitch-export=cloud_snitch.export:main
+    cloud-snitch-compact=cloud_snitch.compact:main
 """
 
 setup(
@@ -35,6 +39,7 @@ setup(
     author_email="james.absalon@rackspace.com",
     packages=[
         'cloud_snitch',
+        'cloud_snitch.backends',
         'cloud_snitch.models',
         'cloud_snitch.snitchers'
     ],
@@ -1,14 +1,82 @@
+import json
 import logging
+import zlib
 
 from cloud_snitch.models import registry
+from concurrent.futures import ThreadPoolExecutor
+from django.core.cache import cache
+from neo4jdriver.cache import generation_tag
+from neo4jdriver.connection import get_connection
 from neo4jdriver.query import Query
 
+from .cache import cache_key
+from .exceptions import JobRunningError
+
 logger = logging.getLogger(__name__)
 
 LEFT = 'left'
 RIGHT = 'right'
 BOTH = 'both'
 
+# Number of nodes stored per cache entry of a diff result
+CHUNK_SIZE = 500
+
+# Subtrees of frame nodes at this depth are stored as separate parts
+FRAME_PART_DEPTH = 1
+
+
+def _pack(value):
+    """Compress a json serializable value for the cache.
+
+    :param value: Value to compress
+    :type value: object
+    :returns: Compressed json
+    :rtype: bytes
+    """
+    return zlib.compress(json.dumps(value).encode('utf-8'))
+
+
+def _unpack(data):
+    """Decompress a value packed by _pack.
+
+    :param data: Compressed json
+    :type data: bytes
+    :returns: Decompressed value
+    :rtype: object
+    """
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def _part_key(key, part):
+    """Compute the cache key of a part of a stored diff result.
+
+    :param key: Cache key of the diff
+    :type key: str|bytes
+    :param part: Name of the part
+    :type part: str
+    :returns: Cache key of the part
+    :rtype: str
+    """
+    if isinstance(key, bytes):
+        key = key.decode('ascii')
+    return '{}-{}'.format(key, part)
+
+
+def _rel_name(parent, child):
+    """Get the name of the relationship from a parent to a child model.
+
+    :param parent: Label of the parent model
+    :type parent: str
+    :param child: Label of the child model
+    :type child: str
+    :returns: Name of the relationship or None
+    :rtype: str|None
+    """
+    for relname, childmodel in registry.models[parent].children.values():
+        if childmodel.label == child:
+            return relname
+    return None
+
 
 class Node:
     """Model a node in a graph of the differences."""
@@ -166,6 +234,218 @@ class Node:
         return d
 
 
+def limit_frame(frame, depth):
+    """Limit the depth of a frame.
+
+    Every node of the limited frame carries the number of its children.
+    Children of nodes at the depth limit are left out. Stubs left by
+    split_frame count the children of their part.
+
+    :param frame: Dict representation of structure
+    :type frame: dict|None
+    :param depth: Levels of children to keep. None keeps all levels
+        without child counts.
+    :type depth: int|None
+    :returns: Limited copy of the frame
+    :rtype: dict|None
+    """
+    if frame is None or depth is None:
+        return frame
+    limited = dict(frame)
+    limited.pop('part', None)
+    limited['childcount'] = frame.get('childcount', len(frame['children']))
+    if depth > 0:
+        limited['children'] = [
+            limit_frame(child, depth - 1) for child in frame['children']
+        ]
+    else:
+        limited['children'] = []
+    return limited
+
+
+def find_frame(frame, model, identity):
+    """Find the subtree of a node in a frame.
+
+    :param frame: Dict representation of structure
+    :type frame: dict|None
+    :param model: Name of the model
+    :type model: str
+    :param identity: Id of an object
+    :type identity: str
+    :returns: Dict representation of the subtree or None
+    :rtype: dict|None
+    """
+    stack = [frame] if frame is not None else []
+    while stack:
+        current = stack.pop()
+        if current['model'] == model and current['id'] == identity:
+            return current
+        stack.extend(reversed(current['children']))
+    return None
+
+
+def split_frame(frame, depth=FRAME_PART_DEPTH):
+    """Split a frame into a top and parts holding subtrees.
+
+    Every node at the depth is moved into its own part. The top keeps
+    a stub of the node with the number of the part and the number of
+    its children.
+
+    :param frame: Dict representation of structure
+    :type frame: dict|None
+    :param depth: Depth of the nodes moved into parts
+    :type depth: int
+    :returns: Tuple of (top, list of parts)
+    :rtype: tuple
+    """
+    parts = []
+
+    def _split(current, remaining):
+        if remaining == 0:
+            parts.append(current)
+            stub = dict(current)
+            stub['children'] = []
+            stub['childcount'] = len(current['children'])
+            stub['part'] = len(parts) - 1
+            return stub
+        top = dict(current)
+        top['children'] = [
+            _split(child, remaining - 1) for child in current['children']
+        ]
+        return top
+
+    if frame is None:
+        return None, parts
+    return _split(frame, depth), parts
+
+
+def frame_index(parts):
+    """Index the part holding each node of split frame parts.
+
+    :param parts: Parts from split_frame
+    :type parts: list
+    :returns: Dict of model -> identity -> number of the first part
+        holding the node
+    :rtype: dict
+    """
+    index = {}
+    for number, part in enumerate(parts):
+        stack = [part]
+        while stack:
+            current = stack.pop()
+            index.setdefault(current['model'], {}) \
+                .setdefault(current['id'], number)
+            stack.extend(current['children'])
+    return index
+
+
+def frame_parts(frame, depth=None):
+    """List the parts needed to show a frame to a depth.
+
+    :param frame: Top or part of a split frame
+    :type frame: dict|None
+    :param depth: Levels of children to show. None for all levels.
+    :type depth: int|None
+    :returns: Sorted numbers of parts
+    :rtype: list
+    """
+    needed = []
+    stack = [(frame, depth)] if frame is not None else []
+    while stack:
+        current, remaining = stack.pop()
+        if remaining is not None and remaining <= 0:
+            continue
+        if 'part' in current:
+            needed.append(current['part'])
+            continue
+        for child in current['children']:
+            stack.append((
+                child,
+                None if remaining is None else remaining - 1
+            ))
+    return sorted(needed)
+
+
+def join_frame(frame, parts):
+    """Replace stubs of a split frame by their parts.
+
+    :param frame: Top of a split frame
+    :type frame: dict|None
+    :param parts: Dict of part number -> part. Stubs of other parts
+        are kept.
+    :type parts: dict
+    :returns: Joined copy of the frame
+    :rtype: dict|None
+    """
+    if frame is None:
+        return None
+    if 'part' in frame:
+        return parts.get(frame['part'], frame)
+    joined = dict(frame)
+    joined['children'] = [
+        join_frame(child, parts) for child in frame['children']
+    ]
+    return joined
+
+
+def pack_snapshot(paths, results):
+    """Pack the records of every path of one side for the cache.
+
+    Records of different paths repeat the same ancestors. Every object
+    is stored once per label and rows only hold indexes of objects.
+
+    :param paths: List of paths
+    :type paths: list
+    :param results: List of records for each path
+    :type results: list
+    :returns: Compressed snapshot
+    :rtype: bytes
+    """
+    nodes = {}
+    indexes = {}
+    rows = []
+    for path, records in zip(paths, results):
+        pathrows = []
+        for record in records:
+            row = []
+            for label in path:
+                obj = record[label]
+                identity = obj[registry.identity_property(label)]
+                labelindexes = indexes.setdefault(label, {})
+                if identity not in labelindexes:
+                    labelnodes = nodes.setdefault(label, [])
+                    labelindexes[identity] = len(labelnodes)
+                    labelnodes.append(obj)
+                row.append(labelindexes[identity])
+            pathrows.append(row)
+        rows.append(pathrows)
+    return _pack({'paths': paths, 'nodes': nodes, 'rows': rows})
+
+
+def unpack_snapshot(paths, data):
+    """Unpack records of every path from a snapshot.
+
+    :param paths: List of paths
+    :type paths: list
+    :param data: Compressed snapshot from pack_snapshot
+    :type data: bytes
+    :returns: List of records for each path or None if the snapshot
+        was packed for other paths.
+    :rtype: list|None
+    """
+    snapshot = _unpack(data)
+    if snapshot['paths'] != [list(p) for p in paths]:
+        return None
+    nodes = snapshot['nodes']
+    results = []
+    for path, pathrows in zip(paths, snapshot['rows']):
+        results.append([
+            {label: nodes[label][i] for label, i in zip(path, row)}
+            for row in pathrows
+        ])
+    return results
+
+
 class DiffResult:
     """Convenience class for interfacing with a diffdict."""
     def __init__(self, diffdict):
@@ -201,13 +481,251 @@ class DiffResult:
             return self.diffdict['nodes'][index]
         return None
 
-    def frame(self):
+    def frame(self, depth=None):
         """Get the frame of the diff
 
+        :param depth: Optional number of levels of children to include
+        :type depth: int|None
         :returns: Dict representation of structure or frame
         :rtype: dict
         """
-        return self.diffdict['frame']
+        return limit_frame(self.diffdict['frame'], depth)
+
+    def subtree(self, model, identity, depth=None):
+        """Get the frame of the subtree below a node.
+
+        :param model: Name of the model
+        :type model: str
+        :param identity: Id of an object
+        :type identity: str
+        :param depth: Optional number of levels of children to include
+        :type depth: int|None
+        :returns: Dict representation of the subtree or None
+        :rtype: dict|None
+        """
+        return limit_frame(find_frame(self.frame(), model, identity), depth)
+
+    def nodemap(self):
+        """Get the index of every node by model and id.
+
+        :returns: Dict of model -> identity -> index
+        :rtype: dict
+        """
+        return self.diffdict['nodemap']
+
+    def nodecount(self):
+        """Get the number of nodes in the diff.
+
+        :returns: Number of nodes
+        :rtype: int
+        """
+        return self.diffdict['nodecount']
+
+    def store(self, key, timeout, chunksize=CHUNK_SIZE):
+        """Store the diff in the cache as compressed parts.
+
+        The frame, the nodemap of each model and every chunk of nodes
+        are stored under their own key. The frame is split by
+        split_frame, with an index of the part holding each node. The
+        returned header describes the parts and should be stored under
+        key last, once all parts are in place.
+
+        Nodes are grouped by model in the diffdict, so the nodemap of
+        a model is stored as the index of its first node followed by
+        the identities in index order.
+
+        :param key: Cache key of the diff
+        :type key: str|bytes
+        :param timeout: Cache timeout in seconds
+        :type timeout: int
+        :param chunksize: Number of nodes per chunk
+        :type chunksize: int
+        :returns: Header of the stored diff
+        :rtype: dict
+        """
+        top, frameparts = split_frame(self.frame())
+        parts = {
+            _part_key(key, 'frame'): _pack(top),
+            _part_key(key, 'frameindex'): _pack(frame_index(frameparts))
+        }
+        for number, part in enumerate(frameparts):
+            parts[_part_key(key, 'frame-{}'.format(number))] = _pack(part)
+
+        models = []
+        for model, modelmap in self.nodemap().items():
+            identities = sorted(modelmap, key=lambda i: modelmap[i])
+            start = modelmap[identities[0]]
+            parts[_part_key(key, 'nodemap-{}'.format(model))] = _pack(
+                [start, identities]
+            )
+            models.append(model)
+
+        nodes = self.diffdict['nodes']
+        for index in range(0, len(nodes), chunksize):
+            parts[_part_key(key, 'chunk-{}'.format(index // chunksize))] = \
+                _pack(nodes[index:index + chunksize])
+
+        cache.set_many(parts, timeout)
+        return {
+            'nodecount': self.nodecount(),
+            'chunksize': chunksize,
+            'models': models
+        }
+
+
+class ChunkedDiffResult(DiffResult):
+    """Diff result read part by part from the cache.
+
+    Only the parts needed to answer a call are fetched. A missing part
+    means the cache evicted it. The diff is then scheduled again by
+    dropping its header.
+    """
+    def __init__(self, key, header):
+        """Init the ChunkedDiffResult
+
+        :param key: Cache key of the diff
+        :type key: str|bytes
+        :param header: Header returned by DiffResult.store
+        :type header: dict
+        """
+        self.key = key
+        self.header = header
+
+    def _parts(self, parts):
+        """Fetch and decompress parts of the diff.
+
+        :param parts: Names of the parts
+        :type parts: list
+        :returns: Values of the parts in order
+        :rtype: list
+        """
+        keys = [_part_key(self.key, part) for part in parts]
+        found = cache.get_many(keys)
+        if len(found) < len(keys):
+            logger.debug("Diff parts missing from cache.")
+            cache.delete(self.key)
+            raise JobRunningError()
+        return [_unpack(found[key]) for key in keys]
+
+    def getnodes(self, offset, limit):
+        """Get up to limit nodes starting at offset.
+
+        :param offset: Where to start
+        :type offset: int
+        :param limit: Maximum number of nodes to retrieve
+        :type limit: int
+        """
+        end = min(offset + limit, self.nodecount())
+        if offset >= end:
+            return []
+        chunksize = self.header['chunksize']
+        first = offset // chunksize
+        last = (end - 1) // chunksize
+        nodes = []
+        chunks = self._parts([
+            'chunk-{}'.format(i) for i in range(first, last + 1)
+        ])
+        for chunk in chunks:
+            nodes.extend(chunk)
+        start = offset - first * chunksize
+        return nodes[start:start + (end - offset)]
+
+    def getnode(self, model, identity):
+        """Get a specific node identified by model and id.
+
+        :param model: Name of the model
+        :type model: str
+        :param identity: Id of an object
+        :type identity: str
+        :returns: Dict representation of node or None
+        :rtype: dict|None
+        """
+        if model not in self.header['models']:
+            return None
+        start, identities = self._parts(['nodemap-{}'.format(model)])[0]
+        try:
+            index = start + identities.index(identity)
+        except ValueError:
+            return None
+        chunksize = self.header['chunksize']
+        chunk = self._parts(['chunk-{}'.format(index // chunksize)])[0]
+        return chunk[index % chunksize]
+
+    def frame(self, depth=None):
+        """Get the frame of the diff
+
+        :param depth: Optional number of levels of children to include
+        :type depth: int|None
+        :returns: Dict representation of structure or frame
+        :rtype: dict
+        """
+        return self._expand(self._parts(['frame'])[0], depth)
+
+    def _expand(self, frame, depth):
+        """Join the parts of a frame needed to show it to a depth.
+
+        :param frame: Top or part of a split frame
+        :type frame: dict|None
+        :param depth: Levels of children to include. None for all.
+        :type depth: int|None
+        :returns: Depth limited frame
+        :rtype: dict|None
+        """
+        needed = frame_parts(frame, depth)
+        parts = self._parts(['frame-{}'.format(i) for i in needed])
+        return limit_frame(join_frame(frame, dict(zip(needed, parts))), depth)
+
+    def subtree(self, model, identity, depth=None):
+        """Get the frame of the subtree below a node.
+
+        Nodes below the top of the frame are read from the one part
+        holding them.
+
+        :param model: Name of the model
+        :type model: str
+        :param identity: Id of an object
+        :type identity: str
+        :param depth: Optional number of levels of children to include
+        :type depth: int|None
+        :returns: Dict representation of the subtree or None
+        :rtype: dict|None
+        """
+        found = find_frame(self._parts(['frame'])[0], model, identity)
+        if found is not None and 'part' not in found:
+            return self._expand(found, depth)
+
+        if found is not None:
+            number = found['part']
+        else:
+            index = self._parts(['frameindex'])[0]
+            number = index.get(model, {}).get(identity)
+            if number is None:
+                return None
+        part = self._parts(['frame-{}'.format(number)])[0]
+        return limit_frame(find_frame(part, model, identity), depth)
+
+    def nodemap(self):
+        """Get the index of every node by model and id.
+
+        :returns: Dict of model -> identity -> index
+        :rtype: dict
+        """
+        models = self.header['models']
+        nodemap = {}
+        parts = self._parts(['nodemap-{}'.format(m) for m in models])
+        for model, (start, identities) in zip(models, parts):
+            nodemap[model] = {
+                identity: start + i for i, identity in enumerate(identities)
+            }
+        return nodemap
+
+    def nodecount(self):
+        """Get the number of nodes in the diff.
+
+        :returns: Number of nodes
+        :rtype: int
+        """
+        return self.header['nodecount']
 
 
 class Diff:
@@ -215,6 +733,12 @@ class Diff:
 
     pagesize = 1000
 
+    # Maximum number of concurrent path queries
+    workers = 8
+
+    # Seconds to keep the records of one side in the cache
+    snapshot_timeout = 60 * 60 * 24
+
     def __init__(self, model, identity, left_time, right_time):
         """Init the diff
 
@@ -233,11 +757,8 @@ class Diff:
         self.left_time = left_time
         self.right_time = right_time
 
-        # Feed data from the left
-        self.feedleft()
-
-        # Feed data from the right
-        self.feedright()
+        # Feed data from both sides
+        self.feedall()
 
         # Move unchanged properties to both
         self.clean()
@@ -262,15 +783,21 @@ class Diff:
         node = nodemap.setdefault(identity, Node(identity, model))
         return node
 
-    def feedpath(self, path, time, side):
-        """Feed all of a path from a side to the diff.
+    def fetchpath(self, path, time, within=None):
+        """Fetch all records of a path at a time.
+
+        Safe to call from several threads. Only the query runs here, the
+        records are merged into the diff by mergepath.
 
         :param path: List of models indicating path through data to a model
         :type path: list
         :param time: Integer milliseconds since epoch
         :type time: int
-        :param side: Which side to feed the diff from.
-        :type side: str
+        :param within: Optional tuple of (label, identities) limiting
+            records to those passing through the identified nodes.
+        :type within: tuple|None
+        :returns: List of records
+        :rtype: list
         """
         # Build query
         q = Query(path[-1]) \
@@ -279,28 +806,75 @@ class Diff:
                 '=',
                 self.identity, self.model
             ).time(time)
+        if within is not None:
+            label, identities = within
+            q.filter(
+                registry.identity_property(label),
+                'IN',
+                list(identities),
+                label
+            )
 
-        # Start at page 1 and page through all results.
-        page = 1
-        records = q.page(page, self.pagesize)
-        while (records):
-            for record in records:
-                parent = None
-                for label in path:
-                    # Update diff with results
-                    node = self.getnode(label, record[label])
-                    node.update(record[label], side)
+        # Page through all results. Sides are cached as snapshots, so
+        # pages are not cached again.
+        records = []
+        for page in q.pages(self.pagesize, use_cache=False):
+            records.extend(page)
+        return records
+
+    def mergepath(self, path, records, side):
+        """Merge records of a path from a side into the diff.
+
+        :param path: List of models indicating path through data to a model
+        :type path: list
+        :param records: Records fetched by fetchpath
+        :type records: list
+        :param side: Which side the records are from.
+        :type side: str
+        """
+        for record in records:
+            parent = None
+            for label in path:
+                # Update diff with results
+                node = self.getnode(label, record[label])
+                node.update(record[label], side)
+
+                # Make parent -> child relationship
+                if parent is not None:
+                    parent.add_child(label, node, side)
+                    node.parents.add(parent)
+
+                # Advance parent for next part of path.
+                parent = node
+
+    def feedpath(self, path, time, side):
+        """Feed all of a path from a side to the diff.
+
+        :param path: List of models indicating path through data to a model
+        :type path: list
+        :param time: Integer milliseconds since epoch
+        :type time: int
+        :param side: Which side to feed the diff from.
+        :type side: str
+        """
+        self.mergepath(path, self.fetchpath(path, time), side)
 
-                    # Make parent -> child relationship
-                    if parent is not None:
-                        parent.add_child(label, node, side)
-                        node.parents.add(parent)
+    def paths(self):
+        """Get every path from the diffed model.
 
-                    # Advance parent for next part of path.
-                    parent = node
+        Besides the paths to the leaves, every path ending at an inner
+        model is included. Nodes without any leaf below them at a time
+        are still read.
 
-            page += 1
-            records = q.page(page, self.pagesize)
+        :returns: List of paths
+        :rtype: list
+        """
+        paths = []
+        for path in registry.paths_from(self.model):
+            for i in range(1, len(path) + 1):
+                if path[:i] not in paths:
+                    paths.append(path[:i])
+        return paths
 
     def feed(self, time, side):
         """Feed all paths from a side to the diff.
@@ -309,10 +883,99 @@ class Diff:
         :type side: Which side to feed from
         """
         # Iterarate over every path.
-        paths = registry.forest.paths_from(self.model)
+        paths = self.paths()
         for p in paths:
             self.feedpath(p, time, side)
 
+    def snapshot_key(self, time):
+        """Compute the cache key of the records of one side.
+
+        The key includes the generation of the time, so snapshots are
+        replaced after syncs and compaction like cached queries.
+
+        :param time: Integer milliseconds since epoch
+        :type time: int
+        :returns: Cache key or None if the generation is unknown
+        :rtype: bytes|None
+        """
+        generation = generation_tag(time)
+        if generation is None:
+            return None
+        return cache_key(
+            (self.model, self.identity, time, generation),
+            {},
+            prefix='diffsnapshot'
+        )
+
+    def loadsnapshot(self, paths, key):
+        """Load the records of one side from the cache.
+
+        :param paths: List of paths
+        :type paths: list
+        :param key: Cache key of the side
+        :type key: bytes|None
+        :returns: List of records for each path or None
+        :rtype: list|None
+        """
+        if key is None:
+            return None
+        data = cache.get(key)
+        if data is None:
+            return None
+        logger.debug("Reusing snapshot {}".format(key))
+        return unpack_snapshot(paths, data)
+
+    def feedall(self):
+        """Feed all paths from both sides to the diff.
+
+        Records of a side are reused from the cache when a previous
+        diff loaded the same side. Paths of missing sides are fetched
+        concurrently on a bounded pool of threads. Records are merged
+        by the calling thread, in the same order as feeding the left
+        side and then the right side.
+        """
+        paths = self.paths()
+        sides = [(self.left_time, LEFT), (self.right_time, RIGHT)]
+
+        snapshots = {}
+        keys = {}
+        missing = []
+        for time, _ in sides:
+            if time in snapshots:
+                continue
+            keys[time] = self.snapshot_key(time)
+            snapshots[time] = self.loadsnapshot(paths, keys[time])
+            if snapshots[time] is None:
+                missing.append(time)
+
+        if missing:
+            jobs = [(p, time) for time in missing for p in paths]
+
+            # Create the shared driver before threads ask for it.
+            get_connection()
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [
+                    executor.submit(self.fetchpath, path, time)
+                    for path, time in jobs
+                ]
+                for time in missing:
+                    snapshots[time] = []
+                for (_, time), future in zip(jobs, futures):
+                    snapshots[time].append(future.result())
+
+            for time in missing:
+                if keys[time] is None:
+                    continue
+                cache.set(
+                    keys[time],
+                    pack_snapshot(paths, snapshots[time]),
+                    self.snapshot_timeout
+                )
+
+        for time, side in sides:
+            for path, records in zip(paths, snapshots[time]):
+                self.mergepath(path, records, side)
+
     def feedleft(self):
         """Feed data from the left side."""
         self.feed(self.left_time, LEFT)
@@ -388,3 +1051,177 @@ class Diff:
 
         diffdict['nodecount'] = len(diffdict['nodes'])
         return DiffResult(diffdict)
+
+
+class IntervalDiff(Diff):
+    """Diff reading only what changed between the two times.
+
+    Instead of reading the whole tree at both times, nodes whose
+    relationship to their parent or whose state started or ended between
+    the times are found through the from and to properties. Only those
+    nodes and their ancestors are read at both times. Nodes that exist
+    on one side only bring their subtree from that side. The result has
+    the same structure as the result of Diff.
+    """
+
+    def candidates_query(self, path, state):
+        """Build the query finding nodes changed between the times.
+
+        :param path: List of models from the diffed model to a model
+        :type path: list
+        :param state: Look for changed states instead of changed
+            relationships to the parent.
+        :type state: bool
+        :returns: Cypher query returning identities
+        :rtype: str
+        """
+        label = path[-1]
+        if state:
+            changed = '(x:{})-[r:HAS_STATE]->()'.format(label)
+            anchor = 'x'
+            ancestors = path
+        else:
+            changed = '(p:{})-[r:{}]->(x:{})'.format(
+                path[-2],
+                _rel_name(path[-2], label),
+                label
+            )
+            anchor = 'p'
+            ancestors = path[:-1]
+
+        model_id = registry.identity_property(self.model)
+        cypher = 'MATCH {} \nWHERE ($t1 < r.from <= $t2 OR ' \
+            '$t1 < r.to <= $t2)'.format(changed)
+
+        # Limit to descendants of the diffed node.
+        if len(ancestors) == 1:
+            cypher += ' AND {}.{} = $identity'.format(anchor, model_id)
+        else:
+            pattern = '(root:{})'.format(ancestors[0])
+            for parent, child in zip(ancestors, ancestors[1:-1]):
+                pattern += '-[:{}]->(:{})'.format(
+                    _rel_name(parent, child),
+                    child
+                )
+            pattern += '-[:{}]->({})'.format(
+                _rel_name(ancestors[-2], ancestors[-1]),
+                anchor
+            )
+            cypher += ' \nMATCH {} \nWHERE root.{} = $identity'.format(
+                pattern,
+                model_id
+            )
+
+        cypher += ' \nRETURN DISTINCT x.{} AS identity'.format(
+            registry.identity_property(label)
+        )
+        return cypher
+
+    def fetchcandidates(self, path, state):
+        """Find identities of nodes changed between the times.
+
+        :param path: List of models from the diffed model to a model
+        :type path: list
+        :param state: Look for changed states instead of changed
+            relationships to the parent.
+        :type state: bool
+        :returns: List of identities
+        :rtype: list
+        """
+        cypher = self.candidates_query(path, state)
+        logger.debug("Running query:\n{}".format(cypher))
+        params = {
+            'identity': self.identity,
+            't1': min(self.left_time, self.right_time),
+            't2': max(self.left_time, self.right_time)
+        }
+        with get_connection().session() as session:
+            with session.begin_transaction() as tx:
+                return [r['identity'] for r in tx.run(cypher, **params)]
+
+    def onesided(self, label, identities, side):
+        """Filter identities of nodes that exist on one side only.
+
+        :param label: Label of the nodes
+        :type label: str
+        :param identities: Identities of nodes
+        :type identities: iterable
+        :param side: Side the nodes should only exist on
+        :type side: str
+        :returns: Sorted list of identities
+        :rtype: list
+        """
+        nodemap = self.nodes.get(label, {})
+        result = []
+        for identity in identities:
+            node = nodemap.get(identity)
+            if node is None:
+                continue
+            if side == LEFT:
+                present, absent = node.left_props, node.right_props
+            else:
+                present, absent = node.right_props, node.left_props
+            if present and not absent:
+                result.append(identity)
+        return sorted(result)
+
+    def feedall(self):
+        """Feed changed nodes from both sides to the diff."""
+        self.nodes.setdefault(self.model, {})
+        paths = self.paths()
+        sides = ((self.left_time, LEFT), (self.right_time, RIGHT))
+
+        # Path from the diffed model to every model below it
+        prefixes = {}
+        for path in paths:
+            for i in range(len(path)):
+                prefixes.setdefault(path[i], path[:i + 1])
+
+        jobs = []
+        for label, path in prefixes.items():
+            if len(path) > 1:
+                jobs.append((path, False))
+            if registry.has_state(label):
+                jobs.append((path, True))
+
+        # Create the shared driver before threads ask for it.
+        get_connection()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # Find nodes with a changed relationship or state.
+            futures = [
+                (path[-1], executor.submit(self.fetchcandidates, path, state))
+                for path, state in jobs
+            ]
+            candidates = {}
+            for label, future in futures:
+                identities = future.result()
+                if identities:
+                    candidates.setdefault(label, set()).update(identities)
+
+            # Read changed nodes and their ancestors on both sides.
+            futures = []
+            for label, identities in candidates.items():
+                path = prefixes[label]
+                within = (label, sorted(identities))
+                for time, side in sides:
+                    futures.append((path, side, executor.submit(
+                        self.fetchpath, path, time, within
+                    )))
+            for path, side, future in futures:
+                self.mergepath(path, future.result(), side)
+
+            # Read subtrees of nodes that exist on one side only.
+            futures = []
+            for label, identities in candidates.items():
+                for time, side in sides:
+                    onesided = self.onesided(label, identities, side)
+                    if not onesided:
+                        continue
+                    for path in paths:
+                        if label not in path[:-1]:
+                            continue
+                        futures.append((path, side, executor.submit(
+                            self.fetchpath, path, time, (label, onesided)
+                        )))
+            for path, side, future in futures:
+                self.mergepath(path, future.result(), side)
@@ -30,8 +30,7 @@ class TimesQuery:
         logger.debug("Running query:\n{}".format(str(q)))
         with get_connection().session() as session:
             with session.begin_transaction() as tx:
-                resp = tx.run(q, **self.params)
-                return resp
+                return list(tx.run(q, **self.params))
 
     def fetch(self):
         times = [record['t'] for record in self._fetch()]
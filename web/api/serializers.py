@@ -1,7 +1,11 @@
 import logging
 
 from cloud_snitch.models import registry
+from neo4jdriver.exceptions import InvalidCursorError
+from neo4jdriver.fields import ModelChoiceField
+from neo4jdriver.query import decode_cursor
 from rest_framework.serializers import BaseSerializer
+from rest_framework.serializers import BooleanField
 from rest_framework.serializers import Serializer
 from rest_framework.serializers import ChoiceField
 from rest_framework.serializers import CharField
@@ -55,7 +59,7 @@ class PropertySerializer(BaseSerializer):
 
 class FilterSerializer(Serializer):
     """Serializer for filters on a query"""
-    model = ChoiceField([m.label for m in registry.models.values()])
+    model = ModelChoiceField()
     prop = SlugField(max_length=256, required=True)
     operator = ChoiceField(_operators, required=True)
     value = CharField(max_length=256, required=True)
@@ -63,14 +67,14 @@ class FilterSerializer(Serializer):
 
 class OrderSerializer(Serializer):
     """Serializer for order by on a query."""
-    model = ChoiceField([m.label for m in registry.models.values()])
+    model = ModelChoiceField()
     prop = SlugField(max_length=256, required=True)
     direction = ChoiceField(['asc', 'desc'])
 
 
 class SearchSerializer(Serializer):
     """Serializer for search queries."""
-    model = ChoiceField([m.label for m in registry.models.values()])
+    model = ModelChoiceField()
     time = IntegerField(min_value=0, required=False)
     identity = CharField(max_length=256, required=False)
     filters = ListField(child=FilterSerializer(), required=False)
@@ -80,6 +84,20 @@ class SearchSerializer(Serializer):
     pagesize = IntegerField(min_value=1, required=False, default=500)
     index = IntegerField(min_value=0, required=False)
 
+    # Estimate the count of unfiltered searches from label statistics.
+    estimate = BooleanField(required=False, default=False)
+
+    # Continuation token. Blank for the first page.
+    cursor = CharField(max_length=4096, required=False, allow_blank=True)
+
+    def validate_cursor(self, value):
+        if value:
+            try:
+                decode_cursor(value)
+            except InvalidCursorError as e:
+                raise ValidationError(str(e))
+        return value
+
     def validate(self, data):
         model_set = set([t[0] for t in registry.path(data['model'])])
         model_set.add(data['model'])
@@ -93,7 +111,7 @@ class SearchSerializer(Serializer):
                 )
 
             # Make sure filter property is property of filter model
-            if f['prop'] not in registry.properties(f['model']):
+            if not registry.has_property(f['model'], f['prop']):
                 raise ValidationError(
                     'Model {} does not have property {}'.format(
                         f['model'],
@@ -110,7 +128,7 @@ class SearchSerializer(Serializer):
                 )
 
             # Make sure order property is property of order model
-            if o['prop'] not in registry.properties(o['model']):
+            if not registry.has_property(o['model'], o['prop']):
                 raise ValidationError(
                     'Model {} does not have property {}'.format(
                         o['model'],
@@ -123,22 +141,52 @@ class SearchSerializer(Serializer):
 
 class TimesChangedSerializer(Serializer):
     """Serializer for detailed query of one object."""
-    model = ChoiceField([m.label for m in registry.models.values()])
+    model = ModelChoiceField()
     identity = CharField(max_length=256, required=True)
     time = IntegerField(min_value=0, required=False)
 
 
+class BlobSerializer(Serializer):
+    """Serializer for fetching a blob property of one object."""
+    model = ModelChoiceField()
+    identity = CharField(max_length=256, required=True)
+    prop = SlugField(max_length=256, required=True)
+    time = IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if data['prop'] not in registry.blob_properties(data['model']):
+            raise ValidationError(
+                'Model {} does not have blob property {}'.format(
+                    data['model'],
+                    data['prop']
+                )
+            )
+        return data
+
+
 class DiffSerializer(Serializer):
     """Serializer for requesting diff structure."""
-    model = ChoiceField([m.label for m in registry.models.values()])
+    model = ModelChoiceField()
     identity = CharField(max_length=256, required=True)
     left_time = IntegerField(min_value=0, required=True)
     right_time = IntegerField(min_value=0, required=True)
+    depth = IntegerField(min_value=0, required=False)
+
+
+class DiffSubtreeSerializer(Serializer):
+    """Serializer for requesting the structure below a node."""
+    model = ModelChoiceField()
+    identity = CharField(max_length=256, required=True)
+    left_time = IntegerField(min_value=0, required=True)
+    right_time = IntegerField(min_value=0, required=True)
+    node_model = ModelChoiceField()
+    node_identity = CharField(max_length=256, required=True)
+    depth = IntegerField(min_value=0, required=False)
 
 
 class DiffNodesSerializer(Serializer):
     """Serializer for requesting a range of nodes from an offset."""
-    model = ChoiceField([m.label for m in registry.models.values()])
+    model = ModelChoiceField()
     identity = CharField(max_length=256, required=True)
     left_time = IntegerField(min_value=0, required=True)
     right_time = IntegerField(min_value=0, required=True)
@@ -148,9 +196,9 @@ class DiffNodesSerializer(Serializer):
 
 class DiffNodeSerializer(Serializer):
     """Serializer for requesting a specific node."""
-    model = ChoiceField([m.label for m in registry.models.values()])
+    model = ModelChoiceField()
     identity = CharField(max_length=256, required=True)
     left_time = IntegerField(min_value=0, required=True)
     right_time = IntegerField(min_value=0, required=True)
-    node_model = ChoiceField([m.label for m in registry.models.values()])
+    node_model = ModelChoiceField()
     node_identity = CharField(max_length=256, required=True)
@@ -5,11 +5,13 @@ import logging
 from celery import shared_task
 from celery.exceptions import TimeoutError as CeleryTimeoutError
 
+from django.conf import settings
 from django.core.cache import cache
 
 from .cache import cache_key
+from .diff import ChunkedDiffResult
 from .diff import Diff
-from .diff import DiffResult
+from .diff import IntervalDiff
 
 from .exceptions import JobError
 from .exceptions import JobRunningError
@@ -21,6 +23,20 @@ STATUS_ERROR = 2
 TIMEOUT = 60 * 60 * 24
 ERROR_TIMEOUT = 60 * 5
 
+ENGINES = {
+    'snapshot': Diff,
+    'interval': IntervalDiff
+}
+
+
+def _diff_engine():
+    """Get the diff class selected by settings.
+
+    :returns: Diff class
+    :rtype: type
+    """
+    return ENGINES.get(getattr(settings, 'DIFF_ENGINE', 'snapshot'), Diff)
+
 
 def _diff_cache_key(model, identity, left_time, right_time):
     """Convenience method for computing cache key for a diff operation.
@@ -39,7 +55,7 @@ def _diff_cache_key(model, identity, left_time, right_time):
     key = cache_key(
         (model, identity, left_time, right_time),
         {},
-        prefix='diffdict'
+        prefix='diffchunks'
     )
     return key
 
@@ -56,8 +72,8 @@ def _diffdict(model, identity, left_time, right_time):
     :type left_time: int
     :param right_time: Milliseconds since epoch on right side
     :type right_time: int
-    :returns: Result of diff operation
-    :rtype: DiffResult
+    :returns: Header of the diff stored in the cache
+    :rtype: dict
     """
     # Mark the diff as running to prevent multiple requests from sechduling
     # the same job.
@@ -65,10 +81,10 @@ def _diffdict(model, identity, left_time, right_time):
 
     # Compute the diff.
     try:
-        d = Diff(model, identity, left_time, right_time)
-        r = d.result()
-        cache.set(key, r.diffdict, TIMEOUT)
-        return r.diffdict
+        d = _diff_engine()(model, identity, left_time, right_time)
+        header = d.result().store(key, TIMEOUT)
+        cache.set(key, header, TIMEOUT)
+        return header
     except Exception as e:
         logger.exception('Unable to complete diff.')
         cache.set(key, STATUS_ERROR, ERROR_TIMEOUT)
@@ -86,7 +102,7 @@ def objectdiff(model, identity, left_time, right_time):
     :param right_time: Milliseconds since epoch on right side
     :type right_time: int
     :returns: Result of cached diff operation
-    :rtype: diff.DiffResult
+    :rtype: diff.ChunkedDiffResult
     """
     # Try to get from cache first
     key = _diff_cache_key(model, identity, left_time, right_time)
@@ -104,8 +120,10 @@ def objectdiff(model, identity, left_time, right_time):
             task = _diffdict.delay(model, identity, left_time, right_time)
 
             # Wait an initial amount of time
-            data = task.get(timeout=2)
-            return DiffResult(data)
+            header = task.get(timeout=2)
+            if header is None:
+                raise JobError()
+            return ChunkedDiffResult(key, header)
         except CeleryTimeoutError:
             logger.debug("Try looking later.")
             raise JobRunningError()
@@ -123,4 +141,4 @@ def objectdiff(model, identity, left_time, right_time):
     # Return diff result
     else:
         logger.debug("CACHE HIT")
-        return DiffResult(cached)
+        return ChunkedDiffResult(key, cached)
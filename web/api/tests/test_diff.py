@@ -1,6 +1,26 @@
+import mock
+
+from django.core.cache import cache
+from django.test import override_settings
 from django.test import tag, TestCase
 
+from api.diff import ChunkedDiffResult
+from api.diff import Diff
+from api.diff import DiffResult
+from api.diff import find_frame
+from api.diff import IntervalDiff
+from api.diff import limit_frame
 from api.diff import Node
+from api.diff import pack_snapshot
+from api.diff import unpack_snapshot
+from api.exceptions import JobRunningError
+
+LOCMEM = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'diffchunks'
+    }
+}
 
 
 class TestNode(TestCase):
@@ -110,3 +130,645 @@ class TestNode(TestCase):
         d = {'prop1': 'val1', 'prop2': 'val2'}
         n.update(d, 'right')
         self.assertDictEqual(d, n.right_props)
+
+
+class TestDiff(TestCase):
+
+    def _fetchpath(self, path, time):
+        """Fake records of an environment with one host per time."""
+        env = {'account_number_name': 'env'}
+        records = []
+        for hostname in {1: ['a', 'b'], 2: ['b', 'c'], 3: ['c']}[time]:
+            record = {'Environment': env}
+            if path[-1] == 'Host':
+                record['Host'] = {
+                    'hostname_environment': hostname,
+                    'hostname': hostname
+                }
+            records.append(record)
+        return records
+
+    @tag('unit')
+    @mock.patch('api.diff.get_connection')
+    @mock.patch(
+        'api.diff.registry.paths_from',
+        return_value=[['Environment', 'Host'], ['Environment']]
+    )
+    def test_feedall(self, m_paths, m_connection):
+        """Test that both sides of every path are fetched and merged."""
+        with mock.patch.object(
+            Diff,
+            'fetchpath',
+            autospec=True,
+            side_effect=lambda d, p, t: self._fetchpath(p, t)
+        ) as m_fetch:
+            d = Diff('Environment', 'env', 1, 2)
+        self.assertEquals(m_fetch.call_count, 4)
+
+        env = d.nodes['Environment']['env']
+        self.assertEquals(env.children['Host']['a']['side'], 'left')
+        self.assertEquals(env.children['Host']['c']['side'], 'right')
+        self.assertFalse('b' in env.children['Host'])
+        self.assertEquals(sorted(d.nodes['Host']), ['a', 'c'])
+
+    @tag('unit')
+    @override_settings(CACHES=LOCMEM)
+    @mock.patch('api.diff.get_connection')
+    @mock.patch(
+        'api.diff.registry.paths_from',
+        return_value=[['Environment', 'Host'], ['Environment']]
+    )
+    def test_snapshots(self, m_paths, m_connection):
+        """Test that a side loaded by a previous diff is reused."""
+        cache.clear()
+        with mock.patch.object(
+            Diff,
+            'fetchpath',
+            autospec=True,
+            side_effect=lambda d, p, t: self._fetchpath(p, t)
+        ) as m_fetch:
+            Diff('Environment', 'env', 1, 2)
+            self.assertEquals(m_fetch.call_count, 4)
+
+            m_fetch.reset_mock()
+            d = Diff('Environment', 'env', 2, 3)
+            self.assertEquals(
+                [c[0][2] for c in m_fetch.call_args_list],
+                [3, 3]
+            )
+
+            m_fetch.reset_mock()
+            Diff('Environment', 'env', 3, 3)
+            self.assertEquals(m_fetch.call_count, 0)
+
+        env = d.nodes['Environment']['env']
+        self.assertEquals(env.children['Host']['b']['side'], 'left')
+        self.assertEquals(sorted(d.nodes['Host']), ['b'])
+
+    @tag('unit')
+    @override_settings(CACHES=LOCMEM)
+    @mock.patch('api.diff.get_connection')
+    @mock.patch(
+        'api.diff.registry.paths_from',
+        return_value=[['Environment', 'Host'], ['Environment']]
+    )
+    def test_snapshots_generation(self, m_paths, m_connection):
+        """Test that snapshots are replaced in a new generation."""
+        cache.clear()
+        with mock.patch.object(
+            Diff,
+            'fetchpath',
+            autospec=True,
+            side_effect=lambda d, p, t: self._fetchpath(p, t)
+        ) as m_fetch:
+            with mock.patch('api.diff.generation_tag', return_value=1):
+                Diff('Environment', 'env', 1, 2)
+            m_fetch.reset_mock()
+            with mock.patch('api.diff.generation_tag', return_value=2):
+                Diff('Environment', 'env', 1, 2)
+            self.assertEquals(m_fetch.call_count, 4)
+
+            m_fetch.reset_mock()
+            with mock.patch('api.diff.generation_tag', return_value=None):
+                Diff('Environment', 'env', 1, 2)
+                Diff('Environment', 'env', 1, 2)
+            self.assertEquals(m_fetch.call_count, 8)
+
+    @tag('unit')
+    @mock.patch(
+        'api.diff.registry.identity_property',
+        side_effect=lambda label: {
+            'Environment': 'account_number_name',
+            'Host': 'hostname_environment'
+        }[label]
+    )
+    def test_pack_snapshot(self, m_identity):
+        """Test that snapshots round trip and check their paths."""
+        paths = [['Environment', 'Host'], ['Environment']]
+        results = [self._fetchpath(p, 1) for p in paths]
+        data = pack_snapshot(paths, results)
+        self.assertEquals(unpack_snapshot(paths, data), results)
+        self.assertTrue(unpack_snapshot([['Environment']], data) is None)
+
+
+class TestIntervalDiff(TestCase):
+
+    @tag('unit')
+    def test_candidates_query_relationship(self):
+        """Test finding children with changed relationships."""
+        d = IntervalDiff.__new__(IntervalDiff)
+        d.model = 'Environment'
+        cypher = d.candidates_query(['Environment', 'Host'], False)
+        self.assertTrue(
+            cypher.startswith('MATCH (p:Environment)-[r:HAS_HOST]->(x:Host)')
+        )
+        self.assertTrue('$t1 < r.from <= $t2' in cypher)
+        self.assertTrue('$t1 < r.to <= $t2' in cypher)
+        self.assertTrue('p.account_number_name = $identity' in cypher)
+        self.assertTrue(cypher.endswith(
+            'RETURN DISTINCT x.hostname_environment AS identity'
+        ))
+
+    @tag('unit')
+    def test_candidates_query_state(self):
+        """Test finding descendants with changed state."""
+        d = IntervalDiff.__new__(IntervalDiff)
+        d.model = 'Environment'
+        cypher = d.candidates_query(['Environment', 'Host'], True)
+        self.assertTrue(
+            cypher.startswith('MATCH (x:Host)-[r:HAS_STATE]->()')
+        )
+        self.assertTrue(
+            'MATCH (root:Environment)-[:HAS_HOST]->(x) \n'
+            'WHERE root.account_number_name = $identity' in cypher
+        )
+
+    def _fetchpath(self, path, time, within):
+        """Fake records of changed hosts and their configfiles."""
+        env = {'account_number_name': 'env'}
+        hostnames = {1: ['a'], 2: ['c']}[time]
+        records = []
+        for hostname in hostnames:
+            if hostname not in within[1]:
+                continue
+            record = {
+                'Environment': env,
+                'Host': {'hostname_environment': hostname}
+            }
+            if path[-1] == 'Configfile':
+                record['Configfile'] = {
+                    'path_host': '/etc/conf_{}'.format(hostname)
+                }
+            records.append(record)
+        return records
+
+    @tag('unit')
+    @mock.patch('api.diff.get_connection')
+    @mock.patch(
+        'api.diff.registry.paths_from',
+        return_value=[['Environment', 'Host', 'Configfile']]
+    )
+    def test_feedall(self, m_paths, m_connection):
+        """Test that only changed nodes and one sided subtrees are read."""
+        def candidates(d, path, state):
+            if path[-1] == 'Host' and not state:
+                return ['a', 'c']
+            return []
+
+        with mock.patch.object(
+            IntervalDiff,
+            'fetchcandidates',
+            autospec=True,
+            side_effect=candidates
+        ) as m_candidates, mock.patch.object(
+            IntervalDiff,
+            'fetchpath',
+            autospec=True,
+            side_effect=lambda d, p, t, w: self._fetchpath(p, t, w)
+        ) as m_fetch:
+            d = IntervalDiff('Environment', 'env', 1, 2)
+
+        # Host and configfile relationships and states
+        self.assertEquals(m_candidates.call_count, 4)
+
+        calls = [c[0][1:] for c in m_fetch.call_args_list]
+        self.assertEquals(calls, [
+            (['Environment', 'Host'], 1, ('Host', ['a', 'c'])),
+            (['Environment', 'Host'], 2, ('Host', ['a', 'c'])),
+            (['Environment', 'Host', 'Configfile'], 1, ('Host', ['a'])),
+            (['Environment', 'Host', 'Configfile'], 2, ('Host', ['c'])),
+        ])
+
+        env = d.nodes['Environment']['env']
+        self.assertEquals(env.children['Host']['a']['side'], 'left')
+        self.assertEquals(env.children['Host']['c']['side'], 'right')
+        self.assertEquals(
+            sorted(d.nodes['Configfile']),
+            ['/etc/conf_a', '/etc/conf_c']
+        )
+
+    @tag('unit')
+    @mock.patch('api.diff.get_connection')
+    @mock.patch(
+        'api.diff.registry.paths_from',
+        return_value=[['Environment', 'Host']]
+    )
+    def test_feedall_unchanged(self, m_paths, m_connection):
+        """Test that nothing is read when nothing changed."""
+        with mock.patch.object(
+            IntervalDiff,
+            'fetchcandidates',
+            return_value=[]
+        ), mock.patch.object(IntervalDiff, 'fetchpath') as m_fetch:
+            d = IntervalDiff('Environment', 'env', 1, 2)
+        m_fetch.assert_not_called()
+        self.assertEquals(d.result().diffdict['frame'], None)
+
+
+EOT = 2 ** 62
+
+
+class FakeHistory:
+    """Versioned graph answering the queries of both diff engines."""
+
+    identity_properties = {
+        'Environment': 'account_number_name',
+        'Host': 'hostname_environment',
+        'Configfile': 'path_host'
+    }
+
+    def __init__(self, model, identity, states, edges):
+        """Init the history.
+
+        :param model: Label of the diffed node
+        :type model: str
+        :param identity: Identity of the diffed node
+        :type identity: str
+        :param states: Dict of (label, identity) -> list of
+            (from, to, props). Labels without states are left out.
+        :type states: dict
+        :param edges: List of (parent label, parent identity, child
+            label, child identity, from, to)
+        :type edges: list
+        """
+        self.model = model
+        self.identity = identity
+        self.states = states
+        self.edges = edges
+
+    def node(self, label, identity, time):
+        """Get the row of a node at a time like Query returns it."""
+        row = {self.identity_properties[label]: identity}
+        if label == 'Environment':
+            return row
+        for frm, to, props in self.states.get((label, identity), []):
+            if frm <= time < to:
+                row.update(props)
+                return row
+        return None
+
+    def children(self, label, identity, child_label, time=None):
+        """Get identities of children, at a time or ever."""
+        return sorted(set(
+            cid for plabel, pid, clabel, cid, frm, to in self.edges
+            if (plabel, pid, clabel) == (label, identity, child_label) and
+            (time is None or frm <= time < to)
+        ))
+
+    def reachable(self, path):
+        """Get identities of the last model of a path reachable ever."""
+        identities = [self.identity]
+        for parent, child in zip(path, path[1:]):
+            identities = set(
+                cid for pid in identities
+                for cid in self.children(parent, pid, child)
+            )
+        return set(identities)
+
+    def fetchpath(self, path, time, within=None):
+        records = [{path[0]: self.node(path[0], self.identity, time)}]
+        for parent, child in zip(path, path[1:]):
+            extended = []
+            for record in records:
+                pid = record[parent][self.identity_properties[parent]]
+                for cid in self.children(parent, pid, child, time):
+                    node = self.node(child, cid, time)
+                    if node is not None:
+                        extended.append(dict(record, **{child: node}))
+            records = extended
+        if within is not None:
+            label, identities = within
+            prop = self.identity_properties[label]
+            records = [r for r in records if r[label][prop] in identities]
+        return records
+
+    def fetchcandidates(self, path, state, t1, t2):
+        def changed(frm, to):
+            return t1 < frm <= t2 or t1 < to <= t2
+
+        label = path[-1]
+        if state:
+            return sorted(
+                identity for identity in self.reachable(path)
+                if any(
+                    changed(frm, to)
+                    for frm, to, _ in self.states.get((label, identity), [])
+                )
+            )
+        parents = self.reachable(path[:-1])
+        return sorted(set(
+            cid for plabel, pid, clabel, cid, frm, to in self.edges
+            if plabel == path[-2] and clabel == label and
+            pid in parents and changed(frm, to)
+        ))
+
+
+def _sorted_frame(frame):
+    """Sort children of a frame to compare frames built in any order."""
+    if frame is None:
+        return None
+    sorted_frame = dict(frame)
+    sorted_frame['children'] = sorted(
+        (_sorted_frame(c) for c in frame['children']),
+        key=lambda c: (c['model'], c['id'], c['side'])
+    )
+    return sorted_frame
+
+
+def _nodes_by_key(diffdict):
+    """Map (model, identity) to the node of a diff."""
+    return {
+        (model, identity): diffdict['nodes'][index]
+        for model, modelmap in diffdict['nodemap'].items()
+        for identity, index in modelmap.items()
+    }
+
+
+class TestDiffEngines(TestCase):
+    """Test that both engines build the same result for one history."""
+
+    def setUp(self):
+        def host(frm, to, **props):
+            return [(frm, to, dict({'kernel': '4.4'}, **props))]
+
+        def conf(frm, to, md5='x'):
+            return [(frm, to, {'md5': md5})]
+
+        states = {
+            # State change
+            ('Host', 'h1'): [
+                (0, 15, {'kernel': '4.4'}),
+                (15, EOT, {'kernel': '4.15'})
+            ],
+            ('Host', 'h2'): host(0, EOT),
+            ('Host', 'h3'): host(0, EOT),
+            ('Host', 'h4'): host(18, EOT),
+            ('Host', 'h5'): host(0, EOT),
+            ('Configfile', 'c1'): conf(0, EOT),
+            # State change below an unchanged relationship
+            ('Configfile', 'c2'): conf(0, 15) + conf(15, EOT, md5='y'),
+            ('Configfile', 'c3'): conf(0, EOT),
+            ('Configfile', 'c4'): conf(18, EOT),
+            ('Configfile', 'c5'): conf(0, EOT)
+        }
+        edges = [
+            ('Environment', 'env', 'Host', 'h1', 0, EOT),
+            ('Environment', 'env', 'Host', 'h2', 0, EOT),
+            # Left only subtree
+            ('Environment', 'env', 'Host', 'h3', 0, 12),
+            # Right only subtree
+            ('Environment', 'env', 'Host', 'h4', 18, EOT),
+            # Unchanged subtree
+            ('Environment', 'env', 'Host', 'h5', 0, EOT),
+            # Moved child
+            ('Host', 'h2', 'Configfile', 'c1', 0, 15),
+            ('Host', 'h1', 'Configfile', 'c1', 15, EOT),
+            ('Host', 'h2', 'Configfile', 'c2', 0, EOT),
+            ('Host', 'h3', 'Configfile', 'c3', 0, EOT),
+            ('Host', 'h4', 'Configfile', 'c4', 18, EOT),
+            ('Host', 'h5', 'Configfile', 'c5', 0, EOT)
+        ]
+        self.history = FakeHistory('Environment', 'env', states, edges)
+
+    def _result(self, engine, left, right):
+        history = self.history
+
+        def candidates(d, path, state):
+            return history.fetchcandidates(
+                path,
+                state,
+                min(d.left_time, d.right_time),
+                max(d.left_time, d.right_time)
+            )
+
+        with mock.patch.object(
+            Diff,
+            'fetchpath',
+            autospec=True,
+            side_effect=lambda d, p, t, w=None: history.fetchpath(p, t, w)
+        ), mock.patch.object(
+            IntervalDiff,
+            'fetchcandidates',
+            autospec=True,
+            side_effect=candidates
+        ):
+            return engine('Environment', 'env', left, right).result()
+
+    @tag('unit')
+    @mock.patch('api.diff.generation_tag', return_value=None)
+    @mock.patch('api.diff.get_connection')
+    @mock.patch(
+        'api.diff.registry.paths_from',
+        return_value=[['Environment', 'Host', 'Configfile']]
+    )
+    def test_same_result(self, m_paths, m_connection, m_tag):
+        """Test that IntervalDiff and Diff agree in both directions."""
+        for left, right in ((10, 20), (20, 10), (10, 11)):
+            snapshot = self._result(Diff, left, right).diffdict
+            interval = self._result(IntervalDiff, left, right).diffdict
+            self.assertEquals(
+                _sorted_frame(interval['frame']),
+                _sorted_frame(snapshot['frame'])
+            )
+            self.assertEquals(
+                _nodes_by_key(interval),
+                _nodes_by_key(snapshot)
+            )
+            self.assertEquals(interval['nodecount'], snapshot['nodecount'])
+
+        # The history exercises every kind of change.
+        diffdict = self._result(Diff, 10, 20).diffdict
+        nodes = _nodes_by_key(diffdict)
+        self.assertEquals(
+            sorted(nodes),
+            [
+                ('Configfile', 'c1'), ('Configfile', 'c2'),
+                ('Configfile', 'c3'), ('Configfile', 'c4'),
+                ('Environment', 'env'),
+                ('Host', 'h1'), ('Host', 'h2'), ('Host', 'h3'), ('Host', 'h4')
+            ]
+        )
+        self.assertEquals(nodes[('Host', 'h1')]['right'], {'kernel': '4.15'})
+        hosts = {
+            c['id']: c for c in _sorted_frame(diffdict['frame'])['children']
+        }
+        self.assertEquals(hosts['h3']['side'], 'left')
+        self.assertEquals(hosts['h3']['children'][0]['id'], 'c3')
+        self.assertEquals(hosts['h4']['side'], 'right')
+        self.assertEquals(hosts['h1']['children'][0]['side'], 'right')
+        self.assertEquals(hosts['h2']['children'][0]['side'], 'left')
+
+
+@override_settings(CACHES=LOCMEM)
+class TestChunkedDiffResult(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        nodes = []
+        nodemap = {}
+        for model, count in (('Environment', 1), ('Host', 6)):
+            modelmap = nodemap.setdefault(model, {})
+            for i in range(count):
+                modelmap['{}{}'.format(model, i)] = len(nodes)
+                nodes.append({'model': model, 'left': {'i': i}})
+        self.diffdict = {
+            'frame': {
+                'model': 'Environment',
+                'id': 'Environment0',
+                'side': None,
+                'children': [{
+                    'model': 'Host',
+                    'id': 'Host{}'.format(i),
+                    'side': 'left',
+                    'children': [{
+                        'model': 'Configfile',
+                        'id': 'conf{}'.format(i),
+                        'side': None,
+                        'children': []
+                    }]
+                } for i in range(3)]
+            },
+            'nodes': nodes,
+            'nodemap': nodemap,
+            'nodecount': len(nodes)
+        }
+        self.full = DiffResult(self.diffdict)
+        header = self.full.store(b'somekey', 60, chunksize=3)
+        self.chunked = ChunkedDiffResult(b'somekey', header)
+
+    @tag('unit')
+    def test_chunks(self):
+        """Test that nodes are stored in chunks."""
+        self.assertEquals(self.chunked.header['chunksize'], 3)
+        self.assertFalse(cache.get('somekey-chunk-2') is None)
+        self.assertTrue(cache.get('somekey-chunk-3') is None)
+
+    @tag('unit')
+    def test_getnodes(self):
+        """Test that slices across chunks match the full result."""
+        for offset, limit in ((0, 2), (2, 3), (1, 6), (5, 10), (7, 1)):
+            self.assertEquals(
+                self.chunked.getnodes(offset, limit),
+                self.full.getnodes(offset, limit)
+            )
+
+    @tag('unit')
+    def test_getnode(self):
+        """Test getting nodes by model and identity."""
+        self.assertEquals(
+            self.chunked.getnode('Host', 'Host4'),
+            self.full.getnode('Host', 'Host4')
+        )
+        self.assertTrue(self.chunked.getnode('Host', 'nothost') is None)
+        self.assertTrue(self.chunked.getnode('Uservar', 'Host4') is None)
+
+    @tag('unit')
+    def test_structure(self):
+        """Test frame, nodemap and nodecount."""
+        self.assertEquals(self.chunked.frame(), self.diffdict['frame'])
+        self.assertEquals(self.chunked.nodemap(), self.diffdict['nodemap'])
+        self.assertEquals(self.chunked.nodecount(), 7)
+
+    @tag('unit')
+    def test_frame_parts(self):
+        """Test that the frame is stored in parts below the top."""
+        self.assertFalse(cache.get('somekey-frame-2') is None)
+        self.assertTrue(cache.get('somekey-frame-3') is None)
+        for depth in (None, 0, 1, 2):
+            self.assertEquals(
+                self.chunked.frame(depth),
+                self.full.frame(depth)
+            )
+
+        # The top alone answers shallow frames.
+        for i in range(3):
+            cache.delete('somekey-frame-{}'.format(i))
+        self.assertEquals(self.chunked.frame(1), self.full.frame(1))
+
+    @tag('unit')
+    def test_subtree_reads_one_part(self):
+        """Test that a subtree only reads the part holding it."""
+        cache.delete('somekey-frame-0')
+        cache.delete('somekey-frame-2')
+        for model, identity in (('Host', 'Host1'), ('Configfile', 'conf1')):
+            for depth in (None, 0):
+                self.assertEquals(
+                    self.chunked.subtree(model, identity, depth),
+                    self.full.subtree(model, identity, depth)
+                )
+        self.assertTrue(self.chunked.subtree('Host', 'nothost') is None)
+
+    @tag('unit')
+    def test_subtree_of_top(self):
+        """Test subtrees of nodes in the top of the frame."""
+        for depth in (None, 1, 2):
+            self.assertEquals(
+                self.chunked.subtree('Environment', 'Environment0', depth),
+                self.full.subtree('Environment', 'Environment0', depth)
+            )
+
+    @tag('unit')
+    def test_evicted(self):
+        """Test that a missing part drops the diff."""
+        cache.set(b'somekey', self.chunked.header)
+        cache.delete('somekey-chunk-1')
+        with self.assertRaises(JobRunningError):
+            self.chunked.getnodes(0, 6)
+        self.assertTrue(cache.get(b'somekey') is None)
+
+
+class TestFrames(TestCase):
+
+    def setUp(self):
+        self.frame = {
+            'model': 'Environment',
+            'id': 'env',
+            'side': None,
+            'children': [{
+                'model': 'Host',
+                'id': 'host',
+                'side': 'left',
+                'children': [{
+                    'model': 'Configfile',
+                    'id': 'conf',
+                    'side': None,
+                    'children': []
+                }]
+            }]
+        }
+
+    @tag('unit')
+    def test_limit_frame(self):
+        """Test limiting the depth of a frame."""
+        self.assertTrue(limit_frame(self.frame, None) is self.frame)
+        self.assertTrue(limit_frame(None, 1) is None)
+
+        limited = limit_frame(self.frame, 0)
+        self.assertEquals(limited['childcount'], 1)
+        self.assertEquals(limited['children'], [])
+
+        limited = limit_frame(self.frame, 1)
+        host = limited['children'][0]
+        self.assertEquals(host['id'], 'host')
+        self.assertEquals(host['childcount'], 1)
+        self.assertEquals(host['children'], [])
+
+        # Original frame is untouched
+        self.assertEquals(len(self.frame['children'][0]['children']), 1)
+
+    @tag('unit')
+    def test_find_frame(self):
+        """Test finding the subtree of a node."""
+        found = find_frame(self.frame, 'Configfile', 'conf')
+        self.assertEquals(found['id'], 'conf')
+        self.assertTrue(find_frame(self.frame, 'Host', 'conf') is None)
+        self.assertTrue(find_frame(None, 'Host', 'host') is None)
+
+    @tag('unit')
+    def test_subtree(self):
+        """Test getting a depth limited subtree from a result."""
+        result = DiffResult({'frame': self.frame})
+        subtree = result.subtree('Host', 'host', depth=0)
+        self.assertEquals(subtree['childcount'], 1)
+        self.assertEquals(subtree['children'], [])
+        self.assertTrue(result.subtree('Host', 'other') is None)
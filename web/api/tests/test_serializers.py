@@ -2,6 +2,7 @@ import logging
 
 from django.test import tag, TestCase
 
+from api.serializers import BlobSerializer
 from api.serializers import DiffNodeSerializer
 from api.serializers import DiffNodesSerializer
 from api.serializers import DiffSerializer
@@ -347,6 +348,48 @@ class TestTimesChangedSerializer(SerializerCase):
         self.assertInvalid()
 
 
+class TestBlobSerializer(SerializerCase):
+
+    serializer_class = BlobSerializer
+
+    def setUp(self):
+        self.data = {
+            'model': 'Configfile',
+            'identity': 'someconfigfile',
+            'prop': 'contents',
+            'time': 1000
+        }
+
+    @tag('unit')
+    def test_valid(self):
+        self.assertValid()
+
+    @tag('unit')
+    def test_missing_time(self):
+        del self.data['time']
+        self.assertValid()
+
+    @tag('unit')
+    def test_invalid_model(self):
+        self.data['model'] = 'somerandommodel'
+        self.assertInvalid()
+
+    @tag('unit')
+    def test_missing_identity(self):
+        del self.data['identity']
+        self.assertInvalid()
+
+    @tag('unit')
+    def test_not_blob_property(self):
+        self.data['prop'] = 'md5'
+        self.assertInvalid()
+
+    @tag('unit')
+    def test_model_without_blobs(self):
+        self.data['model'] = 'Environment'
+        self.assertInvalid()
+
+
 class TestDiffSerializer(SerializerCase):
 
     serializer_class = DiffSerializer
@@ -9,6 +9,7 @@ from rest_framework.test import APITestCase
 
 from api.exceptions import JobError
 from api.exceptions import JobRunningError
+from neo4jdriver.query import encode_cursor
 
 logging.getLogger('neo4j').setLevel(logging.ERROR)
 logging.getLogger('api').setLevel(logging.ERROR)
@@ -196,15 +197,73 @@ class TestObjectViewSetSearch(BaseApiTestCase):
         self.assertTrue('records' in data)
         self.assertEquals(data['records'], 'testpage')
 
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.Query.count', return_value=5)
+    @mock.patch(
+        'neo4jdriver.query.Query.page_after',
+        return_value=('testpage', ['b'])
+    )
+    def test_resp_cursor(self, m_page_after, m_count):
+        self.client.login(**self.credentials)
+        self.body['cursor'] = ''
+        resp = self.client.post('/api/objects/search/', self.body)
+        data = resp.json()
+        m_page_after.assert_called_once_with(None, 500)
+        self.assertEquals(data['count'], 5)
+        self.assertEquals(data['records'], 'testpage')
+        self.assertEquals(data['cursor'], encode_cursor(['b']))
+
+        # Following pages continue after the cursor without counting.
+        m_page_after.reset_mock()
+        m_page_after.return_value = ('lastpage', None)
+        self.body['cursor'] = data['cursor']
+        resp = self.client.post('/api/objects/search/', self.body)
+        data = resp.json()
+        m_page_after.assert_called_once_with(['b'], 500)
+        self.assertEquals(m_count.call_count, 1)
+        self.assertTrue(data['count'] is None)
+        self.assertTrue(data['cursor'] is None)
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.Query.count', return_value=5)
+    @mock.patch(
+        'neo4jdriver.query.Query.estimate_count',
+        return_value=(1000, True)
+    )
+    @mock.patch('neo4jdriver.query.Query.page', return_value='testpage')
+    def test_resp_estimate(self, m_page, m_estimate, m_count):
+        self.client.login(**self.credentials)
+        self.body['estimate'] = True
+        resp = self.client.post('/api/objects/search/', self.body)
+        data = resp.json()
+        m_count.assert_not_called()
+        self.assertEquals(data['count'], 1000)
+        self.assertTrue(data['count_approximate'])
+
+    @tag('unit')
+    def test_invalid_cursor(self):
+        self.client.login(**self.credentials)
+        self.body['cursor'] = 'not a cursor'
+        resp = self.client.post('/api/objects/search/', self.body)
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class FakeDiffResult:
 
     def __init__(self, find_node=True):
         self.find_node = find_node
-        self.diffdict = {'nodecount': 5, 'nodemap': 'nodemap'}
 
-    def frame(self):
-        return 'frame'
+    def frame(self, depth=None):
+        return 'frame' if depth is None else 'frame{}'.format(depth)
+
+    def subtree(self, model, identity, depth=None):
+        return 'subtree' if self.find_node else None
+
+    def nodemap(self):
+        return 'nodemap'
+
+    def nodecount(self):
+        return 5
 
     def getnode(self, model, identity):
         return 'node' if self.find_node else None
@@ -443,3 +502,70 @@ class TestObjectDiffViewSetStructure(BaseApiTestCase):
         self.assertEquals(data['nodecount'], 5)
         self.assertEquals(data['nodemap'], 'nodemap')
         self.assertEquals(data['frame'], 'frame')
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.Query.fetch', side_effect=[[1], [1]])
+    @mock.patch('api.views.objectdiff', return_value=FakeDiffResult())
+    def test_frame_depth(self, m_diff, m_fetch):
+        self.client.login(**self.credentials)
+        self.body['depth'] = 2
+        resp = self.client.post(self.baseurl, self.body)
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        data = resp.json()
+        self.assertEquals(data['frame'], 'frame2')
+        self.assertEquals(data['nodecount'], 5)
+        self.assertFalse('nodemap' in data)
+
+
+class TestObjectDiffViewSetSubtree(BaseApiTestCase):
+
+    baseurl = '/api/objectdiffs/subtree/'
+
+    def setUp(self):
+        super(TestObjectDiffViewSetSubtree, self).setUp()
+        self.body = {
+            'model': 'Environment',
+            'identity': 'someid',
+            'left_time': 1,
+            'right_time': 2,
+            'node_model': 'Host',
+            'node_identity': 'somehost',
+            'depth': 1
+        }
+
+    @tag('unit')
+    def test_invalid_req(self):
+        self.client.login(**self.credentials)
+        resp = self.client.post(self.baseurl, {})
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.Query.fetch', side_effect=[[1], [1]])
+    @mock.patch('api.views.objectdiff', side_effect=JobRunningError())
+    def test_job_running(self, m_diff, m_fetch):
+        self.client.login(**self.credentials)
+        resp = self.client.post(self.baseurl, self.body)
+        self.assertEquals(resp.status_code, status.HTTP_202_ACCEPTED)
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.Query.fetch', side_effect=[[1], [1]])
+    @mock.patch(
+        'api.views.objectdiff',
+        return_value=FakeDiffResult(find_node=False)
+    )
+    def test_not_found(self, m_diff, m_fetch):
+        self.client.login(**self.credentials)
+        resp = self.client.post(self.baseurl, self.body)
+        self.assertEquals(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.Query.fetch', side_effect=[[1], [1]])
+    @mock.patch('api.views.objectdiff', return_value=FakeDiffResult())
+    def test_subtree(self, m_diff, m_fetch):
+        self.client.login(**self.credentials)
+        resp = self.client.post(self.baseurl, self.body)
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+
+        data = resp.json()
+        self.assertEquals(data['frame'], 'subtree')
+        self.assertEquals(data['nodecount'], 5)
@@ -7,16 +7,22 @@ from rest_framework import status
 from rest_framework.decorators import list_route
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from neo4jdriver.exceptions import InvalidCursorError
+from neo4jdriver.query import ColumnQuery
 from neo4jdriver.query import Query
+from neo4jdriver.query import decode_cursor
+from neo4jdriver.query import encode_cursor
 
 from .decorators import cls_cached_result
 
 from .exceptions import JobError
 from .exceptions import JobRunningError
 
+from .serializers import BlobSerializer
 from .serializers import DiffSerializer
 from .serializers import DiffNodeSerializer
 from .serializers import DiffNodesSerializer
+from .serializers import DiffSubtreeSerializer
 from .serializers import ModelSerializer
 from .serializers import PropertySerializer
 from .serializers import SearchSerializer
@@ -134,6 +140,28 @@ class ObjectViewSet(viewsets.ViewSet):
         })
         return Response(results.data)
 
+    @list_route(methods=['post'])
+    def blob(self, request):
+        """Get a blob property of an object.
+
+        Blob properties like configfile contents are not part of search
+        results and are fetched on demand.
+        """
+        blob = BlobSerializer(data=request.data)
+        if not blob.is_valid():
+            raise ValidationError(blob.errors)
+        vd = blob.validated_data
+
+        query = ColumnQuery(vd['model']) \
+            .identity(vd['identity']) \
+            .time(vd.get('time')) \
+            .add_column(vd['model'], vd['prop'], name='value')
+        records = query.fetch()
+        if not records:
+            raise Http404()
+
+        return Response({'data': vd, 'value': records[0]['value']})
+
     @list_route(methods=['post'])
     def search(self, request):
         """Search objects by type, identity, and property filters."""
@@ -157,7 +185,10 @@ class ObjectViewSet(viewsets.ViewSet):
         for o in vd.get('orders', []):
             query.orderby(o['prop'], o['direction'], label=o['model'])
 
-        count = query.count()
+        if 'cursor' in vd:
+            return self._search_after(query, vd)
+
+        count, approximate = self._count(query, vd)
 
         records = query.page(
             page=vd['page'],
@@ -170,12 +201,61 @@ class ObjectViewSet(viewsets.ViewSet):
             'data': vd,
             'params': query.params,
             'count': count,
+            'count_approximate': approximate,
             'pagesize': vd['pagesize'],
             'page': vd['page'],
             'records': records
         })
         return Response(serializer.data)
 
+    def _count(self, query, vd):
+        """Count the records of a search.
+
+        :param query: Search query
+        :type query: neo4jdriver.query.Query
+        :param vd: Validated search data
+        :type vd: dict
+        :returns: Tuple of (count, whether the count is approximate)
+        :rtype: tuple
+        """
+        if vd.get('estimate'):
+            return query.estimate_count()
+        return query.count(), False
+
+    def _search_after(self, query, vd):
+        """Respond with the page of a search following a cursor.
+
+        The total count is only computed for the first page.
+
+        :param query: Search query
+        :type query: neo4jdriver.query.Query
+        :param vd: Validated search data
+        :type vd: dict
+        :returns: Response with the page and the cursor of the next page
+        :rtype: rest_framework.response.Response
+        """
+        after = decode_cursor(vd['cursor']) if vd['cursor'] else None
+        count = None
+        approximate = False
+        if after is None:
+            count, approximate = self._count(query, vd)
+        try:
+            records, last = query.page_after(after, vd['pagesize'])
+        except InvalidCursorError as e:
+            raise ValidationError({'cursor': [str(e)]})
+
+        serializer = ModelSerializer({
+            'query': str(query),
+            'data': vd,
+            'params': query.params,
+            'count': count,
+            'count_approximate': approximate,
+            'pagesize': vd['pagesize'],
+            'cursor': None if last is None else encode_cursor(last),
+            'records': records
+        })
+        return Response(serializer.data)
+
 
 class ObjectDiffViewSet(viewsets.ViewSet):
     """Viewset for diffing the same object at different points in time."""
@@ -271,19 +351,20 @@ class ObjectDiffViewSet(viewsets.ViewSet):
                 data['left_time'],
                 data['right_time']
             )
+            node = diff.getnode(data['node_model'], data['node_identity'])
+            nodecount = diff.nodecount()
         except JobRunningError:
             return self._job_running_response()
         except JobError:
             return self._job_error_response()
 
         # 404 if node not found.
-        node = diff.getnode(data['node_model'], data['node_identity'])
         if node is None:
             raise Http404()
 
         results = ModelSerializer({
             'node': node,
-            'nodecount': diff.diffdict['nodecount'],
+            'nodecount': nodecount,
             'data': data
         })
         return Response(results.data)
@@ -304,21 +385,27 @@ class ObjectDiffViewSet(viewsets.ViewSet):
                 data['left_time'],
                 data['right_time']
             )
+            nodes = diff.getnodes(data['offset'], data['limit'])
+            nodecount = diff.nodecount()
         except JobRunningError:
             return self._job_running_response()
         except JobError:
             return self._job_error_response()
 
         results = ModelSerializer({
-            'nodes': diff.getnodes(data['offset'], data['limit']),
-            'nodecount': diff.diffdict['nodecount'],
+            'nodes': nodes,
+            'nodecount': nodecount,
             'data': data
         })
         return Response(results.data)
 
     @list_route(methods=['post'])
     def structure(self, request):
-        """Get structure of the tree."""
+        """Get structure of the tree.
+
+        With a depth, only the top of the tree is returned and the
+        nodemap is left out. Nodes are then read by node or nodes.
+        """
         # Validate the data
         data = self._data(request, DiffSerializer)
 
@@ -332,16 +419,57 @@ class ObjectDiffViewSet(viewsets.ViewSet):
                 data['left_time'],
                 data['right_time']
             )
+            frame = diff.frame(depth=data.get('depth'))
+            results = {
+                'frame': frame,
+                'nodecount': diff.nodecount(),
+                'data': data
+            }
+            if data.get('depth') is None:
+                results['nodemap'] = diff.nodemap()
         except JobRunningError:
             return self._job_running_response()
         except JobError:
             return self._job_error_response()
 
         # Return the response
+        results = ModelSerializer(results)
+        return Response(results.data)
+
+    @list_route(methods=['post'])
+    def subtree(self, request):
+        """Get structure of the tree below a node."""
+        # Validate the data
+        data = self._data(request, DiffSubtreeSerializer)
+
+        # Make sure both sides are kosher
+        self._check_sides(data)
+
+        try:
+            diff = objectdiff(
+                data['model'],
+                data['identity'],
+                data['left_time'],
+                data['right_time']
+            )
+            frame = diff.subtree(
+                data['node_model'],
+                data['node_identity'],
+                depth=data.get('depth')
+            )
+            nodecount = diff.nodecount()
+        except JobRunningError:
+            return self._job_running_response()
+        except JobError:
+            return self._job_error_response()
+
+        # 404 if node not found.
+        if frame is None:
+            raise Http404()
+
         results = ModelSerializer({
-            'frame': diff.frame(),
-            'nodemap': diff.diffdict['nodemap'],
-            'nodecount': diff.diffdict['nodecount'],
+            'frame': frame,
+            'nodecount': nodecount,
             'data': data
         })
         return Response(results.data)
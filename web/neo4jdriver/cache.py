@@ -0,0 +1,158 @@
+"""Cache of query results keyed by sync generation.
+
+Results are keyed by the cypher of the query, its parameters and the
+global generation bumped by every completed sync:
+
+- Times older than settle_ms only change when compaction rewrites old
+  history or a sync lands a run that completed before the settle
+  window. Their results are keyed by the epoch both increment and
+  cached without a timeout. Without a readable epoch they are
+  cached with the regular timeout.
+- Other results are keyed by the current generation, so they are
+  replaced as soon as a sync lands. Times within live_window_ms of now
+  are keyed as 'now' so repeated queries at the current time share a
+  result.
+
+Without a readable generation only settled results are cached.
+"""
+import hashlib
+import json
+import logging
+
+from cloud_snitch import utils
+from cloud_snitch.generation import Generations
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIVE_WINDOW_MS = 60 * 1000
+DEFAULT_SETTLE_MS = 24 * 60 * 60 * 1000
+DEFAULT_TIMEOUT = 60 * 60
+
+_GENERATIONS = None
+
+
+def _options():
+    """Get the query cache settings.
+
+    :returns: Query cache settings
+    :rtype: dict
+    """
+    return settings.NEO4J.get('query_cache', {})
+
+
+def get_generations():
+    """Get the shared generation counters.
+
+    :returns: Generation counters
+    :rtype: cloud_snitch.generation.Generations
+    """
+    global _GENERATIONS
+    if _GENERATIONS is None:
+        _GENERATIONS = Generations(_options().get('generation_url'))
+    return _GENERATIONS
+
+
+def _age(timestamp):
+    """Compute the age of a time.
+
+    :param timestamp: Milliseconds since epoch or anything else
+    :type timestamp: object
+    :returns: Age in milliseconds, 0 if timestamp is not a number
+    :rtype: int
+    """
+    if isinstance(timestamp, (int, float)):
+        return utils.milliseconds_now() - timestamp
+    return 0
+
+
+def generation_tag(timestamp):
+    """Get the generation that results at a time are valid for.
+
+    :param timestamp: Milliseconds since epoch
+    :type timestamp: int|None
+    :returns: 'settled-<epoch>' for times older than settle_ms, the
+        current generation for other times or None if unknown.
+    :rtype: str|int|None
+    """
+    if _age(timestamp) >= _options().get('settle_ms', DEFAULT_SETTLE_MS):
+        return 'settled-{}'.format(get_generations().epoch())
+    return get_generations().current()
+
+
+def cache_entry(kind, query_str, params):
+    """Compute the cache key and timeout of a query result.
+
+    :param kind: Kind of result, like fetch or count
+    :type kind: str
+    :param query_str: Cypher of the query
+    :type query_str: str
+    :param params: Parameters of the query
+    :type params: dict
+    :returns: Tuple of (key, timeout) or None if the result can not
+        be cached
+    :rtype: tuple|None
+    """
+    options = _options()
+    if not options.get('enabled', False):
+        return None
+
+    params = dict(params)
+    timestamp = params.get('time')
+    age = _age(timestamp)
+
+    if age >= options.get('settle_ms', DEFAULT_SETTLE_MS):
+        epoch = get_generations().epoch()
+        generation = 'settled-{}'.format(epoch)
+        if epoch is None:
+            timeout = options.get('timeout', DEFAULT_TIMEOUT)
+        else:
+            timeout = None
+    else:
+        generation = get_generations().current()
+        if generation is None:
+            return None
+        timeout = options.get('timeout', DEFAULT_TIMEOUT)
+        if age < options.get('live_window_ms', DEFAULT_LIVE_WINDOW_MS):
+            params['time'] = 'now'
+
+    raw = json.dumps(
+        [query_str, params, generation],
+        sort_keys=True,
+        default=str
+    )
+    key = 'query-{}-{}'.format(
+        kind,
+        hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    )
+    return key, timeout
+
+
+def cached(kind, query_str, params, func):
+    """Get a query result from the cache or compute and store it.
+
+    :param kind: Kind of result, like fetch or count
+    :type kind: str
+    :param query_str: Cypher of the query
+    :type query_str: str
+    :param params: Parameters of the query
+    :type params: dict
+    :param func: Function computing the result
+    :type func: function
+    :returns: Result of the query
+    :rtype: object
+    """
+    entry = cache_entry(kind, query_str, params)
+    if entry is None:
+        return func()
+
+    key, timeout = entry
+    value = cache.get(key)
+    if value is None:
+        logger.debug("QUERY CACHE MISS")
+        value = func()
+        cache.set(key, value, timeout)
+    else:
+        logger.debug("QUERY CACHE HIT")
+    return value
@@ -1,6 +1,8 @@
 import logging
 import time
 
+from cloud_snitch.instrumentation import InstrumentedDriver
+from cloud_snitch.instrumentation import QueryRecorder
 from neo4j.v1 import GraphDatabase
 from django.conf import settings
 
@@ -25,6 +27,17 @@ class Connection:
             max_connection_lifetime=self.max_connection_lifetime,
             max_connection_pool_size=self.max_connection_pool_size
         )
+        self.recorder = None
+        instrumentation = settings.NEO4J.get('instrumentation', {})
+        if instrumentation.get('enabled', False):
+            self.recorder = QueryRecorder(
+                slow_query_ms=instrumentation.get('slow_query_ms', 1000),
+                profile_sample_rate=instrumentation.get(
+                    'profile_sample_rate',
+                    0.0
+                )
+            )
+            self.driver = InstrumentedDriver(self.driver, self.recorder)
         self.start = time.time()
 
     def isvalid(self):
@@ -48,6 +61,8 @@ class Connection:
         if self.driver is not None:
             self.driver.close()
             self.driver = None
+            if self.recorder is not None:
+                self.recorder.log_summary()
 
     def __del__(self):
         """Close the driver on deletes."""
@@ -20,3 +20,14 @@ class InvalidPropertyError(Exception):
         """
         msg = 'Invalid property \'{}\' on \'{}\''.format(label, prop)
         super(InvalidPropertyError, self).__init__(msg)
+
+
+class InvalidCursorError(Exception):
+    def __init__(self, cursor):
+        """Init the error.
+
+        :param cursor: Continuation token
+        :type cursor: str
+        """
+        msg = 'Invalid cursor \'{}\'.'.format(cursor)
+        super(InvalidCursorError, self).__init__(msg)
@@ -0,0 +1,61 @@
+from cloud_snitch.models import registry
+from rest_framework.fields import flatten_choices_dict
+from rest_framework.fields import to_choices_dict
+from rest_framework.serializers import ChoiceField
+
+
+class ModelChoiceField(ChoiceField):
+    """Choice of a model label.
+
+    Choices are read from the registry when the field is first used
+    instead of when serializers are declared, so importing serializers
+    does not load the models.
+    """
+
+    def __init__(self, **kwargs):
+        """Init the field.
+
+        :param kwargs: Keyword arguments of ChoiceField
+        :type kwargs: dict
+        """
+        self._loaded = False
+        super(ModelChoiceField, self).__init__([], **kwargs)
+
+    def _apply_choices(self, choices):
+        """Set choices without loading the registry.
+
+        :param choices: List of choices
+        :type choices: list
+        """
+        self._grouped_choices = to_choices_dict(choices)
+        self._flat_choices = flatten_choices_dict(self._grouped_choices)
+        self._choice_strings_to_values = {
+            str(key): key for key in self._flat_choices.keys()
+        }
+
+    def _load_choices(self):
+        """Set choices from the registry once."""
+        if not self._loaded:
+            self._loaded = True
+            self._apply_choices(
+                [m.label for m in registry.models.values()]
+            )
+
+    def _get_choices(self):
+        self._load_choices()
+        return self._flat_choices
+
+    def _set_choices(self, choices):
+        self._apply_choices(choices)
+
+    choices = property(_get_choices, _set_choices)
+
+    @property
+    def grouped_choices(self):
+        self._load_choices()
+        return self._grouped_choices
+
+    @property
+    def choice_strings_to_values(self):
+        self._load_choices()
+        return self._choice_strings_to_values
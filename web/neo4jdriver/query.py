@@ -1,9 +1,14 @@
+import base64
+import binascii
+import json
 import logging
 
 from cloud_snitch.models import registry
 from cloud_snitch import utils
 from collections import OrderedDict
 
+from .cache import cached
+from .exceptions import InvalidCursorError
 from .exceptions import InvalidLabelError
 from .exceptions import InvalidPropertyError
 
@@ -16,6 +21,112 @@ def _model_state(model_name):
     return '{}_state'.format(model_name)
 
 
+def _property_expression(label, prop):
+    """Build the cypher expression of a property of a label.
+
+    Blob properties are read from their blob node with a pattern
+    comprehension so they are only fetched when used.
+
+    :param label: Label of the model with the property
+    :type label: str
+    :param prop: Name of the property
+    :type prop: str
+    :returns: Cypher expression
+    :rtype: str
+    """
+    blob_properties = registry.blob_properties(label) or {}
+    if prop in blob_properties:
+        key_prop, blob_model = blob_properties[prop]
+        blobvar = '{}_{}'.format(label.lower(), prop)
+        return 'head([({}:{} {{ {}: {} }}) | {}.{}])'.format(
+            blobvar,
+            blob_model.label,
+            blob_model.identity_property,
+            _property_expression(label, key_prop),
+            blobvar,
+            prop
+        )
+    if registry.has_state_property(label, prop):
+        return '{}.{}'.format(_model_state(label).lower(), prop)
+    return '{}.{}'.format(label.lower(), prop)
+
+
+def _state_label(label, prop):
+    """Get the label whose state a property expression reads from.
+
+    :param label: Label of the model with the property
+    :type label: str
+    :param prop: Name of the property
+    :type prop: str
+    :returns: Label if the expression needs the state of the label
+    :rtype: str|None
+    """
+    blob_properties = registry.blob_properties(label) or {}
+    if prop in blob_properties:
+        return _state_label(label, blob_properties[prop][0])
+    if registry.has_state_property(label, prop):
+        return label
+    return None
+
+
+def _anchor_rank(label, prop, operator):
+    """Rank how selective a filter is as the start of a match.
+
+    Equality on the identity property matches a single node through its
+    uniqueness constraint. Equality on a property the identity is
+    concatenated from is indexed. Other filters can not anchor a match.
+
+    :param label: Label of the filtered model
+    :type label: str
+    :param prop: Name of the filtered property
+    :type prop: str
+    :param operator: Filter operator
+    :type operator: str
+    :returns: 0 for the most selective filters, None for filters that
+        can not anchor
+    :rtype: int|None
+    """
+    if operator != '=':
+        return None
+    model = registry.models[label]
+    if prop == model.identity_property:
+        return 0
+    for props in model.concat_properties.values():
+        if prop in props:
+            return 1
+    return None
+
+
+def encode_cursor(key):
+    """Encode the sort key of a record as a continuation token.
+
+    :param key: Values of the sort key
+    :type key: list
+    :returns: Opaque token
+    :rtype: str
+    """
+    raw = json.dumps(key, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a continuation token into the sort key it continues after.
+
+    :param cursor: Token created by encode_cursor
+    :type cursor: str
+    :returns: Values of the sort key
+    :rtype: list
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        key = json.loads(raw.decode('utf-8'))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursorError(cursor)
+    if not isinstance(key, list):
+        raise InvalidCursorError(cursor)
+    return key
+
+
 class Query:
 
     def __init__(self, label):
@@ -38,6 +149,13 @@ class Query:
         self.filter_count = 0
         self.filter_wheres = []
 
+        # Filters able to anchor the match as (rank, label, condition)
+        self.anchors = []
+
+        # Labels whose states are read by filters and orderings
+        self.filter_states = set()
+        self.order_states = set()
+
         self.matches = []
         self.rels = []
         self.state_matches = []
@@ -53,6 +171,10 @@ class Query:
         self._skip = None
         self._limit = None
 
+        # Sort key values to continue after when paging by keyset
+        self._keyset = False
+        self._after = None
+
     def time(self, timestamp):
         """Update the time parameter
 
@@ -84,7 +206,7 @@ class Query:
                 'r{}'.format(i), relname, '-[r{}:{}]->'.format(i, relname)
             ))
 
-            if registry.state_properties(label):
+            if registry.has_state(label):
                 self.state_matches.append(label)
 
             self.addreturn(label)
@@ -94,7 +216,7 @@ class Query:
             self.label,
             '({}:{})'.format(self.label.lower(), self.label)
         ))
-        if registry.state_properties(self.label):
+        if registry.has_state(self.label):
             self.state_matches.append(self.label)
 
         self.return_labels.append(self.label)
@@ -129,24 +251,27 @@ class Query:
         if label is None:
             label = self.label
 
-        valid_properties = registry.properties(label)
-        if not valid_properties:
+        if label not in registry.models:
             raise InvalidLabelError(label)
 
-        if prop not in registry.properties(label):
+        if not registry.has_property(label, prop):
             raise InvalidPropertyError(prop, label)
 
-        if prop in registry.state_properties(label):
-            label = '{}_state'.format(label)
-
-        condition = '{}.{} {} {}'.format(
-            label.lower(),
-            prop,
+        condition = '{} {} {}'.format(
+            _property_expression(label, prop),
             operator,
             '$filterval{}'.format(self.filter_count)
         )
         self.filter_wheres.append(condition)
 
+        rank = _anchor_rank(label, prop, operator)
+        if rank is not None:
+            self.anchors.append((rank, label, condition))
+
+        state_label = _state_label(label, prop)
+        if state_label is not None:
+            self.filter_states.add(state_label)
+
         self.params['filterval{}'.format(self.filter_count)] = value
         self.filter_count += 1
         return self
@@ -197,16 +322,14 @@ class Query:
             raise InvalidLabelError(label)
 
         # Make sure property is valid
-        if prop not in registry.properties(label):
+        if not registry.has_property(label, prop):
             raise InvalidPropertyError(label, prop)
 
-        # Check if property is part of the state of the model
-        if prop in registry.state_properties(label):
-            varname = '{}_state'.format(label.lower())
-        else:
-            varname = label.lower()
+        self._orderby.append((_property_expression(label, prop), direction))
 
-        self._orderby.append((varname, prop, direction))
+        state_label = _state_label(label, prop)
+        if state_label is not None:
+            self.order_states.add(state_label)
 
     def skip(self, n):
         """Set number of records to skip.
@@ -224,13 +347,73 @@ class Query:
         """
         self._limit = n
 
-    def _match_clause(self):
+    def _return_states(self):
+        """List the labels whose states are returned.
+
+        :returns: Set of labels
+        :rtype: set
+        """
+        return set(
+            label for label in self.return_labels
+            if registry.has_state(label)
+        )
+
+    def _needed_states(self, returns=True):
+        """List the state joins the query needs.
+
+        States are only joined for labels that are filtered, ordered or
+        returned by their state properties. The existence of a label at
+        the time of the query is already checked by the time conditions
+        of the relationship to its parent, so only a root label without
+        parents is checked by its state.
+
+        :param returns: Whether or not records are returned and ordered
+        :type returns: bool
+        :returns: Labels in path order
+        :rtype: list
+        """
+        needed = set(self.filter_states)
+        if returns:
+            needed |= self.order_states
+            needed |= self._return_states()
+        if not self.rels:
+            needed.add(self.label)
+        return [label for label in self.state_matches if label in needed]
+
+    def _anchor(self):
+        """Find the most selective filter to start matching from.
+
+        :returns: Tuple of (label, condition) or None when the path has
+            a single node or no filter can anchor it
+        :rtype: tuple|None
+        """
+        if not self.rels or not self.anchors:
+            return None
+        _, label, condition = min(self.anchors, key=lambda a: a[0])
+        return label, condition
+
+    def _match_clause(self, returns=True):
         """Create match clause(s)
 
+        When a filter can anchor the match, the anchored node is matched
+        first so the path is expanded from it.
+
+        :param returns: Whether or not records are returned and ordered
+        :type returns: bool
         :returns: MATCH clause(s)
         :rtype: str
         """
-        cypher = 'MATCH '
+        cypher = ''
+        anchor = self._anchor()
+        if anchor is not None:
+            label, condition = anchor
+            cypher += 'MATCH ({}:{}) WHERE {} \n'.format(
+                label.lower(),
+                label,
+                condition
+            )
+
+        cypher += 'MATCH '
         for i in range(len(self.rels)):
             cypher += self.matches[i][2] + self.rels[i][2]
         if not self.rels:
@@ -238,7 +421,7 @@ class Query:
         else:
             cypher += self.matches[len(self.rels)][2]
 
-        for label in self.state_matches:
+        for label in self._needed_states(returns):
             cypher += ' \nMATCH ({})-[r_{}:HAS_STATE]->({}:{})'.format(
                 label.lower(),
                 '{}_state'.format(label.lower()),
@@ -247,16 +430,24 @@ class Query:
             )
         return cypher
 
-    def _where_clause(self):
+    def _where_clause(self, keyset=True, returns=True):
         """Create where clause.
 
+        :param keyset: Whether or not to continue after self._after
+        :type keyset: bool
+        :param returns: Whether or not records are returned and ordered
+        :type returns: bool
         :returns: WHERE clause
         :rtype: str
         """
         cypher = ' \nWHERE '
 
-        # Add conditions for wheres
-        conditions = [] + self.filter_wheres
+        # Add conditions for wheres. The anchor is filtered by its match.
+        anchor = self._anchor()
+        conditions = [
+            c for c in self.filter_wheres
+            if anchor is None or c != anchor[1]
+        ]
 
         # Add time conditions for path
         for relvar, relname, relstr in self.rels:
@@ -265,7 +456,7 @@ class Query:
             )
 
         # Add time conditions for states
-        for state_match in self.state_matches:
+        for state_match in self._needed_states(returns):
             conditions.append(
                 'r_{}_state.from <= $time < r_{}_state.to'.format(
                     state_match.lower(),
@@ -273,6 +464,9 @@ class Query:
                 )
             )
 
+        if keyset and self._after is not None:
+            conditions.append(self._keyset_condition())
+
         # If there are no conditions, return empty string
         if len(conditions) == 0:
             return ''
@@ -297,27 +491,107 @@ class Query:
         cypher += ', '.join(r for r in returns)
         return cypher
 
-    def _orderby_clause(self):
-        """Create order by clause.
+    def _sort_key(self):
+        """List the expressions records are ordered by.
 
-        :returns: ORDER BY clause
-        :rtype: str
-        """
-        cypher = ' \nORDER BY '
+        Defaults to the identity property of the target label. When
+        paging by keyset the identity properties of every label in the
+        path are appended so that the order is total.
 
-        # Default to ordering by identity property
-        ob = []
+        :returns: List of (expression, direction) tuples
+        :rtype: list
+        """
         if not self._orderby:
             self.orderby(
                 registry.identity_property(self.label),
                 'ASC',
                 label=self.label
             )
-        for ob_varname, ob_prop, ob_dir in self._orderby:
-            ob.append('{}.{} {}'.format(ob_varname, ob_prop, ob_dir))
+        key = list(self._orderby)
+        if not self._keyset:
+            return key
+
+        expressions = set(expression for expression, _ in key)
+        for label in [m[1] for m in self.matches]:
+            expression = _property_expression(
+                label,
+                registry.identity_property(label)
+            )
+            if expression not in expressions:
+                key.append((expression, 'ASC'))
+                expressions.add(expression)
+        return key
+
+    def _keyset_condition(self):
+        """Create the condition selecting records after self._after.
+
+        Cypher sorts nulls last in ascending order and first in
+        descending order. Comparisons with null are never true, so
+        null values are compared with IS NULL instead.
+
+        :returns: Condition
+        :rtype: str
+        """
+        key = self._sort_key()
+        if len(key) != len(self._after):
+            raise InvalidCursorError(encode_cursor(self._after))
+
+        equals = []
+        alternatives = []
+        for i, (expression, direction) in enumerate(key):
+            value = self._after[i]
+            param = '$after{}'.format(i)
+            self.params['after{}'.format(i)] = value
+            descending = direction.upper() == 'DESC'
+            if value is None:
+                after = '{} IS NOT NULL'.format(expression) \
+                    if descending else None
+                equal = '{} IS NULL'.format(expression)
+            else:
+                if descending:
+                    after = '{} < {}'.format(expression, param)
+                else:
+                    after = '({} > {} OR {} IS NULL)'.format(
+                        expression,
+                        param,
+                        expression
+                    )
+                equal = '{} = {}'.format(expression, param)
+            if after is not None:
+                alternatives.append('({})'.format(
+                    ' AND '.join(equals + [after])
+                ))
+            equals.append(equal)
+
+        if not alternatives:
+            return 'false'
+        return '({})'.format(' OR '.join(alternatives))
+
+    def _orderby_clause(self):
+        """Create order by clause.
+
+        :returns: ORDER BY clause
+        :rtype: str
+        """
+        cypher = ' \nORDER BY '
+        ob = []
+        for ob_expression, ob_dir in self._sort_key():
+            ob.append('{} {}'.format(ob_expression, ob_dir))
         cypher += ', '.join(ob)
         return cypher
 
+    def _cursor_clause(self):
+        """Create the return of the sort key when paging by keyset.
+
+        :returns: Additional return item
+        :rtype: str
+        """
+        if not self._keyset:
+            return ''
+        return ', [{}] AS _cursor'.format(
+            ', '.join(e for e, _ in self._sort_key())
+        )
+
     def _skip_clause(self):
         """Create the skip clause
 
@@ -352,14 +626,42 @@ class Query:
             return self._count
 
         query_str = \
-            self._match_clause() + \
-            self._where_clause() + \
+            self._match_clause(returns=False) + \
+            self._where_clause(keyset=False, returns=False) + \
             ' \nRETURN DISTINCT count(*) as total'
-        resp = self._fetch(query_str)
-        record = resp.single()
-        self._count = record['total']
+        self._count = cached(
+            'count',
+            query_str,
+            self.params,
+            lambda: self._single(query_str)['total']
+        )
         return self._count
 
+    def estimate_count(self):
+        """Estimate the number of records from label statistics.
+
+        Unfiltered queries are estimated with the number of nodes of the
+        label, which the database keeps without scanning. Nodes that do
+        not exist at the time of the query are included, so the estimate
+        can be too high. Filtered queries are counted exactly.
+
+        :returns: Tuple of (count, whether the count is approximate)
+        :rtype: tuple
+        """
+        if self.filter_wheres:
+            return self.count(), False
+
+        query_str = 'MATCH (n:{}) RETURN count(n) AS total'.format(
+            self.label
+        )
+        total = cached(
+            'estimate',
+            query_str,
+            {},
+            lambda: self._single(query_str)['total']
+        )
+        return total, True
+
     def __str__(self):
         """Create the cypher query
 
@@ -370,38 +672,93 @@ class Query:
             self._match_clause() + \
             self._where_clause() + \
             self._return_clause() + \
+            self._cursor_clause() + \
             self._orderby_clause() + \
             self._skip_clause() + \
             self._limit_clause()
 
-    def _fetch(self, query_str=None):
+    def _single(self, query_str):
+        """Read the first record of a query while its session is open.
+
+        :param query_str: Query to run
+        :type query_str: str
+        :returns: First record or None
+        :rtype: neo4j.v1.Record|None
+        """
+        records = self._records(query_str)
+        try:
+            return next(records, None)
+        finally:
+            records.close()
+
+    def _records(self, query_str=None):
+        """Yield records of the query as they arrive.
+
+        The session stays open until the generator is exhausted or
+        closed.
+
+        :param query_str: Optional query. Defaults to str(self).
+        :type query_str: str
+        :yields: Records
+        :ytype: neo4j.v1.Record
+        """
         if query_str is None:
             query_str = str(self)
 
-        logger.debug("Running query:")
+        logger.debug("Streaming query:")
         logger.debug(query_str)
 
         with get_connection().session() as session:
             with session.begin_transaction() as tx:
-                resp = tx.run(query_str, **self.params)
-                return resp
+                for record in tx.run(query_str, **self.params):
+                    yield record
 
-    def fetch(self):
-        resp = self._fetch(str(self))
-        rows = []
-        for record in resp:
-            row = {}
-            for label in self.return_labels:
-                obj = {}
-                for key, value in record[label.lower()].items():
+    def _row(self, record):
+        """Convert a record to a row of objects keyed by label.
+
+        :param record: Record of the query
+        :type record: neo4j.v1.Record
+        :returns: Row
+        :rtype: dict
+        """
+        row = {}
+        for label in self.return_labels:
+            obj = {}
+            for key, value in record[label.lower()].items():
+                obj[key] = value
+            if registry.has_state(label):
+                state_key = '{}_state'.format(label.lower())
+                for key, value in record[state_key].items():
                     obj[key] = value
-                if registry.state_properties(label):
-                    state_key = '{}_state'.format(label.lower())
-                    for key, value in record[state_key].items():
-                        obj[key] = value
-                row[label] = obj
-            rows.append(row)
-        return rows
+            row[label] = obj
+        return row
+
+    def stream(self):
+        """Yield rows as records arrive instead of building a list.
+
+        Rows can be processed in constant memory.
+
+        :yields: Rows
+        :ytype: dict
+        """
+        for record in self._records():
+            yield self._row(record)
+
+    def fetch(self):
+        """Execute query and return results.
+
+        Results are served from the query cache when possible.
+
+        :returns: List of rows
+        :rtype: list
+        """
+        query_str = str(self)
+        return cached(
+            'fetch',
+            query_str,
+            self.params,
+            lambda: [self._row(r) for r in self._records(query_str)]
+        )
 
     def page(self, page=1, pagesize=100, index=None):
         if index is not None:
@@ -412,6 +769,62 @@ class Query:
         self.limit(pagesize)
         return self.fetch()
 
+    def page_after(self, after=None, pagesize=100, use_cache=True):
+        """Fetch the page of records following a sort key.
+
+        Instead of skipping records, the query continues from the sort
+        key of the last record of the previous page, so every page costs
+        about the same.
+
+        :param after: Sort key of the last record of the previous page.
+            None for the first page.
+        :type after: list|None
+        :param pagesize: Maximum number of records
+        :type pagesize: int
+        :param use_cache: Whether to serve the page from the query cache
+        :type use_cache: bool
+        :returns: Tuple of (rows, sort key of the last row). The sort key
+            is None when there are no more pages.
+        :rtype: tuple
+        """
+        self._keyset = True
+        self._after = after
+        self.skip(None)
+        self.limit(pagesize)
+        query_str = str(self)
+
+        def _page():
+            rows = []
+            last = None
+            for record in self._records(query_str):
+                rows.append(self._row(record))
+                last = record['_cursor']
+            if len(rows) < pagesize:
+                last = None
+            return rows, last
+
+        if not use_cache:
+            return _page()
+        return cached('page', query_str, self.params, _page)
+
+    def pages(self, pagesize=100, use_cache=True):
+        """Iterate over all records one page at a time.
+
+        :param pagesize: Maximum number of records per page
+        :type pagesize: int
+        :param use_cache: Whether to serve pages from the query cache
+        :type use_cache: bool
+        :yields: Lists of rows
+        :ytype: list
+        """
+        after = None
+        while True:
+            rows, after = self.page_after(after, pagesize, use_cache)
+            if rows:
+                yield rows
+            if after is None:
+                return
+
 
 class ColumnQuery(Query):
     """Query for returning individual properties instead of objects."""
@@ -420,6 +833,7 @@ class ColumnQuery(Query):
         """Init the column query."""
         super(ColumnQuery, self).__init__(label)
         self._columns = OrderedDict()
+        self._column_states = set()
 
     def add_column(self, model, prop, name=None):
         """Add a column to return.
@@ -442,20 +856,28 @@ class ColumnQuery(Query):
         if model not in datapath and model != self.label:
             raise InvalidLabelError(model)
 
-        if prop not in registry.properties(model):
+        if not registry.has_property(model, prop):
             raise InvalidPropertyError(prop, model)
 
         key = '{}.{}'.format(model, prop)
-
-        if prop in registry.state_properties(model):
-            model = _model_state(model)
-
         if name is not None:
             key = name
 
-        self._columns[key] = '{}.{}'.format(model.lower(), prop)
+        self._columns[key] = _property_expression(model, prop)
+
+        state_label = _state_label(model, prop)
+        if state_label is not None:
+            self._column_states.add(state_label)
         return self
 
+    def _return_states(self):
+        """List the labels whose states are read by columns.
+
+        :returns: Set of labels
+        :rtype: set
+        """
+        return set(self._column_states)
+
     def _return_clause(self):
         """Create return clause of query.
 
@@ -467,22 +889,21 @@ class ColumnQuery(Query):
         cypher = '\nRETURN '
 
         parts = []
-        for name, model_dot_prop in self._columns.items():
-            part = '{} AS `{}`'.format(model_dot_prop, name)
+        for name, expression in self._columns.items():
+            part = '{} AS `{}`'.format(expression, name)
             parts.append(part)
         cypher += ', '.join(parts)
         return cypher
 
-    def fetch(self):
-        """Execute query and return results.
+    def _row(self, record):
+        """Convert a record to a row of columns.
 
-        :returns: List of record rows
-        :rtype: list
+        :param record: Record of the query
+        :type record: neo4j.v1.Record
+        :returns: Row
+        :rtype: OrderedDict
         """
-        res = []
-        for record in self._fetch(str(self)):
-            r = OrderedDict()
-            for k in self._columns:
-                r[k] = record[k]
-            res.append(r)
-        return res
+        r = OrderedDict()
+        for k in self._columns:
+            r[k] = record[k]
+        return r
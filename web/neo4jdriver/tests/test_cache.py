@@ -0,0 +1,138 @@
+import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.test import SimpleTestCase
+from django.test import tag
+
+from neo4jdriver import cache as querycache
+from neo4jdriver.query import Query
+
+from .test_query import FakeConnection
+from .test_query import FakeRecords
+
+LOCMEM = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'querycache'
+    }
+}
+
+NOW = 100 * 24 * 60 * 60 * 1000
+DAY = 24 * 60 * 60 * 1000
+
+ENABLED = {'query_cache': {'enabled': True}}
+
+
+@override_settings(CACHES=LOCMEM, NEO4J=ENABLED)
+@mock.patch('neo4jdriver.cache.utils.milliseconds_now', return_value=NOW)
+@mock.patch('neo4jdriver.cache.get_generations')
+class TestQueryCache(SimpleTestCase):
+    """Test caching query results by generation."""
+
+    def setUp(self):
+        cache.clear()
+
+    @tag('unit')
+    def test_disabled(self, m_generations, m_now):
+        """Test that nothing is cached unless enabled."""
+        with self.settings(NEO4J={}):
+            entry = querycache.cache_entry('fetch', 'q', {'time': NOW})
+        self.assertTrue(entry is None)
+
+    @tag('unit')
+    def test_settled(self, m_generations, m_now):
+        """Test that old times are cached forever by epoch."""
+        m_generations.return_value.epoch.return_value = 1
+        key, timeout = querycache.cache_entry(
+            'fetch',
+            'q',
+            {'time': NOW - 2 * DAY}
+        )
+        self.assertTrue(timeout is None)
+        m_generations.return_value.current.assert_not_called()
+
+        # Compaction changes the key.
+        m_generations.return_value.epoch.return_value = 2
+        other, _ = querycache.cache_entry(
+            'fetch',
+            'q',
+            {'time': NOW - 2 * DAY}
+        )
+        self.assertNotEqual(key, other)
+
+    @tag('unit')
+    def test_settled_no_epoch(self, m_generations, m_now):
+        """Test that old times expire without a readable epoch."""
+        m_generations.return_value.epoch.return_value = None
+        _, timeout = querycache.cache_entry(
+            'fetch',
+            'q',
+            {'time': NOW - 2 * DAY}
+        )
+        self.assertEquals(timeout, querycache.DEFAULT_TIMEOUT)
+
+    @tag('unit')
+    def test_generation_tag(self, m_generations, m_now):
+        """Test the generation results at a time are valid for."""
+        m_generations.return_value.epoch.return_value = 3
+        m_generations.return_value.current.return_value = 7
+        self.assertEquals(
+            querycache.generation_tag(NOW - 2 * DAY),
+            'settled-3'
+        )
+        self.assertEquals(querycache.generation_tag(NOW - 1000), 7)
+        m_generations.return_value.current.return_value = None
+        self.assertTrue(querycache.generation_tag(NOW - 1000) is None)
+
+    @tag('unit')
+    def test_live_times_share_key(self, m_generations, m_now):
+        """Test that times close to now are keyed as now."""
+        m_generations.return_value.current.return_value = 3
+        a, _ = querycache.cache_entry('fetch', 'q', {'time': NOW})
+        b, _ = querycache.cache_entry('fetch', 'q', {'time': NOW - 1000})
+        c, _ = querycache.cache_entry('fetch', 'q', {'time': NOW - DAY // 2})
+        self.assertEquals(a, b)
+        self.assertNotEqual(a, c)
+
+    @tag('unit')
+    def test_generation_changes_key(self, m_generations, m_now):
+        """Test that a sync invalidates recent results."""
+        m_generations.return_value.current.return_value = 3
+        a, timeout = querycache.cache_entry('fetch', 'q', {'time': NOW})
+        self.assertEquals(timeout, querycache.DEFAULT_TIMEOUT)
+        m_generations.return_value.current.return_value = 4
+        b, _ = querycache.cache_entry('fetch', 'q', {'time': NOW})
+        self.assertNotEqual(a, b)
+
+    @tag('unit')
+    def test_no_generation(self, m_generations, m_now):
+        """Test that recent results are not cached without generation."""
+        m_generations.return_value.current.return_value = None
+        entry = querycache.cache_entry('fetch', 'q', {'time': NOW})
+        self.assertTrue(entry is None)
+
+    @tag('unit')
+    def test_cached(self, m_generations, m_now):
+        """Test that results are only computed once per key."""
+        m_generations.return_value.current.return_value = 1
+        func = mock.Mock(return_value=[])
+        querycache.cached('fetch', 'q', {'time': NOW}, func)
+        querycache.cached('fetch', 'q', {'time': NOW}, func)
+        self.assertEquals(func.call_count, 1)
+
+        m_generations.return_value.current.return_value = 2
+        querycache.cached('fetch', 'q', {'time': NOW}, func)
+        self.assertEquals(func.call_count, 2)
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.get_connection')
+    def test_query_count(self, m_connection, m_generations, m_now):
+        """Test that counts of identical queries are cached."""
+        m_generations.return_value.current.return_value = 1
+        data = FakeRecords()
+        data.append({'total': 13})
+        m_connection.return_value = FakeConnection([data])
+        self.assertEquals(Query('Environment').time(NOW).count(), 13)
+        self.assertEquals(Query('Environment').time(NOW).count(), 13)
+        self.assertEquals(m_connection.call_count, 1)
@@ -0,0 +1,31 @@
+import mock
+
+from cloud_snitch.models import registry
+from django.test import SimpleTestCase
+from django.test import tag
+from rest_framework.exceptions import ValidationError
+
+from neo4jdriver.fields import ModelChoiceField
+
+
+class TestModelChoiceField(SimpleTestCase):
+    """Test the lazily loaded choice of models."""
+
+    @tag('unit')
+    def test_lazy(self):
+        """Test that declaring the field does not load the registry."""
+        with mock.patch.object(registry, 'load') as m_load:
+            ModelChoiceField(required=False)
+        m_load.assert_not_called()
+
+    @tag('unit')
+    def test_choices(self):
+        """Test that choices are the labels of the models."""
+        field = ModelChoiceField()
+        self.assertEquals(
+            sorted(field.choices.keys()),
+            sorted(registry.models.keys())
+        )
+        self.assertEquals(field.to_internal_value('Host'), 'Host')
+        with self.assertRaises(ValidationError):
+            field.to_internal_value('NotAModel')
@@ -0,0 +1,217 @@
+import mock
+
+from collections import namedtuple
+from django.test import tag
+from django.test import SimpleTestCase
+from django.test import override_settings
+
+from cloud_snitch.instrumentation import InstrumentedDriver
+from cloud_snitch.instrumentation import InstrumentedTransaction
+from cloud_snitch.instrumentation import QueryRecorder
+from cloud_snitch.instrumentation import db_hits
+from cloud_snitch.instrumentation import is_read_only
+from cloud_snitch.instrumentation import template
+from neo4jdriver.connection import Connection
+
+from . import base  # noqa f401
+
+FakePlan = namedtuple('FakePlan', ['db_hits', 'children'])
+
+
+class FakeSummary:
+
+    def __init__(self, profile):
+        self.profile = profile
+
+
+class FakeResult:
+
+    def __init__(self, rows, profile=None):
+        self.rows = rows
+        self.profile = profile
+        self.buffered = 0
+
+    def __iter__(self):
+        for i in range(self.rows):
+            yield {'i': i}
+
+    def detach(self):
+        self.buffered = self.rows
+        return self.rows
+
+    def summary(self):
+        self.detach()
+        return FakeSummary(self.profile)
+
+
+class FakeTransaction:
+
+    def __init__(self, rows=3, profile=None):
+        self.rows = rows
+        self.profile = profile
+        self.statements = []
+        self.results = []
+
+    def run(self, statement, parameters=None):
+        self.statements.append((statement, parameters))
+        self.results.append(FakeResult(self.rows, self.profile))
+        return self.results[-1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeRandom:
+
+    def random(self):
+        return 0.0
+
+
+class TestHelpers(SimpleTestCase):
+
+    @tag('unit')
+    def test_template(self):
+        """Test whitespace is collapsed into a template."""
+        self.assertEqual(
+            template('\n  MATCH (n)\n    RETURN n  '),
+            'MATCH (n) RETURN n'
+        )
+
+    @tag('unit')
+    def test_is_read_only(self):
+        """Test detection of statements that are safe to re-run."""
+        self.assertTrue(is_read_only('MATCH (n) RETURN n'))
+        self.assertFalse(is_read_only('MERGE (n:Host {a: $a})'))
+        self.assertFalse(is_read_only('MATCH (n) SET n.a = 1'))
+        self.assertFalse(is_read_only('PROFILE MATCH (n) RETURN n'))
+
+    @tag('unit')
+    def test_db_hits(self):
+        """Test db hits are summed over the plan tree."""
+        plan = FakePlan(5, [FakePlan(3, []), FakePlan(2, [FakePlan(1, [])])])
+        self.assertEqual(db_hits(plan), 11)
+        self.assertEqual(db_hits(None), 0)
+
+
+class TestInstrumentedTransaction(SimpleTestCase):
+
+    @tag('unit')
+    def test_records_stats(self):
+        """Test stats are aggregated by template."""
+        recorder = QueryRecorder()
+        tx = InstrumentedTransaction(FakeTransaction(rows=3), recorder)
+        list(tx.run('MATCH (n)  RETURN n', identity='abc'))
+        tx.run('MATCH (n)\nRETURN n', {'identity': 'abcdef'}).consume()
+
+        summary = recorder.summary()
+        self.assertEqual(len(summary), 1)
+        self.assertEqual(summary[0]['template'], 'MATCH (n) RETURN n')
+        self.assertEqual(summary[0]['count'], 2)
+        self.assertEqual(summary[0]['rows'], 6)
+        self.assertEqual(summary[0]['max_parameter_size'], 6)
+        self.assertEqual(summary[0]['profiled'], 0)
+
+    @tag('unit')
+    @mock.patch('cloud_snitch.instrumentation.slow_logger')
+    def test_slow_query_log(self, m_logger):
+        """Test queries above the threshold are logged."""
+        recorder = QueryRecorder(slow_query_ms=0)
+        tx = InstrumentedTransaction(FakeTransaction(), recorder)
+        list(tx.run('MATCH (n) RETURN n'))
+        self.assertTrue(m_logger.warning.called)
+
+        m_logger.reset_mock()
+        recorder.slow_query_ms = None
+        list(tx.run('MATCH (n) RETURN n'))
+        self.assertFalse(m_logger.warning.called)
+
+    @tag('unit')
+    def test_profile_reads_only(self):
+        """Test that only read statements are profiled."""
+        recorder = QueryRecorder(profile_sample_rate=1.0, rng=FakeRandom())
+        fake_tx = FakeTransaction(profile=FakePlan(4, []))
+        tx = InstrumentedTransaction(fake_tx, recorder)
+
+        result = tx.run('MATCH (n) RETURN n')
+        self.assertEqual(len(fake_tx.statements), 1)
+        list(result)
+        self.assertEqual(len(fake_tx.statements), 2)
+        self.assertEqual(
+            fake_tx.statements[1][0],
+            'PROFILE MATCH (n) RETURN n'
+        )
+        self.assertEqual(fake_tx.results[0].buffered, 0)
+        self.assertEqual(fake_tx.results[1].buffered, 3)
+
+        list(tx.run('MERGE (n:Host {a: $a})', a=1))
+        self.assertEqual(len(fake_tx.statements), 3)
+
+        stats = {s['template']: s for s in recorder.summary()}
+        self.assertEqual(stats['MATCH (n) RETURN n']['avg_db_hits'], 4.0)
+        self.assertIsNone(stats['MERGE (n:Host {a: $a})']['avg_db_hits'])
+
+    @tag('unit')
+    def test_streams_records(self):
+        """Test records are not buffered and recorded when exhausted."""
+        recorder = QueryRecorder()
+        fake_tx = FakeTransaction(rows=2)
+        tx = InstrumentedTransaction(fake_tx, recorder)
+        records = iter(tx.run('MATCH (n) RETURN n'))
+        next(records)
+        self.assertEqual(recorder.summary(), [])
+        next(records)
+        self.assertEqual(recorder.summary(), [])
+        self.assertEqual(list(records), [])
+        self.assertEqual(recorder.summary()[0]['rows'], 2)
+        self.assertEqual(fake_tx.results[0].buffered, 0)
+
+    @tag('unit')
+    def test_single(self):
+        """Test single records the statement."""
+        recorder = QueryRecorder()
+        tx = InstrumentedTransaction(FakeTransaction(rows=1), recorder)
+        self.assertEqual(tx.run('MATCH (n) RETURN n').single(), {'i': 0})
+        self.assertEqual(recorder.summary()[0]['count'], 1)
+
+    @tag('unit')
+    def test_unfinished_recorded_on_exit(self):
+        """Test partially read results are recorded when the tx ends."""
+        recorder = QueryRecorder()
+        with InstrumentedTransaction(FakeTransaction(rows=5), recorder) \
+                as tx:
+            next(iter(tx.run('MATCH (n) RETURN n')))
+            self.assertEqual(recorder.summary(), [])
+        summary = recorder.summary()
+        self.assertEqual(summary[0]['count'], 1)
+        self.assertEqual(summary[0]['rows'], 1)
+
+
+class TestConnection(SimpleTestCase):
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.connection.GraphDatabase')
+    def test_not_instrumented_by_default(self, m_graph):
+        """Test the driver is not wrapped without settings."""
+        conn = Connection()
+        self.assertIsNone(conn.recorder)
+        self.assertFalse(isinstance(conn.driver, InstrumentedDriver))
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.connection.GraphDatabase')
+    def test_instrumented(self, m_graph):
+        """Test the driver is wrapped when enabled."""
+        neo4j = {
+            'instrumentation': {
+                'enabled': True,
+                'slow_query_ms': 10,
+                'profile_sample_rate': 0.5
+            }
+        }
+        with override_settings(NEO4J=neo4j):
+            conn = Connection()
+        self.assertTrue(isinstance(conn.driver, InstrumentedDriver))
+        self.assertEqual(conn.recorder.slow_query_ms, 10)
+        self.assertEqual(conn.recorder.profile_sample_rate, 0.5)
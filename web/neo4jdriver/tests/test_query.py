@@ -3,10 +3,13 @@ import mock
 from django.test import tag
 from django.test import TestCase
 
+from neo4jdriver.exceptions import InvalidCursorError
 from neo4jdriver.exceptions import InvalidLabelError
 from neo4jdriver.exceptions import InvalidPropertyError
 from neo4jdriver.query import ColumnQuery
 from neo4jdriver.query import Query
+from neo4jdriver.query import decode_cursor
+from neo4jdriver.query import encode_cursor
 
 from . import base  # noqa f401
 
@@ -171,6 +174,18 @@ class TestQuery(TestCase):
         expected = 'ORDER BY host_state.kernel DESC'
         self.assertTrue(expected in str(q))
 
+    @tag('unit')
+    def test_orderby_blob_property(self):
+        """Test orderby on a blob property."""
+        q = Query('Configfile')
+        q.orderby('contents', 'ASC', label='Configfile')
+        expected = (
+            'ORDER BY head([(configfile_contents:ConfigfileBlob '
+            '{ md5: configfile_state.md5 }) | configfile_contents.contents]) '
+            'ASC'
+        )
+        self.assertTrue(expected in str(q))
+
     @tag('unit')
     def test_limit_none(self):
         """Test query where no limit has been set."""
@@ -216,6 +231,18 @@ class TestQuery(TestCase):
         expected = 'WHERE environment.account_number = $filterval0'
         self.assertTrue(expected in str(q))
 
+    @tag('unit')
+    def test_filter_blob_property(self):
+        """Test filtering on a blob property."""
+        q = Query('Configfile')
+        q.filter('contents', 'CONTAINS', 'volume_driver')
+        expected = (
+            'WHERE head([(configfile_contents:ConfigfileBlob '
+            '{ md5: configfile_state.md5 }) | configfile_contents.contents]) '
+            'CONTAINS $filterval0'
+        )
+        self.assertTrue(expected in str(q))
+
     @tag('unit')
     def test_filter_invalid_label(self):
         """Test filtering with invalid label."""
@@ -237,11 +264,100 @@ class TestQuery(TestCase):
         q.filter('hostname', '=', 'somehostname')
         q.filter('kernel', '=', 'somekernel')
         expected = (
-            'WHERE host.hostname = $filterval0 AND '
-            'host_state.kernel = $filterval1'
+            'MATCH (host:Host) WHERE host.hostname = $filterval0 '
         )
+        self.assertTrue(str(q).startswith(expected))
+        expected = 'WHERE host_state.kernel = $filterval1'
         self.assertTrue(expected in str(q))
 
+    @tag('unit')
+    def test_anchor_identity(self):
+        """Test that the match starts from an identity filter."""
+        q = ColumnQuery('PythonPackage')
+        q.add_column('PythonPackage', 'version')
+        q.filter('name', 'STARTS WITH', 'neutron')
+        q.filter('hostname', '=', 'somehost', label='Host')
+        expected = (
+            "MATCH (host:Host) WHERE host.hostname = $filterval1 "
+            "\nMATCH (environment:Environment)-[r0:HAS_HOST]->(host:Host)"
+            "-[r1:HAS_VIRTUALENV]->(virtualenv:Virtualenv)"
+            "-[r2:HAS_PYTHON_PACKAGE]->(pythonpackage:PythonPackage) "
+            "\nWHERE pythonpackage.name STARTS WITH $filterval0 AND "
+        )
+        self.assertTrue(str(q).startswith(expected))
+
+    @tag('unit')
+    def test_anchor_concat_property(self):
+        """Test that indexed properties anchor only without identity."""
+        q = Query('Environment').filter('name', '=', 'env')
+        self.assertTrue(str(q).startswith('MATCH (environment:Environment)'))
+        self.assertTrue('WHERE environment.name = $filterval0' in str(q))
+
+        q = Query('Host')
+        q.filter('name', '=', 'env', label='Environment')
+        expected = (
+            "MATCH (environment:Environment) "
+            "WHERE environment.name = $filterval0 \n"
+        )
+        self.assertTrue(str(q).startswith(expected))
+
+        q.identity('somehost')
+        expected = (
+            "MATCH (host:Host) "
+            "WHERE host.hostname_environment = $filterval1 \n"
+        )
+        self.assertTrue(str(q).startswith(expected))
+
+    @tag('unit')
+    def test_no_anchor(self):
+        """Test that range filters do not anchor the match."""
+        q = Query('Host')
+        q.filter('hostname', 'STARTS WITH', 'some')
+        self.assertTrue(str(q).startswith('MATCH (environment:Environment)'))
+
+    @tag('unit')
+    def test_column_state_pruning(self):
+        """Test that unused states are not joined."""
+        q = ColumnQuery('PythonPackage')
+        q.add_column('Host', 'hostname')
+        q.add_column('PythonPackage', 'name')
+        self.assertFalse('HAS_STATE' in str(q))
+        self.assertFalse('_state.from' in str(q))
+
+        q.add_column('Host', 'kernel')
+        expected = (
+            "\nMATCH (host)-[r_host_state:HAS_STATE]->(host_state:HostState)"
+            " \nWHERE "
+        )
+        self.assertTrue(expected in str(q))
+
+    @tag('unit')
+    def test_filter_and_order_states(self):
+        """Test that filtered and ordered states are joined."""
+        q = ColumnQuery('Configfile')
+        q.add_column('Configfile', 'path')
+        q.filter('kernel', '=', 'somekernel', label='Host')
+        self.assertTrue('host_state:HostState' in str(q))
+        self.assertFalse('configfile_state' in str(q))
+
+        q.orderby('md5', 'ASC')
+        self.assertTrue('configfile_state:ConfigfileState' in str(q))
+
+    @tag('unit')
+    @mock.patch(
+        'neo4jdriver.query.Query._records',
+        side_effect=lambda query_str: (r for r in [{'total': 3}])
+    )
+    def test_count_states(self, m_records):
+        """Test that counts only join filtered states."""
+        q = Query('Configfile')
+        q.filter('kernel', '=', 'somekernel', label='Host')
+        self.assertEquals(q.count(), 3)
+        query_str = m_records.call_args[0][0]
+        self.assertTrue('host_state:HostState' in query_str)
+        self.assertFalse('configfile_state' in query_str)
+        self.assertTrue('configfile_state' in str(q))
+
     @tag('unit')
     def test_rel_filters(self):
         """Test adding time filters on relationships."""
@@ -263,6 +379,23 @@ class TestQuery(TestCase):
         q = Query('Environment')
         self.assertEquals(q.count(), 13)
 
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.get_connection')
+    def test_estimate_count(self, m_connection):
+        """Tests estimating the count of unfiltered queries."""
+        data = FakeRecords()
+        data.append({'total': 40})
+        m_connection.return_value = FakeConnection([data])
+        q = Query('Host')
+        self.assertEquals(q.estimate_count(), (40, True))
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.Query.count', return_value=3)
+    def test_estimate_count_filtered(self, m_count):
+        """Tests that filtered queries are counted exactly."""
+        q = Query('Host').identity('host')
+        self.assertEquals(q.estimate_count(), (3, False))
+
     @tag('unit')
     @mock.patch('neo4jdriver.query.Query.fetch')
     def test_page_defaults(self, m_fetch):
@@ -308,6 +441,157 @@ class TestQuery(TestCase):
         expected = "LIMIT 500"
         self.assertTrue(expected in str(q))
 
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.get_connection')
+    def test_page_after_first_page(self, m_connection):
+        """Test that the first keyset page has no keyset condition."""
+        m_connection.return_value = FakeConnection([FakeRecords()])
+        q = Query('Host')
+        rows, last = q.page_after(pagesize=500)
+        self.assertEquals(rows, [])
+        self.assertTrue(last is None)
+        self.assertFalse('$after0' in str(q))
+        self.assertFalse('SKIP' in str(q))
+        self.assertTrue('LIMIT 500' in str(q))
+        expected = (
+            'ORDER BY host.hostname_environment ASC, '
+            'environment.account_number_name ASC'
+        )
+        self.assertTrue(expected in str(q))
+        expected = (
+            'RETURN environment, host, host_state, '
+            '[host.hostname_environment, environment.account_number_name] '
+            'AS _cursor'
+        )
+        self.assertTrue(expected in str(q))
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.get_connection')
+    def test_page_after_key(self, m_connection):
+        """Test the keyset condition of a following page."""
+        m_connection.return_value = FakeConnection([FakeRecords()])
+        q = Query('Host')
+        q.orderby('kernel', 'DESC')
+        q.page_after(['4.4', 'a', 'a-b'], pagesize=2)
+        expected = (
+            '((host_state.kernel < $after0) OR '
+            '(host_state.kernel = $after0 AND '
+            '(environment.account_number_name > $after1 OR '
+            'environment.account_number_name IS NULL)) OR '
+            '(host_state.kernel = $after0 AND '
+            'environment.account_number_name = $after1 AND '
+            '(host.hostname_environment > $after2 OR '
+            'host.hostname_environment IS NULL)))'
+        )
+        self.assertTrue(expected in str(q))
+        self.assertEquals(q.params['after0'], '4.4')
+        self.assertEquals(q.params['after2'], 'a-b')
+
+    @tag('unit')
+    def test_keyset_null_values(self):
+        """Test that null key values are compared with IS NULL."""
+        q = Query('Host')
+        q.orderby('kernel', 'ASC')
+        q._keyset = True
+        q._after = [None, 'a', 'a-b']
+        expected = (
+            '((host_state.kernel IS NULL AND '
+            '(environment.account_number_name > $after1 OR '
+            'environment.account_number_name IS NULL)) OR '
+        )
+        self.assertTrue(expected in str(q))
+
+    @tag('unit')
+    def test_keyset_wrong_length(self):
+        """Test that a key of the wrong length is rejected."""
+        q = Query('Host')
+        q._keyset = True
+        q._after = ['a-b']
+        with self.assertRaises(InvalidCursorError):
+            str(q)
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.get_connection')
+    def test_pages(self, m_connection):
+        """Test iterating over keyset pages."""
+        page_one = FakeRecords([
+            {'environment': {'account_number_name': 'a'}, '_cursor': ['a']},
+            {'environment': {'account_number_name': 'b'}, '_cursor': ['b']}
+        ])
+        page_two = FakeRecords([
+            {'environment': {'account_number_name': 'c'}, '_cursor': ['c']}
+        ])
+        m_connection.return_value = FakeConnection([page_one, page_two])
+        q = Query('Environment')
+        pages = list(q.pages(pagesize=2))
+        self.assertEquals(len(pages), 2)
+        self.assertEquals(
+            pages[1],
+            [{'Environment': {'account_number_name': 'c'}}]
+        )
+        self.assertEquals(q.params['after0'], 'b')
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.cached')
+    @mock.patch('neo4jdriver.query.get_connection')
+    def test_pages_without_cache(self, m_connection, m_cached):
+        """Test that pages can bypass the query cache."""
+        page = FakeRecords([
+            {'environment': {'account_number_name': 'a'}, '_cursor': ['a']}
+        ])
+        m_connection.return_value = FakeConnection([page])
+        pages = list(Query('Environment').pages(pagesize=2, use_cache=False))
+        self.assertEquals(len(pages), 1)
+        self.assertEquals(m_cached.call_count, 0)
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.get_connection')
+    def test_stream(self, m_connection):
+        """Test that rows are yielded one record at a time."""
+        records = FakeRecords([
+            {'environment': {'account_number_name': 'a'}},
+            {'environment': {'account_number_name': 'b'}}
+        ])
+        m_connection.return_value = FakeConnection([records])
+        stream = Query('Environment').stream()
+        self.assertEquals(
+            next(stream),
+            {'Environment': {'account_number_name': 'a'}}
+        )
+        self.assertEquals(
+            list(stream),
+            [{'Environment': {'account_number_name': 'b'}}]
+        )
+
+    @tag('unit')
+    @mock.patch('neo4jdriver.query.get_connection')
+    def test_column_stream(self, m_connection):
+        """Test streaming rows of columns."""
+        records = FakeRecords([
+            {'Environment.name': 'a', 'extra': 1},
+            {'Environment.name': 'b', 'extra': 2}
+        ])
+        m_connection.return_value = FakeConnection([records])
+        q = ColumnQuery('Environment').add_column('Environment', 'name')
+        self.assertEquals(
+            [dict(r) for r in q.stream()],
+            [{'Environment.name': 'a'}, {'Environment.name': 'b'}]
+        )
+
+    @tag('unit')
+    def test_cursor_roundtrip(self):
+        """Test encoding and decoding continuation tokens."""
+        key = ['a', 1, None, True]
+        self.assertEquals(decode_cursor(encode_cursor(key)), key)
+
+    @tag('unit')
+    def test_invalid_cursor(self):
+        """Test that malformed continuation tokens are rejected."""
+        with self.assertRaises(InvalidCursorError):
+            decode_cursor('not a cursor')
+        with self.assertRaises(InvalidCursorError):
+            decode_cursor(encode_cursor({'a': 1}))
+
 
 class TestColumnQuery(TestCase):
     """Test the column query."""
@@ -357,3 +641,15 @@ class TestColumnQuery(TestCase):
             "\nORDER BY host.hostname_environment ASC"
         )
         self.assertEquals(expected, str(q))
+
+    @tag('unit')
+    def test_blob_column(self):
+        """Test that blob columns are read from the blob node."""
+        q = ColumnQuery('Configfile')
+        q.add_column('Configfile', 'contents')
+        expected = (
+            "RETURN head([(configfile_contents:ConfigfileBlob "
+            "{ md5: configfile_state.md5 }) | configfile_contents.contents]) "
+            "AS `Configfile.contents`"
+        )
+        self.assertTrue(expected in str(q))
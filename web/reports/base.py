@@ -46,13 +46,21 @@ class BaseReport:
             data['form_data'] = cls.serializer_class().form_data()
         return data
 
+    def rows(self):
+        """Yield the rows of the report as they are computed.
+
+        :yields: Rows
+        :ytype: dict
+        """
+        return iter([])
+
     def run(self):
         """Do the report.
 
         :returns: List of rows
         :rtype: list
         """
-        return []
+        return list(self.rows())
 
     def columns(self):
         """Compute list of columns for the report.
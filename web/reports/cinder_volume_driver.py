@@ -92,11 +92,11 @@ class CinderVolumeDriverReport(BaseReport):
         d['driver'] = driver
         return d
 
-    def run(self):
+    def rows(self):
         """Run the report.
 
-        :returns: List of report rows
-        :rtype: List of ordereddicts
+        :yields: Report rows
+        :ytype: OrderedDict
         """
         q = ColumnQuery('Configfile')
         q.time(self.data['time'])
@@ -105,18 +105,16 @@ class CinderVolumeDriverReport(BaseReport):
             q.orderby(column['prop'], 'ASC', label=column['model'])
         q.filter('name', '=', 'cinder.conf', label='Configfile')
 
-        records = []
-        pagesize = 500
-        page = 1
-        page_rows = q.page(page, pagesize)
-        while(page_rows):
-            for row in page_rows:
-                for s, d in parse_contents(row['Configfile.contents']):
-                    records.append(self._record_from_row(row, s, d))
-            page += 1
-            page_rows = q.page(page, pagesize)
-
-        return records
+        for row in q.stream():
+            # Contents are missing until compaction moves them to blobs.
+            contents = row['Configfile.contents']
+            if contents is None:
+                logger.debug("No contents for cinder.conf on {}".format(
+                    row['Host.hostname']
+                ))
+                continue
+            for s, d in parse_contents(contents):
+                yield self._record_from_row(row, s, d)
 
     def columns(self):
         """Gets columns for this report. useful for csv serialization.
@@ -1,5 +1,4 @@
-from cloud_snitch.models import registry
-from rest_framework.serializers import ChoiceField
+from neo4jdriver.fields import ModelChoiceField
 from rest_framework.serializers import IntegerField
 from rest_framework.serializers import ListField
 from rest_framework.serializers import Serializer
@@ -9,8 +8,6 @@ from neo4jdriver.query import ColumnQuery
 from .base import BaseReport
 from .serializers import ModelPropertySerializer
 
-_models = [m.label for m in registry.models.values()]
-
 
 class GenericSerializer(Serializer):
 
@@ -21,8 +18,7 @@ class GenericSerializer(Serializer):
         help_text='Point of time to run report.'
     )
 
-    model = ChoiceField(
-        _models,
+    model = ModelChoiceField(
         label="Model",
         default='Environment',
         help_text=(
@@ -81,7 +77,7 @@ class GenericReport(BaseReport):
 
     serializer_class = GenericSerializer
 
-    def run(self):
+    def rows(self):
 
         q = ColumnQuery(self.data['model'])
         q.time(self.data['time'])
@@ -89,16 +85,8 @@ class GenericReport(BaseReport):
             q.add_column(column['model'], column['prop'])
             q.orderby(column['prop'], 'ASC', label=column['model'])
 
-        rows = []
-        pagesize = 5000
-        page = 1
-        page_rows = q.page(page, pagesize)
-        while(page_rows):
-            rows += page_rows
-            page += 1
-            page_rows = q.page(page, pagesize)
-
-        return rows
+        for row in q.stream():
+            yield row
 
     def columns(self):
         """Gets columns for this report. useful for csv serialization.
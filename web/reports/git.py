@@ -38,15 +38,9 @@ class GitSerializer(Serializer):
         q.add_column('GitUrl', 'url', 'url')
         q.orderby('url', 'ASC', label='GitUrl')
         urls = []
-
-        page = 1
-        pagesize = 1000
-        page_rows = q.page(page, pagesize)
-        while(page_rows):
+        for page_rows in q.pages(1000):
             for row in page_rows:
                 urls.append(row['url'])
-            page += 1
-            page_rows = q.page(page, pagesize)
         return urls
 
     def form_data(self):
@@ -92,7 +86,7 @@ class GitReport(BaseReport):
         {'model': 'GitUrl', 'prop': 'url'}
     ]
 
-    def run(self):
+    def rows(self):
 
         q = ColumnQuery('GitUrl')
         q.time(self.data['time'])
@@ -101,16 +95,8 @@ class GitReport(BaseReport):
             q.orderby(column['prop'], 'ASC', label=column['model'])
         q.filter('url', '=', self.data['url'], label='GitUrl')
 
-        rows = []
-        pagesize = 5000
-        page = 1
-        page_rows = q.page(page, pagesize)
-        while(page_rows):
-            rows += page_rows
-            page += 1
-            page_rows = q.page(page, pagesize)
-
-        return rows
+        for row in q.stream():
+            yield row
 
     def columns(self):
         """Gets columns for this report. useful for csv serialization.
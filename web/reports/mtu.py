@@ -36,10 +36,14 @@ class MTUQuery(Query):
         self._skip = None
         self._limit = None
         self._count = None
+        self._keyset = False
+        self._after = None
 
-    def _match_clause(self):
+    def _match_clause(self, returns=True):
         """Create the match clause of the query.
 
+        :param returns: Unused, every match is needed to count
+        :type returns: bool
         :returns: Cipher string containing match clause.
         :rtype: str
         """
@@ -56,9 +60,13 @@ class MTUQuery(Query):
         )
         return cipher
 
-    def _where_clause(self):
+    def _where_clause(self, keyset=True, returns=True):
         """Create the where clause of the query.
 
+        :param keyset: Whether or not to continue after self._after
+        :type keyset: bool
+        :param returns: Unused, every condition is needed to count
+        :type returns: bool
         :returns: Cipher string containing where clause.
         :rtype: str
         """
@@ -75,6 +83,8 @@ class MTUQuery(Query):
             "\n\tr_ci.from <= $time < r_ci.to AND"
             "\n\tr_cis.from <= $time < r_cis.to"
         )
+        if keyset and self._after is not None:
+            cipher += " AND\n\t" + self._keyset_condition()
         return cipher
 
     def _return_clause(self):
@@ -97,34 +107,31 @@ class MTUQuery(Query):
         )
         return cipher
 
-    def _orderby_clause(self):
-        """Create the order by clause of the query.
+    def _sort_key(self):
+        """List the expressions records are ordered by.
 
-        :returns: Cipher string containing the orderby clause.
-        :rtype: str
+        :returns: List of (expression, direction) tuples
+        :rtype: list
         """
-        cipher = (
-            "\nORDER BY"
-            "\n\t`Account Name` ASC,"
-            "\n\t`Account Number` ASC,"
-            "\n\t`Hostname` ASC,"
-            "\n\t`Device` ASC"
-        )
-        return cipher
+        return [
+            ('e.name', 'ASC'),
+            ('e.account_number', 'ASC'),
+            ('h.hostname', 'ASC'),
+            ('i.device', 'ASC')
+        ]
 
-    def fetch(self):
-        """Execute query and return results.
+    def _row(self, record):
+        """Convert a record to a row of columns.
 
-        :returns: List of record rows
-        :rtype: list
+        :param record: Record of the query
+        :type record: neo4j.v1.Record
+        :returns: Row
+        :rtype: OrderedDict
         """
-        res = []
-        for record in self._fetch(str(self)):
-            r = OrderedDict()
-            for k in self.columns:
-                r[k] = record[k]
-            res.append(r)
-        return res
+        r = OrderedDict()
+        for k in self.columns:
+            r[k] = record[k]
+        return r
 
 
 class MTUSerializer(Serializer):
@@ -188,19 +195,11 @@ class MTUReport(BaseReport):
                 row[col] = False
         return row
 
-    def run(self):
-        """Build the query and run the report."""
+    def rows(self):
+        """Build the query and yield rows of the report."""
         q = MTUQuery(self.data['time'], default=1500)
-        rows = []
-        pagesize = 5000
-        page = 1
-        page_rows = q.page(page, pagesize)
-        while(page_rows):
-            for row in page_rows:
-                rows.append(self.clean_row(row))
-            page += 1
-            page_rows = q.page(page, pagesize)
-        return rows
+        for row in q.stream():
+            yield self.clean_row(row)
 
     def columns(self):
         """Get columns for this report.
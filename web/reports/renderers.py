@@ -0,0 +1,84 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class _Echo:
+    """File like object returning what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+class StreamingRenderer(BaseRenderer):
+    """Renderer that can also render rows one at a time."""
+
+    charset = 'utf-8'
+
+    def stream(self, rows, header=None):
+        """Render rows lazily.
+
+        :param rows: Iterable of row dicts
+        :type rows: iterable
+        :param header: Optional list of columns
+        :type header: list|None
+        :yields: Rendered chunks
+        :ytype: str
+        """
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render data that is not streamed, like errors.
+
+        :param data: List of rows or a single dict
+        :type data: list|dict
+        :returns: Rendered data
+        :rtype: str
+        """
+        header = (renderer_context or {}).get('header')
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(self.stream(rows, header))
+
+
+class CSVRenderer(StreamingRenderer):
+    """Render rows as csv with a header line."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def _cell(self, value):
+        """Convert a value to a csv cell.
+
+        :param value: Value of a column
+        :type value: object
+        :returns: Cell value
+        :rtype: object
+        """
+        if value is None:
+            return ''
+        if isinstance(value, (list, dict)):
+            return json.dumps(value, cls=JSONEncoder)
+        return value
+
+    def stream(self, rows, header=None):
+        writer = csv.writer(_Echo())
+        if header is not None:
+            yield writer.writerow(header)
+        for row in rows:
+            if header is None:
+                header = list(row.keys())
+                yield writer.writerow(header)
+            yield writer.writerow([self._cell(row.get(c)) for c in header])
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """Render rows as newline delimited json objects."""
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def stream(self, rows, header=None):
+        for row in rows:
+            yield json.dumps(row, cls=JSONEncoder) + '\n'
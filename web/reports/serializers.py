@@ -1,16 +1,13 @@
 from cloud_snitch.models import registry
+from neo4jdriver.fields import ModelChoiceField
 from rest_framework.serializers import BaseSerializer
-from rest_framework.serializers import ChoiceField
+from rest_framework.serializers import CharField
 from rest_framework.serializers import IntegerField
 from rest_framework.serializers import Serializer
 from rest_framework.serializers import SlugField
 from rest_framework.serializers import ValidationError
 
 
-# Model fields present a choice of available models
-_models = [m.label for m in registry.models.values()]
-
-
 class ReportSerializer(BaseSerializer):
     """Serializer for information about reports."""
 
@@ -31,6 +28,16 @@ class ReportDataSerializer(BaseSerializer):
         return obj
 
 
+class ReportJobSerializer(Serializer):
+    """Serializer for referring to a report job."""
+    job = CharField(max_length=64, required=True)
+
+
+class ReportJobPageSerializer(ReportJobSerializer):
+    """Serializer for requesting a page of results of a report job."""
+    page = IntegerField(min_value=1, required=False, default=1)
+
+
 def time_field(required=True):
     """Returns an integer field appropriate for millisecond timestamps.
 
@@ -75,10 +82,10 @@ def model_field(required=True):
 
     :param required: Is the field required?
     :type required: bool
-    :return: ChoiceField
-    :rtype: ChoiceField
+    :return: ModelChoiceField
+    :rtype: ModelChoiceField
     """
-    return ChoiceField(_models, required=required)
+    return ModelChoiceField(required=required)
 
 
 def property_field(max_length=256, required=True):
@@ -115,12 +122,12 @@ class ModelPropertySerializer(Serializer):
         :param data: Data to validate
         :type data: dict
         """
-        if data['model'] not in _models:
+        if data['model'] not in registry.models:
             raise ValidationError(
                 'Model {} is not a valid model.'.format(data['model'])
             )
 
-        if data['prop'] not in registry.properties(data['model']):
+        if not registry.has_property(data['model'], data['prop']):
             raise ValidationError(
                 '{} is not a valid property of model {}'
                 .format(data['prop'], data['model'])
@@ -0,0 +1,187 @@
+from __future__ import absolute_import, unicode_literals
+
+import hashlib
+import json
+import logging
+
+from celery import shared_task
+
+from django.core.cache import cache
+from rest_framework.utils.encoders import JSONEncoder
+
+from .registry import REGISTRY as report_registry
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_FINISHED = 'finished'
+STATUS_ERROR = 'error'
+
+TIMEOUT = 60 * 60 * 24
+ERROR_TIMEOUT = 60 * 5
+
+# Number of rows stored per page of results
+PAGESIZE = 5000
+
+
+def job_id(report_name, data):
+    """Compute the id of a report job from its name and parameters.
+
+    Identical requests have identical ids.
+
+    :param report_name: Name of the report
+    :type report_name: str
+    :param data: Validated report parameters
+    :type data: dict
+    :returns: Hex digest
+    :rtype: str
+    """
+    raw = json.dumps([report_name, data], sort_keys=True, cls=JSONEncoder)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _job_key(job):
+    """Cache key of the state of a job.
+
+    :param job: Id of the job
+    :type job: str
+    :returns: Cache key
+    :rtype: str
+    """
+    return 'reportjob-{}'.format(job)
+
+
+def _page_key(job, page):
+    """Cache key of a page of results of a job.
+
+    :param job: Id of the job
+    :type job: str
+    :param page: Page number starting at 1
+    :type page: int
+    :returns: Cache key
+    :rtype: str
+    """
+    return 'reportjob-{}-page-{}'.format(job, page)
+
+
+def _state(job, status, columns, rows=0, pages=0):
+    """Build the state of a job.
+
+    :param job: Id of the job
+    :type job: str
+    :param status: One of the STATUS_ constants
+    :type status: str
+    :param columns: Columns of the report
+    :type columns: list
+    :param rows: Number of rows stored so far
+    :type rows: int
+    :param pages: Number of pages stored so far
+    :type pages: int
+    :returns: State of the job
+    :rtype: dict
+    """
+    return {
+        'job': job,
+        'status': status,
+        'columns': columns,
+        'rows': rows,
+        'pages': pages,
+        'pagesize': PAGESIZE
+    }
+
+
+@shared_task
+def _run_report(job, report_name, data):
+    """Asynchronous task running a report and storing pages of rows.
+
+    :param job: Id of the job
+    :type job: str
+    :param report_name: Name of the report
+    :type report_name: str
+    :param data: Report parameters
+    :type data: dict
+    """
+    key = _job_key(job)
+    columns = []
+    rows = 0
+    pages = 0
+    try:
+        report = report_registry.find(report_name)(data)
+        columns = report.columns()
+        cache.set(key, _state(job, STATUS_RUNNING, columns), TIMEOUT)
+
+        page = []
+        for row in report.rows():
+            page.append(row)
+            if len(page) == PAGESIZE:
+                pages += 1
+                rows += len(page)
+                cache.set(_page_key(job, pages), page, TIMEOUT)
+                cache.set(
+                    key,
+                    _state(job, STATUS_RUNNING, columns, rows, pages),
+                    TIMEOUT
+                )
+                page = []
+        if page or not pages:
+            pages += 1
+            rows += len(page)
+            cache.set(_page_key(job, pages), page, TIMEOUT)
+        cache.set(
+            key,
+            _state(job, STATUS_FINISHED, columns, rows, pages),
+            TIMEOUT
+        )
+    except Exception:
+        logger.exception('Unable to complete report {}.'.format(report_name))
+        cache.set(
+            key,
+            _state(job, STATUS_ERROR, columns, rows, pages),
+            ERROR_TIMEOUT
+        )
+
+
+def start_report(report_name, data):
+    """Start a report job unless an identical job exists.
+
+    :param report_name: Name of the report
+    :type report_name: str
+    :param data: Validated report parameters
+    :type data: dict
+    :returns: State of the new or existing job
+    :rtype: dict
+    """
+    job = job_id(report_name, data)
+    state = _state(job, STATUS_QUEUED, [])
+
+    # add() only succeeds for the first of concurrent identical requests.
+    if cache.add(_job_key(job), state, TIMEOUT):
+        logger.debug("Scheduling report job {}".format(job))
+        _run_report.delay(job, report_name, data)
+        return state
+    return report_status(job) or state
+
+
+def report_status(job):
+    """Get the state of a report job.
+
+    :param job: Id of the job
+    :type job: str
+    :returns: State of the job or None if unknown
+    :rtype: dict|None
+    """
+    return cache.get(_job_key(job))
+
+
+def report_page(job, page):
+    """Get a stored page of results of a report job.
+
+    :param job: Id of the job
+    :type job: str
+    :param page: Page number starting at 1
+    :type page: int
+    :returns: List of rows or None if the page is not stored
+    :rtype: list|None
+    """
+    return cache.get(_page_key(job, page))
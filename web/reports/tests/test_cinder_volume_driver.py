@@ -1,3 +1,5 @@
+import mock
+
 from django.test import tag
 from django.test import SimpleTestCase
 
@@ -83,3 +85,24 @@ class TestCinderVolumeDriverReport(SimpleTestCase):
         r = Report(self.params)
         for i, col in enumerate(r.columns()):
             self.assertEquals(expected[i], col)
+
+    @tag('unit')
+    @mock.patch('reports.cinder_volume_driver.ColumnQuery.stream')
+    def test_rows_without_contents(self, m_stream):
+        """Test that rows without contents are skipped."""
+        row = {
+            'Environment.name': 'env',
+            'Environment.account_number': '1',
+            'Host.hostname': 'host',
+            'Configfile.name': 'cinder.conf',
+            'Configfile.contents': '[lvm]\nvolume_driver = lvmdriver'
+        }
+        missing = dict(row)
+        missing['Host.hostname'] = 'other'
+        missing['Configfile.contents'] = None
+        m_stream.return_value = iter([missing, row])
+
+        rows = list(Report(self.params).rows())
+        self.assertEquals(len(rows), 1)
+        self.assertEquals(rows[0]['Host.hostname'], 'host')
+        self.assertEquals(rows[0]['driver'], 'lvmdriver')
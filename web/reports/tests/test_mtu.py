@@ -1,3 +1,5 @@
+import mock
+
 from django.test import tag
 from django.test import SimpleTestCase
 
@@ -88,3 +90,21 @@ class TestMTUReport(SimpleTestCase):
         r = MTUReport({'time': 1})
         for i, col in enumerate(r.columns()):
             self.assertEquals(expected[i], col)
+
+    @mock.patch('reports.mtu.MTUQuery.stream')
+    def test_rows(self, m_stream):
+        """Test that rows are cleaned as they are streamed."""
+        m_stream.return_value = iter([
+            {
+                'Same MTU': None,
+                'Is Running MTU Default': True,
+                'Is Configured MTU Default': None
+            }
+        ])
+        r = MTUReport({'time': 1})
+        rows = r.rows()
+        self.assertEquals(m_stream.call_count, 0)
+        row = next(rows)
+        self.assertTrue(row['Same MTU'] is False)
+        self.assertTrue(row['Is Running MTU Default'] is True)
+        self.assertEquals(list(rows), [])
@@ -0,0 +1,112 @@
+import mock
+
+from collections import OrderedDict
+from django.core.cache import cache
+from django.test import override_settings
+from django.test import SimpleTestCase
+from django.test import tag
+
+from reports import tasks
+
+LOCMEM = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'reporttasks'
+    }
+}
+
+
+class FakeReport:
+    """Fake report yielding a number of rows."""
+
+    name = 'Fake'
+
+    count = 5
+
+    def __init__(self, data):
+        self.data = data
+
+    def columns(self):
+        return ['index']
+
+    def rows(self):
+        for i in range(self.count):
+            yield OrderedDict([('index', i)])
+
+
+class BrokenReport(FakeReport):
+    """Fake report failing after the first row."""
+
+    def rows(self):
+        yield OrderedDict([('index', 0)])
+        raise Exception('broken')
+
+
+@override_settings(CACHES=LOCMEM)
+class TestReportTasks(SimpleTestCase):
+    """Test running reports as jobs."""
+
+    def setUp(self):
+        cache.clear()
+
+    @tag('unit')
+    def test_job_id(self):
+        """Test that job ids only depend on name and parameters."""
+        a = tasks.job_id('Fake', {'time': 1, 'model': 'Host'})
+        b = tasks.job_id('Fake', {'model': 'Host', 'time': 1})
+        c = tasks.job_id('Fake', {'model': 'Host', 'time': 2})
+        self.assertEquals(a, b)
+        self.assertNotEqual(a, c)
+
+    @tag('unit')
+    @mock.patch('reports.tasks._run_report.delay')
+    def test_start_coalesces(self, m_delay):
+        """Test that identical requests share one job."""
+        first = tasks.start_report('Fake', {'time': 1})
+        second = tasks.start_report('Fake', {'time': 1})
+        self.assertEquals(m_delay.call_count, 1)
+        self.assertEquals(first['job'], second['job'])
+        self.assertEquals(second['status'], tasks.STATUS_QUEUED)
+
+        tasks.start_report('Fake', {'time': 2})
+        self.assertEquals(m_delay.call_count, 2)
+
+    @tag('unit')
+    @mock.patch('reports.tasks.PAGESIZE', 2)
+    @mock.patch('reports.tasks.report_registry.find', return_value=FakeReport)
+    def test_run_report_pages(self, m_find):
+        """Test that rows are stored in pages."""
+        tasks._run_report('job', 'Fake', {'time': 1})
+        state = tasks.report_status('job')
+        self.assertEquals(state['status'], tasks.STATUS_FINISHED)
+        self.assertEquals(state['rows'], 5)
+        self.assertEquals(state['pages'], 3)
+        self.assertEquals(state['columns'], ['index'])
+        self.assertEquals(
+            [r['index'] for r in tasks.report_page('job', 3)],
+            [4]
+        )
+        self.assertTrue(tasks.report_page('job', 4) is None)
+
+    @tag('unit')
+    @mock.patch('reports.tasks.report_registry.find', return_value=FakeReport)
+    def test_run_report_empty(self, m_find):
+        """Test that an empty report still has one empty page."""
+        with mock.patch.object(FakeReport, 'count', 0):
+            tasks._run_report('job', 'Fake', {'time': 1})
+        state = tasks.report_status('job')
+        self.assertEquals(state['status'], tasks.STATUS_FINISHED)
+        self.assertEquals(state['pages'], 1)
+        self.assertEquals(tasks.report_page('job', 1), [])
+
+    @tag('unit')
+    @mock.patch('reports.tasks.logger')
+    @mock.patch(
+        'reports.tasks.report_registry.find',
+        return_value=BrokenReport
+    )
+    def test_run_report_error(self, m_find, m_logger):
+        """Test that failing reports are marked as errors."""
+        tasks._run_report('job', 'Fake', {'time': 1})
+        state = tasks.report_status('job')
+        self.assertEquals(state['status'], tasks.STATUS_ERROR)
@@ -16,6 +16,13 @@ class FakeReport:
         """Does nothing."""
         pass
 
+    def rows(self):
+        """Yield some dummy data."""
+        d = OrderedDict()
+        d['keya'] = 'value1'
+        d['keyb'] = None
+        yield d
+
     def run(self):
         """Run some dummy data."""
         d = OrderedDict()
@@ -104,6 +111,133 @@ class TestReportsViewSet(APITestCase):
         self.assertEquals(result[0]['keya'], 'value1')
         self.assertEquals(result[0]['keyb'], 'value2')
 
+    @tag('unit')
+    @mock.patch('reports.views.report_registry.find', return_value=FakeReport)
+    def test_reports_run_csv(self, m_registry):
+        """Test that csv reports are streamed with a header."""
+        self.client.login(**self.credentials)
+        data = {'report_name': 'Generic'}
+        resp = self.client.post(
+            '/api/reports/run/',
+            data=data,
+            HTTP_ACCEPT='text/csv'
+        )
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        self.assertTrue(resp['Content-Type'].startswith('text/csv'))
+        content = b''.join(resp.streaming_content).decode('utf-8')
+        self.assertEquals(content, 'keya,keyb\r\nvalue1,\r\n')
+
+    @tag('unit')
+    @mock.patch('reports.views.report_registry.find', return_value=FakeReport)
+    def test_reports_run_ndjson(self, m_registry):
+        """Test that ndjson reports are streamed one object per line."""
+        self.client.login(**self.credentials)
+        data = {'report_name': 'Generic'}
+        resp = self.client.post(
+            '/api/reports/run/',
+            data=data,
+            HTTP_ACCEPT='application/x-ndjson'
+        )
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        content = b''.join(resp.streaming_content).decode('utf-8')
+        self.assertEquals(content, '{"keya": "value1", "keyb": null}\n')
+
+    @tag('unit')
+    def test_reports_run_csv_bad_data(self):
+        """Test that errors are still rendered for csv requests."""
+        self.client.login(**self.credentials)
+        resp = self.client.post(
+            '/api/reports/run/',
+            data={},
+            HTTP_ACCEPT='text/csv'
+        )
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(b'report_name' in resp.content)
+
+    @tag('unit')
+    @mock.patch('reports.views.start_report')
+    def test_reports_start(self, m_start):
+        """Test starting a report job."""
+        m_start.return_value = {'job': 'abc', 'status': 'queued'}
+        self.client.login(**self.credentials)
+        data = {
+            'report_name': 'Generic',
+            'model': 'Environment',
+            'time': 1,
+            'columns': [
+                {'model': 'Environment', 'prop': 'account_number'}
+            ]
+        }
+        resp = self.client.post(
+            '/api/reports/start/',
+            data=data,
+            format='json'
+        )
+        self.assertEquals(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEquals(resp.json()['job'], 'abc')
+        self.assertEquals(m_start.call_args[0][0], 'Generic')
+
+    @tag('unit')
+    def test_reports_start_bad_data(self):
+        """Test that report parameters are validated before starting."""
+        self.client.login(**self.credentials)
+        resp = self.client.post('/api/reports/start/', data={})
+        self.assertEquals(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @tag('unit')
+    @mock.patch('reports.views.report_status')
+    def test_reports_progress(self, m_status):
+        """Test job status codes."""
+        self.client.login(**self.credentials)
+        expected = [
+            (None, status.HTTP_404_NOT_FOUND),
+            ({'status': 'running'}, status.HTTP_202_ACCEPTED),
+            ({'status': 'finished'}, status.HTTP_200_OK),
+            ({'status': 'error'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        ]
+        for state, code in expected:
+            m_status.return_value = state
+            resp = self.client.post(
+                '/api/reports/progress/',
+                data={'job': 'abc'}
+            )
+            self.assertEquals(resp.status_code, code)
+
+    @tag('unit')
+    @mock.patch('reports.views.report_page')
+    @mock.patch('reports.views.report_status')
+    def test_reports_page(self, m_status, m_page):
+        """Test retrieving pages of a job."""
+        self.client.login(**self.credentials)
+        m_status.return_value = {'status': 'running', 'pages': 1}
+
+        m_page.return_value = [{'keya': 'value1'}]
+        resp = self.client.post(
+            '/api/reports/page/',
+            data={'job': 'abc', 'page': 1}
+        )
+        self.assertEquals(resp.status_code, status.HTTP_200_OK)
+        self.assertEquals(resp.json()['records'], [{'keya': 'value1'}])
+        m_page.assert_called_once_with('abc', 1)
+
+        # Pages not written yet by a running job
+        m_page.return_value = None
+        resp = self.client.post(
+            '/api/reports/page/',
+            data={'job': 'abc', 'page': 2}
+        )
+        self.assertEquals(resp.status_code, status.HTTP_202_ACCEPTED)
+
+        # Pages past the end of a finished job
+        m_status.return_value = {'status': 'finished', 'pages': 1}
+        resp = self.client.post(
+            '/api/reports/page/',
+            data={'job': 'abc', 'page': 2}
+        )
+        self.assertEquals(resp.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_get_renderer_context(self):
         """Test that get_renderer_context can detect columns."""
         v = ReportViewSet()
@@ -1,22 +1,45 @@
 import logging
 
 from django.http import Http404
+from django.http import StreamingHttpResponse
+from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import list_route
 from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from .registry import REGISTRY as report_registry
 from .registry import ReportNameSerializer
 
+from .renderers import CSVRenderer
+from .renderers import NDJSONRenderer
+from .renderers import StreamingRenderer
+
 from .serializers import ReportDataSerializer
+from .serializers import ReportJobPageSerializer
+from .serializers import ReportJobSerializer
 from .serializers import ReportSerializer
 
+from .tasks import STATUS_ERROR
+from .tasks import STATUS_FINISHED
+from .tasks import report_page
+from .tasks import report_status
+from .tasks import start_report
+
 logger = logging.getLogger(__name__)
 
 
 class ReportViewSet(viewsets.ViewSet):
 
+    renderer_classes = (
+        JSONRenderer,
+        BrowsableAPIRenderer,
+        CSVRenderer,
+        NDJSONRenderer
+    )
+
     def list(self, request):
         """Get a list of reports."""
         serializer = ReportSerializer(report_registry.list(), many=True)
@@ -30,9 +53,14 @@ class ReportViewSet(viewsets.ViewSet):
         serializer = ReportSerializer(report)
         return Response(serializer.data)
 
-    @list_route(methods=['post'])
-    def run(self, request):
-        """Run a report."""
+    def _report(self, request):
+        """Get an instance of the requested report.
+
+        :param request: Http request
+        :type request: rest_framework.request.Request
+        :returns: Report with validated parameters
+        :rtype: reports.base.BaseReport
+        """
         # First validate request report exists
         s = ReportNameSerializer(data=request.data)
         if not s.is_valid():
@@ -46,15 +74,104 @@ class ReportViewSet(viewsets.ViewSet):
             raise Http404()
 
         # This will raise a validationerror if report parameters are invalid
-        report = report_class(request.data)
+        return report_class(request.data)
+
+    def _data(self, request, serializer):
+        """Serialize input from request and validate.
+
+        :param request: Http request
+        :type request: rest_framework.request.Request
+        :param serializer: Serializer class to use.
+        :type serializer: rest_framework.serializers.Serializer
+        :returns: Validated data
+        :rtype: dict
+        """
+        s = serializer(data=request.data)
+        if not s.is_valid():
+            raise ValidationError(s.errors)
+        return s.validated_data
+
+    def _job_response(self, state):
+        """Create a response for the state of a report job.
+
+        :param state: State of the job
+        :type state: dict
+        :returns: 200 when finished, 500 on error, otherwise 202
+        :rtype: rest_framework.response.Response
+        """
+        if state['status'] == STATUS_FINISHED:
+            code = status.HTTP_200_OK
+        elif state['status'] == STATUS_ERROR:
+            code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        else:
+            code = status.HTTP_202_ACCEPTED
+        return Response(state, status=code)
+
+    @list_route(methods=['post'])
+    def run(self, request):
+        """Run a report."""
+        report = self._report(request)
 
         # Save columns for renderer context
         self.columns = report.columns()
 
+        # Stream rows as they are computed for csv and ndjson.
+        renderer = request.accepted_renderer
+        if isinstance(renderer, StreamingRenderer):
+            return StreamingHttpResponse(
+                renderer.stream(report.rows(), self.columns),
+                content_type='{}; charset={}'.format(
+                    renderer.media_type,
+                    renderer.charset
+                )
+            )
+
         # Run report and serialize the result
         s = ReportDataSerializer(report.run())
         return Response(s.data)
 
+    @list_route(methods=['post'])
+    def start(self, request):
+        """Start a report as a job.
+
+        Identical requests share one job.
+        """
+        report = self._report(request)
+        state = start_report(report.name, report.data)
+        return self._job_response(state)
+
+    @list_route(methods=['post'])
+    def progress(self, request):
+        """Get the status and progress of a report job."""
+        data = self._data(request, ReportJobSerializer)
+        state = report_status(data['job'])
+        if state is None:
+            raise Http404()
+        return self._job_response(state)
+
+    @list_route(methods=['post'])
+    def page(self, request):
+        """Get a page of results of a report job.
+
+        Pages can be retrieved while the job is still running.
+        """
+        data = self._data(request, ReportJobPageSerializer)
+        state = report_status(data['job'])
+        if state is None:
+            raise Http404()
+
+        rows = report_page(data['job'], data['page'])
+        if rows is None:
+            if data['page'] > state['pages'] and \
+                    state['status'] not in (STATUS_FINISHED, STATUS_ERROR):
+                return self._job_response(state)
+            raise Http404()
+
+        result = dict(state)
+        result['page'] = data['page']
+        result['records'] = rows
+        return Response(result)
+
     def get_renderer_context(self):
         """Add column ordering to renderer context for csvs."""
         context = super().get_renderer_context()
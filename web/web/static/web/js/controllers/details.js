@@ -7,6 +7,7 @@ angular.module('cloudSnitch').controller('DetailsController', ['$scope', 'cloudS
     $scope.obj = {};
     $scope.identity = "";
     $scope.children = {};
+    $scope.blobs = {};
     $scope.busy = false;
     $scope.objectBusy = false;
 
@@ -80,6 +81,26 @@ angular.module('cloudSnitch').controller('DetailsController', ['$scope', 'cloudS
         });
     };
 
+    $scope.blobProperties = function() {
+        var model = typesService.typeMap[$scope.f.type];
+        return (model || {}).blob_properties || [];
+    };
+
+    $scope.loadBlob = function(prop) {
+        $scope.blobs[prop] = {busy: true, value: undefined};
+        cloudSnitchApi.blob(
+            $scope.f.type,
+            $scope.identity,
+            prop,
+            $scope.f.time
+        ).then(function(data) {
+            $scope.blobs[prop] = {busy: false, value: data.value};
+        }, function(resp) {
+            // @TODO - error handling
+            $scope.blobs[prop] = {busy: false, value: undefined};
+        });
+    };
+
     $scope.toggleChild = function(childObj) {
         childObj.show = !childObj.show;
     };
@@ -137,6 +158,7 @@ angular.module('cloudSnitch').controller('DetailsController', ['$scope', 'cloudS
             $scope.identity = $scope.obj[prop];
         }
 
+        $scope.blobs = {};
         $scope.loadChildren();
         $scope.updateObject();
         $scope.updateTimes();
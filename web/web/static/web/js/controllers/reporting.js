@@ -1,8 +1,11 @@
 /**
  * Main controller. Holds various app wide things.
  */
-angular.module('cloudSnitch').controller('ReportingController', ['$scope', 'reportsService', 'cloudSnitchApi', function($scope, reportsService, cloudSnitchApi) {
+angular.module('cloudSnitch').controller('ReportingController', ['$scope', '$interval', 'reportsService', 'cloudSnitchApi', function($scope, $interval, reportsService, cloudSnitchApi) {
     $scope.reports = reportsService.reports;
+    $scope.progress = null;
+    var pollInterval = 2000;
+    var pollJob = null;
     $scope.serverErrors = null;
     $scope.rendered = false;
     $scope.showJsonParams = false;
@@ -74,7 +77,7 @@ angular.module('cloudSnitch').controller('ReportingController', ['$scope', 'repo
     }
 
     function handleData(type, data) {
-        if (type == 'json' || type == 'csv') {
+        if (type == 'json' || type == 'ndjson' || type == 'csv') {
             // Create link to blob
             var url = window.URL.createObjectURL(data);
             var link = angular.element('<a>Download</a>');
@@ -97,10 +100,69 @@ angular.module('cloudSnitch').controller('ReportingController', ['$scope', 'repo
         $scope.busy = false;
     }
 
+    function stopPolling() {
+        if (pollJob !== null) {
+            $interval.cancel(pollJob);
+            pollJob = null;
+        }
+    }
+
+    function jobFailed(resp) {
+        stopPolling();
+        $scope.serverErrors = resp.data;
+        $scope.progress = null;
+        $scope.busy = false;
+    }
+
+    function loadPages(state) {
+        var rows = [];
+        function more(page) {
+            return cloudSnitchApi.reportPage(state.job, page).then(function(resp) {
+                rows = rows.concat(resp.data.records);
+                if (page < state.pages) {
+                    return more(page + 1);
+                }
+                $scope.progress = null;
+                handleData('web', rows);
+            }, jobFailed);
+        }
+        return more(1);
+    }
+
+    function handleJob(resp) {
+        $scope.progress = resp.data;
+        if (resp.status == 200) {
+            stopPolling();
+            loadPages(resp.data);
+        }
+    }
+
+    function runJob() {
+        cloudSnitchApi.startReport($scope.controls.reportName, $scope.controls.parameters).then(function(resp) {
+            handleJob(resp);
+            if (resp.status == 202) {
+                pollJob = $interval(function() {
+                    cloudSnitchApi.reportProgress(resp.data.job).then(handleJob, jobFailed);
+                }, pollInterval);
+            }
+        }, jobFailed);
+    }
+
+    $scope.$on('$destroy', function() {
+        stopPolling();
+    });
+
     $scope.submit = function(type) {
         $scope.busy = true;
         $scope.serverErrors = null;
 
+        // Run web reports as jobs so slow reports do not time out.
+        if (type == 'web') {
+            stopPolling();
+            runJob();
+            return;
+        }
+
         cloudSnitchApi.runReport($scope.controls.reportName, type, $scope.controls.parameters).then(function(data) {
             handleData(type, data);
         }, function(resp) {
@@ -120,6 +120,10 @@ angular.module('cloudSnitch').factory('cloudSnitchApi', ['$http', '$q', 'timeSer
                 headers['Accept'] = 'text/csv';
                 responseType = 'blob';
                 break;
+            case 'ndjson':
+                headers['Accept'] = 'application/x-ndjson';
+                responseType = 'blob';
+                break;
             case 'json':
                 headers['Accept'] = 'application/json';
                 responseType = 'blob';
@@ -147,6 +151,40 @@ angular.module('cloudSnitch').factory('cloudSnitchApi', ['$http', '$q', 'timeSer
         });
     };
 
+    function post(url, req) {
+        var defer = $q.defer();
+        return $http({
+            method: 'POST',
+            url: url,
+            headers: makeHeaders(),
+            data: req
+        }).then(function(resp) {
+            defer.resolve(resp);
+            return defer.promise;
+        }, function(resp) {
+            defer.reject(resp);
+            return defer.promise;
+        });
+    }
+
+    /**
+     * Start a report job. Resolves with the http response. Status 202
+     * means the job is still running.
+     */
+    service.startReport = function(report_name, parameters) {
+        var req = angular.copy(parameters);
+        req.report_name = report_name;
+        return post('/api/reports/start/', req);
+    };
+
+    service.reportProgress = function(job) {
+        return post('/api/reports/progress/', {job: job});
+    };
+
+    service.reportPage = function(job, page) {
+        return post('/api/reports/page/', {job: job, page: page});
+    };
+
     service.paths = function() {
         var defer = $q.defer();
         return $http({
@@ -191,6 +229,35 @@ angular.module('cloudSnitch').factory('cloudSnitchApi', ['$http', '$q', 'timeSer
         });
     };
 
+    service.blob = function(model, identity, prop, time) {
+        var defer = $q.defer();
+        var req = {
+            model: model,
+            identity: identity,
+            prop: prop
+        };
+
+        if (time !== undefined) {
+            time = convertTime(time);
+            if (time > 0) {
+                req.time = time;
+            }
+        }
+        return $http({
+            method: 'POST',
+            url: '/api/objects/blob/',
+            headers: makeHeaders(),
+            data: req
+        }).then(function(resp) {
+            defer.resolve(resp.data);
+            return defer.promise;
+        }, function(resp) {
+            // Error @TODO Error handling
+            defer.reject(resp);
+            return defer.promise;
+        });
+    };
+
     /**
      * Params object:
        model: name of the model
@@ -275,7 +342,7 @@ angular.module('cloudSnitch').factory('cloudSnitchApi', ['$http', '$q', 'timeSer
         var defer = $q.defer();
         var req = {
             model: model,
-            page: 1,
+            cursor: '',
             pagesize: 500
         };
 
@@ -304,8 +371,8 @@ angular.module('cloudSnitch').factory('cloudSnitchApi', ['$http', '$q', 'timeSer
             req.filters = apiFilters;
         }
 
-        function more(page) {
-            req.page = page
+        function more(cursor) {
+            req.cursor = cursor;
             return $http({
                 method: 'POST',
                 headers: makeHeaders(),
@@ -313,12 +380,12 @@ angular.module('cloudSnitch').factory('cloudSnitchApi', ['$http', '$q', 'timeSer
                 data: req
             }).then(function(resp) {
                 sink(resp.data);
-                if (req.page * req.pagesize >= resp.data.count) {
+                if (resp.data.cursor === null) {
                     defer.resolve({});
                     return defer.promise
                 }
                 else {
-                    return more(page + 1);
+                    return more(resp.data.cursor);
                 }
             }, function(resp) {
                 // @TODO - handle errors
@@ -327,7 +394,7 @@ angular.module('cloudSnitch').factory('cloudSnitchApi', ['$http', '$q', 'timeSer
             });
         }
 
-        return more(1);
+        return more('');
     };
 
 
@@ -337,7 +404,7 @@ angular.module('cloudSnitch').factory('cloudSnitchApi', ['$http', '$q', 'timeSer
         var defer = $q.defer();
         var req = {
             model: model,
-            page: 1,
+            cursor: '',
             pagesize: 500
         };
 
@@ -366,8 +433,8 @@ angular.module('cloudSnitch').factory('cloudSnitchApi', ['$http', '$q', 'timeSer
             req.filters = apiFilters;
         }
 
-        function more(page) {
-            req.page = page
+        function more(cursor) {
+            req.cursor = cursor;
             return $http({
                 method: 'POST',
                 headers: makeHeaders(),
@@ -375,12 +442,12 @@ angular.module('cloudSnitch').factory('cloudSnitchApi', ['$http', '$q', 'timeSer
                 data: req
             }).then(function(resp) {
                 sink(resp.data);
-                if (req.page * req.pagesize >= resp.data.count) {
+                if (resp.data.cursor === null) {
                     defer.resolve({});
                     return defer.promise
                 }
                 else {
-                    return more(page + 1);
+                    return more(resp.data.cursor);
                 }
             }, function(resp) {
                 // @TODO - handle errors
@@ -389,16 +456,19 @@ angular.module('cloudSnitch').factory('cloudSnitchApi', ['$http', '$q', 'timeSer
             });
         }
 
-        return more(1);
+        return more('');
     };
 
-    service.diffStructure = function(model, identity, leftTime, rightTime) {
+    service.diffStructure = function(model, identity, leftTime, rightTime, depth) {
         var req = {
             model: model,
             identity:identity,
             left_time: convertTime(leftTime),
             right_time: convertTime(rightTime)
         };
+        if (depth !== undefined) {
+            req.depth = depth;
+        }
         var defer = $q.defer()
         return $http({
             method: 'POST',
@@ -416,6 +486,35 @@ angular.module('cloudSnitch').factory('cloudSnitchApi', ['$http', '$q', 'timeSer
         });
     };
 
+    service.diffSubtree = function(model, identity, leftTime, rightTime, nodeModel, nodeIdentity, depth) {
+        var req = {
+            model: model,
+            identity:identity,
+            left_time: convertTime(leftTime),
+            right_time: convertTime(rightTime),
+            node_model: nodeModel,
+            node_identity: nodeIdentity
+        };
+        if (depth !== undefined) {
+            req.depth = depth;
+        }
+        var defer = $q.defer()
+        return $http({
+            method: 'POST',
+            headers: makeHeaders(),
+            url: '/api/objectdiffs/subtree/',
+            data: req
+        }).then(function(resp) {
+            // Success
+            defer.resolve(resp.data);
+            return defer.promise;
+        }, function(resp) {
+            // Error
+            defer.reject(resp);
+            return defer.promise;
+        });
+    };
+
     service.diffNodes = function(model, identity, leftTime, rightTime, offset, limit) {
         var req = {
             model: model,
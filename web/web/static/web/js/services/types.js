@@ -64,6 +64,9 @@ angular.module('cloudSnitch').factory('typesService', ['cloudSnitchApi', functio
             for (var j = 0; j < t.state_properties.length; j++) {
                 props.push(t.state_properties[j]);
             }
+            for (var j = 0; j < (t.blob_properties || []).length; j++) {
+                props.push(t.blob_properties[j]);
+            }
             service.properties[t.label] = props;
         }
     };